@@ -0,0 +1,43 @@
+'''
+Fake Azure MCP server for benchmarks: same tool names as ulma_agents/azure_mcp_server,
+canned Graph-shaped results, no network. Runs over stdio.
+'''
+
+from typing import Any, Dict
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("azure-fake")
+
+
+def _user(upn: str) -> Dict[str, Any]:
+    return {"id": f"fake-{abs(hash(upn)) % 10**8:08d}", "userPrincipalName": upn, "displayName": upn.split("@")[0]}
+
+
+@mcp.tool()
+def azure_get_user(upn: str) -> Dict[str, Any]:
+    return {"status": "ok", "user": _user(upn)}
+
+
+@mcp.tool()
+def azure_create_user(upn: str, display_name: str, password: str) -> Dict[str, Any]:
+    return {"status": "created", "user": {**_user(upn), "displayName": display_name}}
+
+
+@mcp.tool()
+def azure_add_user_to_group(user_upn: str, group_id: str) -> Dict[str, Any]:
+    return {"status": "added", "user": user_upn, "group_id": group_id}
+
+
+@mcp.tool()
+def azure_delete_user(upn_or_id: str) -> Dict[str, Any]:
+    return {"status": "deleted", "user": upn_or_id}
+
+
+@mcp.tool()
+def azure_reset_user_password(upn: str, new_password: str, force_change_next_sign_in: bool = True) -> Dict[str, Any]:
+    return {"status": "reset", "user": upn, "force_change_next_sign_in": force_change_next_sign_in}
+
+
+if __name__ == "__main__":
+    mcp.run()
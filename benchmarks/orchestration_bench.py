@@ -0,0 +1,397 @@
+'''
+Offline orchestration benchmark.
+
+Runs the full front_agent -> supervisor_agent -> sub-agent tree against a scripted model
+(canned function calls and text, no network), the fake Azure MCP server in
+benchmarks/fake_azure_mcp.py and throw-away DB/log directories. Since the model answers
+instantly, the measured latency is our own overhead: tool dispatch, MCP round trips,
+state persistence, file I/O and approval suspend/resume.
+
+    python benchmarks/orchestration_bench.py --sessions 50 --concurrency 8 --trace
+
+Reports p50/p95 turn latency (and approval resume latency for offboarding requests),
+allocations per session from tracemalloc and, with --trace, time per span kind.
+'''
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+from google.genai import types
+from mcp import StdioServerParameters
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+FAKE_MCP_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_azure_mcp.py")
+_NAME = re.compile(r"(?:onboard|offboard)\s+(.+?)\s+(?:as|per)\b", re.IGNORECASE)
+
+
+def _first_user_text(llm_request) -> str:
+    for content in llm_request.contents or []:
+        if content.role == "user":
+            for part in content.parts or []:
+                if part.text:
+                    return part.text
+    return ""
+
+
+def _last_function_response(llm_request) -> Tuple[Optional[str], Dict[str, Any]]:
+    contents = llm_request.contents or []
+    if not contents:
+        return None, {}
+    for part in contents[-1].parts or []:
+        if part.function_response is not None:
+            return part.function_response.name, part.function_response.response or {}
+    return None, {}
+
+
+def _next_step(agent: str, request: str, last_tool: Optional[str], response: Dict[str, Any]):
+    """
+    The script: the next (kind, name/text, args) for an agent given the last tool result.
+    """
+    match = _NAME.search(request)
+    user = match.group(1) if match else "Bench User"
+    slug = re.sub(r"[^a-z0-9]+", ".", user.lower()).strip(".")
+    upn = f"{slug}@bench.example"
+    offboard = "offboard" in request.lower()
+    last = (last_tool or "").rsplit("azure_", 1)[-1] if last_tool and "azure_" in last_tool else last_tool
+
+    if agent == "user_facing_agent":
+        if last is None:
+            return "call", "transfer_to_agent", {"agent_name": "supervisor_agent"}
+        return "text", "Request forwarded to the supervisor.", None
+
+    if agent == "supervisor_agent":
+        if last is None:
+            goal = "Offboard" if offboard else "Onboard"
+            return "call", "preflight_check", {"user_name": user, "goal": goal, "policy_doc": "bench_policy", "upn": upn}
+        if last == "preflight_check":
+            if offboard:
+                return "call", "queue_high_risk_approval", {"user_name": user, "action": "deletion"}
+            return "call", "save_flow_log", {"flow_updates": f"plan for {user}\n", "filename": f"flow_{slug}.log"}
+        if last == "queue_high_risk_approval" and response.get("status") != "approved":
+            return "text", "HIGH RISK OPERATION: approval requested.", None
+        return "call", "transfer_to_agent", {"agent_name": "identity_agent"}
+
+    if agent == "identity_agent":
+        if last is None:
+            return "call", "azure_get_user", {"upn": upn}
+        if last == "get_user":
+            if offboard:
+                return "call", "azure_delete_user", {"upn_or_id": upn}
+            return "call", "azure_create_user", {"upn": upn, "display_name": user, "password": "Bench-Passw0rd!"}
+        if last == "create_user":
+            return "call", "azure_add_user_to_group", {"user_upn": upn, "group_id": "bench-group"}
+        if last in ("add_user_to_group", "delete_user"):
+            return "call", "save_step_status", {"step": "identity", "done": True}
+        return "text", f"Identity updated for {user}.", None
+
+    if agent == "workflow_summary_agent":
+        return "text", f"SUCCESS: {'offboarding' if offboard else 'onboarding'} of {user} completed.", None
+
+    return "text", "Done.", None
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Deterministic stand-in for Gemini: answers each request with the next scripted step.
+    """
+
+    model: str = "scripted"
+    agent_name: str = ""
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"scripted"]
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        last_tool, response = _last_function_response(llm_request)
+        kind, name, args = _next_step(self.agent_name, _first_user_text(llm_request), last_tool, response)
+        if kind == "call":
+            # Resolve script names against the tool names the agent actually exposes
+            # (MCP tools carry a toolset prefix).
+            tools = getattr(llm_request, "tools_dict", {}) or {}
+            name = next((t for t in tools if t == name or t.endswith(name)), name)
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+        else:
+            part = types.Part(text=name)
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=len(llm_request.contents or []) * 50, candidates_token_count=20
+        )
+        yield LlmResponse(content=types.Content(role="model", parts=[part]), usage_metadata=usage)
+
+
+def _walk(agent):
+    yield agent
+    for sub in getattr(agent, "sub_agents", None) or []:
+        yield from _walk(sub)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest-rank percentile.
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _latency_stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p95_ms": round(_percentile(values, 95) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+
+class Bench:
+    def __init__(self, ulma, args):
+        self.ulma = ulma
+        self.args = args
+        self.resumed: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self.manager = ulma.SessionManager(
+            ulma.front_agent, max_concurrent_turns=args.concurrency, on_resumed_event=self._on_resumed
+        )
+
+    def _on_resumed(self, record, event) -> None:
+        parts = getattr(getattr(event, "content", None), "parts", None) or []
+        if any(getattr(p, "text", None) and "Identity updated" in p.text for p in parts):
+            self.resumed[record["session_id"]].set()
+
+    async def one(self, index: int, label: str) -> Dict[str, Any]:
+        from ulma_agents.approval_queue import ensure_teams_dirs
+        from ulma_agents.db_worker import run_db
+        from ulma_agents.resumer import list_paused_invocations
+
+        offboard = self.args.offboard_every and index % self.args.offboard_every == 0
+        verb = "Offboard" if offboard else "Onboard"
+        session_id = f"{label}_{index:05d}"
+        text = f"{verb} Bench User {label} {index:05d} as engineer per bench_policy.pdf"
+        content = types.Content(role="user", parts=[types.Part(text=text)])
+        result = {"session_id": session_id, "offboard": bool(offboard)}
+
+        started = time.perf_counter()
+        async for _ in self.manager.execute(content, session_id=session_id, stream=False):
+            pass
+        result["turn_s"] = time.perf_counter() - started
+
+        if offboard:
+            waiting = await run_db(list_paused_invocations, self.manager.runner.app_name)
+            filename = next((r["filename"] for r in waiting if r["session_id"] == session_id), None)
+            if not filename:
+                result["approval_error"] = "no paused invocation recorded for the session"
+                return result
+            outgoing = ensure_teams_dirs()["outgoing"]
+            started = time.perf_counter()
+            with open(os.path.join(outgoing, filename), "w", encoding="utf-8") as handle_file:
+                handle_file.write("Approved\nover\n")
+            try:
+                await asyncio.wait_for(self.resumed[session_id].wait(), self.args.approval_timeout)
+                result["approval_s"] = time.perf_counter() - started
+            except asyncio.TimeoutError:
+                result["approval_error"] = "timeout waiting for resumed invocation"
+        return result
+
+    async def run(self, count: int, label: str) -> List[Dict[str, Any]]:
+        pending = iter(range(count))
+        results: List[Dict[str, Any]] = []
+
+        async def worker():
+            for index in pending:
+                results.append(await self.one(index, label))
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return results
+
+
+def _span_breakdown(ulma_tracing, path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    per_kind: Dict[str, List[float]] = defaultdict(list)
+    per_tool: Dict[str, List[float]] = defaultdict(list)
+    for span in ulma_tracing._read_spans(path):
+        kind = span["kind"]
+        ms = (span["end"] - span["start"]) / 1e6
+        if kind == "tool":
+            kind = "tool:mcp" if span["attributes"].get("ulma.mcp") in (True, "true") else "tool:function"
+            per_tool[span["attributes"].get("ulma.tool", span["name"])].append(ms)
+        per_kind[kind].append(ms)
+    summarize = lambda values: {
+        "count": len(values),
+        "p50_ms": round(_percentile(values, 50), 3),
+        "p95_ms": round(_percentile(values, 95), 3),
+        "total_ms": round(sum(values), 1),
+    }
+    return {
+        "by_kind": {k: summarize(v) for k, v in sorted(per_kind.items())},
+        "by_tool": {k: summarize(v) for k, v in sorted(per_tool.items(), key=lambda kv: -sum(kv[1]))},
+    }
+
+
+async def _main(args) -> Dict[str, Any]:
+    import ulma_agents as ulma
+    from ulma_agents import tracing as ulma_tracing
+    from ulma_agents.db_worker import get_db_worker
+    from ulma_agents.directory import ensure_directory_schema
+    from ulma_agents.state_writer import get_state_writer
+    from ulma_agents.config import mcp_pool
+    from ulma_agents.mcp_pool import PooledMcpToolset
+    from ulma_agents.sub_agents.identity_agent import identity_agent
+
+    ensure_directory_schema()
+    for agent in _walk(ulma.front_agent):
+        # Workflow agents run code, not a model; their LLM sub-agents are scripted below them.
+        if isinstance(agent, LlmAgent):
+            agent.model = ScriptedLlm(agent_name=agent.name)
+    # Same toolset class as production, so pooling overhead and reuse are measured too.
+    toolset_cls = PooledMcpToolset if mcp_pool.enabled else McpToolset
+    fake_azure = toolset_cls(
+        connection_params=StdioConnectionParams(
+            server_params=StdioServerParameters(command=sys.executable, args=[FAKE_MCP_SERVER]),
+        ),
+        tool_name_prefix="azure",
+    )
+    identity_agent.tools = [fake_azure if isinstance(t, McpToolset) else t for t in identity_agent.tools]
+
+    bench = Bench(ulma, args)
+    try:
+        await bench.run(args.warmup, "warmup")
+
+        started = time.perf_counter()
+        results = await bench.run(args.sessions, "run")
+        wall = time.perf_counter() - started
+
+        allocations = {}
+        if args.alloc_sessions:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            await bench.run(args.alloc_sessions, "alloc")
+            await get_state_writer().aflush()
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            diff = after.compare_to(before, "lineno")
+            ours = [d for d in diff if d.traceback[0].filename.startswith(os.path.join(PROJECT_ROOT, "ulma_agents"))]
+            allocations = {
+                "sessions": args.alloc_sessions,
+                "net_bytes_per_session": round(sum(d.size_diff for d in diff) / args.alloc_sessions),
+                "net_blocks_per_session": round(sum(d.count_diff for d in diff) / args.alloc_sessions),
+                "peak_traced_bytes": peak,
+                "top_ulma_sites": [
+                    {
+                        "site": f"{os.path.relpath(d.traceback[0].filename, PROJECT_ROOT)}:{d.traceback[0].lineno}",
+                        "size_diff": d.size_diff,
+                        "count_diff": d.count_diff,
+                    }
+                    for d in sorted(ours, key=lambda d: -abs(d.size_diff))[:10]
+                ],
+            }
+    finally:
+        await fake_azure.close()
+
+    turns = [r["turn_s"] for r in results]
+    approvals_s = [r["approval_s"] for r in results if "approval_s" in r]
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.sessions / wall, 2) if wall else 0.0,
+        "turn": _latency_stats(turns),
+        "onboard_turn": _latency_stats([r["turn_s"] for r in results if not r["offboard"]]),
+        "offboard_turn": _latency_stats([r["turn_s"] for r in results if r["offboard"]]),
+        "approval_resume": _latency_stats(approvals_s),
+        "approval_errors": [r["approval_error"] for r in results if "approval_error" in r],
+        "allocations": allocations,
+        "db_worker": dict(get_db_worker().stats),
+        "state_writer": dict(get_state_writer().stats),
+        "session_manager": {k: v for k, v in bench.manager.stats().items() if not isinstance(v, (dict, list))},
+    }
+    if isinstance(fake_azure, PooledMcpToolset):
+        report["mcp_pool"] = fake_azure.stats()
+    if args.trace:
+        report["spans"] = _span_breakdown(ulma_tracing, os.environ["ULMA_TRACE_FILE"])
+    return report
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"sessions={report['sessions']} concurrency={report['concurrency']} "
+          f"wall={report['wall_s']}s throughput={report['throughput_rps']} req/s")
+    for key in ("turn", "onboard_turn", "offboard_turn", "approval_resume"):
+        stats = report[key]
+        if stats["count"]:
+            print(f"  {key:<16} n={stats['count']:<5} p50={stats['p50_ms']:>8} ms  p95={stats['p95_ms']:>8} ms  max={stats['max_ms']:>8} ms")
+    if report["approval_errors"]:
+        print(f"  approval errors: {len(report['approval_errors'])} ({report['approval_errors'][0]})")
+    alloc = report["allocations"]
+    if alloc:
+        print(f"  allocations: {alloc['net_bytes_per_session']} B/session net, "
+              f"{alloc['net_blocks_per_session']} blocks/session, peak {alloc['peak_traced_bytes']} B")
+        for site in alloc["top_ulma_sites"][:5]:
+            print(f"    {site['site']:<45} {site['size_diff']:>10} B  {site['count_diff']:>6} blocks")
+    for kind, stats in report.get("spans", {}).get("by_kind", {}).items():
+        print(f"  span {kind:<14} n={stats['count']:<6} p50={stats['p50_ms']:>8} ms  p95={stats['p95_ms']:>8} ms  total={stats['total_ms']} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline ULMA orchestration benchmark")
+    parser.add_argument("--sessions", type=int, default=50, help="measured sessions (one request each)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--offboard-every", type=int, default=4, help="every Nth request is an offboarding with approval (0: none)")
+    parser.add_argument("--alloc-sessions", type=int, default=10, help="extra sessions run under tracemalloc (0: skip)")
+    parser.add_argument("--approval-timeout", type=float, default=30.0)
+    parser.add_argument("--trace", action="store_true", help="enable the TracingPlugin and report time per span kind")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    parser.add_argument("--workdir", help="DB/log directory (default: a new temp dir)")
+    parser.add_argument("--verbose", action="store_true", help="keep agent/plugin output")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ulma-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # Everything ulma_agents reads at import time must be set before it is imported.
+    os.environ.update(
+        {
+            "DATABASE_NAME": os.path.join(workdir, "bench.db"),
+            "ULMA_LOG_DIR": os.path.join(workdir, "logs"),
+            "ULMA_TRACE_FILE": os.path.join(workdir, "logs", "traces.jsonl"),
+            "ULMA_TRACING": "1" if args.trace else "0",
+            "ULMA_APPROVAL_MODE": "suspend",
+            "ULMA_STREAMING": "0",
+            "ULMA_MAINTENANCE_INTERVAL_SECONDS": "0",
+            "ULMA_MAX_CONCURRENT_TURNS": str(args.concurrency),
+        }
+    )
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.setdefault("GOOGLE_GENAI_USE_VERTEXAI", "FALSE")
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with output:
+        report = asyncio.run(_main(args))
+    report["workdir"] = workdir
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,79 @@
+import argparse
 import asyncio
 import os
 import ulma_agents
 from google.genai import types
 import warnings
 
+class EventPrinter:
+    """Prints agent text; streamed (partial) chunks are rendered as they arrive."""
+
+    def __init__(self):
+        self.streaming = False
+
+    def __call__(self, event):
+        if not event.content or not event.content.parts:
+            return
+        text = event.content.parts[0].text
+        if getattr(event, "partial", False):
+            if text:
+                if not self.streaming:
+                    print("Agent-ULMA>  ", end="", flush=True)
+                    self.streaming = True
+                print(text, end="", flush=True)
+            return
+        if self.streaming:
+            # The complete event repeats the text that was just streamed.
+            print()
+            self.streaming = False
+            return
+        # Filter out empty or "None" responses before printing
+        if text != "None" and text:
+            print(f"Agent-ULMA> ", text)
+
+
+print_event = EventPrinter()
+
+
+async def run_batch_mode(args):
+    from ulma_agents.batch import run_batch
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    summary = await run_batch(
+        ulma_agents.front_agent,
+        args.batch,
+        args.results,
+        fmt=args.format,
+        max_concurrency=args.concurrency,
+        retry_errors=args.retry_errors,
+    )
+    print(f"[batch] done: {summary}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ULMA Agent CLI")
+    parser.add_argument("--batch", metavar="PATH", help="process requests from a JSONL/CSV file ('-' for stdin)")
+    parser.add_argument("--results", default="batch_results.jsonl", help="results file, also used to resume (default: batch_results.jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from the file extension)")
+    parser.add_argument("--concurrency", type=int, help="requests processed at once (default: ULMA_MAX_CONCURRENT_TURNS)")
+    parser.add_argument("--retry-errors", action="store_true", help="re-run rows recorded with status 'error'")
+    return parser.parse_args()
+
+
 async def main():
     
 # Suppress all UserWarnings
     warnings.filterwarnings("ignore", category=UserWarning)
-    agent=ulma_agents.agent_sessions(ulma_agents.front_agent)
+    # Approvals resumed in the background print through their own printer.
+    print_resumed = EventPrinter()
+    agent=ulma_agents.agent_sessions(
+        ulma_agents.front_agent, on_resumed_event=lambda record, event: print_resumed(event)
+    )
     print("Welcome to the ULMA Agent CLI! Type 'exit' or 'quit' to leave.")
     while True:
         try:
-            user_input = input("\nYou: ").strip()
+            # Read input off the loop so paused approvals can resume meanwhile.
+            user_input = (await asyncio.to_thread(input, "\nYou: ")).strip()
         except (EOFError, KeyboardInterrupt):
             print("\n\nExiting…")
             break
@@ -36,15 +97,9 @@ async def main():
         # adjust this if your agent uses a different API
         # print("\nAgent:", response)
         async for event in response:
-             if event.content and event.content.parts:
-                    # Filter out empty or "None" responses before printing
-                    if (
-                        event.content.parts[0].text != "None"
-                        and event.content.parts[0].text
-                    ):
-                        print(f"Agent-ULMA> ", event.content.parts[0].text)
-                        # print(f"Agent-ULMA> ", event.content.parts[0])
+            print_event(event)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    asyncio.run(run_batch_mode(args) if args.batch else main())
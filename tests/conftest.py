@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import sys
+import tempfile
+
+import pytest
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Read by ulma_agents.config at import time: keep logs out of the repo and skip the
+# background maintenance task and Vertex setup.
+os.environ.setdefault("ULMA_LOG_DIR", tempfile.mkdtemp(prefix="ulma-tests-"))
+os.environ.setdefault("ULMA_MAINTENANCE_INTERVAL_SECONDS", "0")
+os.environ.setdefault("ULMA_TRACING", "0")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("GOOGLE_GENAI_USE_VERTEXAI", "FALSE")
+# Never fall back to the committed ulma_agents/local_addb, even for a write that lands
+# after a test's own database was released.
+os.environ.setdefault("DATABASE_NAME", os.path.join(os.environ["ULMA_LOG_DIR"], "ulma-tests.db"))
+
+
+@pytest.fixture(autouse=True)
+def clean_teams_dirs():
+    """
+    Approval files are named per user and second, so a reply left by one test could answer
+    another's request. Only files are removed: the approval watcher keeps its folder watch.
+    """
+    for root, _, files in os.walk(os.path.join(os.environ["ULMA_LOG_DIR"], "teams")):
+        for name in files:
+            os.remove(os.path.join(root, name))
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A fresh SQLite database for the test (DATABASE_NAME is read on every connect)."""
+    path = tmp_path / "ulma.db"
+    monkeypatch.setenv("DATABASE_NAME", str(path))
+    yield path
+    # Batched saves are flushed by a timer; write them while DATABASE_NAME still points here.
+    from ulma_agents import state_writer
+    from ulma_agents.db_worker import get_db_worker
+
+    if state_writer._writer is not None:
+        state_writer._writer.close()
+    get_db_worker().submit(lambda: None).result()
+
+
+@pytest.fixture
+def make_tool_context():
+    """Builds a real ADK ToolContext on an in-memory session."""
+    from google.adk.agents import LlmAgent
+    from google.adk.agents.invocation_context import InvocationContext
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.tools.tool_context import ToolContext
+
+    async def make(state=None, function_call_id="call-1"):
+        service = InMemorySessionService()
+        session = await service.create_session(app_name="ulma-test", user_id="user", state=state or {})
+        ctx = InvocationContext(
+            session_service=service,
+            invocation_id="inv-test",
+            agent=LlmAgent(name="test_agent"),
+            session=session,
+        )
+        return ToolContext(ctx, function_call_id=function_call_id)
+
+    return make
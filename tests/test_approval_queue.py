@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import pytest
+
+from ulma_agents import approval_queue
+from ulma_agents.tools import check_approval_status, queue_high_risk_approval
+
+
+@pytest.fixture
+def queue(db_path, tmp_path, monkeypatch):
+    outgoing = tmp_path / "outgoing"
+    outgoing.mkdir()
+    monkeypatch.setattr(approval_queue, "OUTGOING_DIR", str(outgoing))
+    return approval_queue
+
+
+def test_reply_is_ingested_once_and_pending_list_shrinks(queue, tmp_path):
+    """A decided approval is answered from its row, even after the reply file is gone."""
+    queue.record_approval_request("approvals_jane_1.txt", "Jane", "deletion", "s1")
+    queue.record_approval_request("approvals_john_1", "John", "deletion", "s2")
+    assert [r["user_name"] for r in queue.list_pending_approvals()] == ["Jane", "John"]
+    assert queue.ingest_reply("approvals_jane_1.txt")["reason"] == "no reply yet"
+
+    reply = tmp_path / "outgoing" / "approvals_jane_1.txt"
+    reply.write_text("Approved\nover\n", encoding="utf-8")
+    assert queue.ingest_replies() == {"pending": 1, "approved": 1, "rejected": 0}
+    reply.unlink()
+
+    stored = queue.ingest_reply("approvals_jane_1.txt")
+    assert stored["done"] is True and stored["decision"] == "approved"
+    assert queue.get_approval("approvals_jane_1")["status"] == "approved"
+    assert [r["user_name"] for r in queue.list_pending_approvals()] == ["John"]
+    assert queue.list_pending_approvals(user_name="Jane") == []
+
+
+def test_reply_without_over_stays_pending(queue, tmp_path):
+    queue.record_approval_request("approvals_ann_1.txt", "Ann")
+    (tmp_path / "outgoing" / "approvals_ann_1.txt").write_text("Not Approved\n", encoding="utf-8")
+    assert queue.ingest_reply("approvals_ann_1.txt")["done"] is False
+    assert queue.get_approval("approvals_ann_1.txt")["status"] == "pending"
+
+
+def test_bulk_reply_decides_pending_approvals_in_one_pass(queue, tmp_path):
+    """Bulk replies accept filenames or #ids and skip unknown or already decided approvals."""
+    first = queue.record_approval_request("approvals_a_1.txt", "A")
+    queue.record_approval_request("approvals_b_1.txt", "B")
+    queue.record_approval_request("approvals_c_1.txt", "C")
+    queue.record_decision("approvals_c_1.txt", "approved")
+    assert queue.bulk_template() == "approvals_a_1.txt: Approved\napprovals_b_1.txt: Approved\nover\n"
+
+    (tmp_path / "outgoing" / "bulk_wave.txt").write_text(
+        f"#{first['id']}: Approved\napprovals_b_1 Not Approved\napprovals_c_1.txt: Rejected\n"
+        "approvals_zz.txt: Approved\nover\n",
+        encoding="utf-8",
+    )
+    result = queue.ingest_bulk_reply("bulk_wave.txt")
+    assert result["applied"] == {"approvals_a_1.txt": "approved", "approvals_b_1.txt": "rejected"}
+    assert result["skipped"] == {"approvals_c_1.txt": "already approved", "approvals_zz.txt": "unknown approval"}
+    assert queue.list_pending_approvals() == []
+    assert queue.ingest_reply("approvals_b_1.txt")["decision"] == "rejected"
+    assert queue.ingest_bulk_reply("bulk_wave.txt")["applied"] == {}
+
+
+def test_reply_file_does_not_override_an_earlier_decision(queue, tmp_path, monkeypatch):
+    """A reply read after a bulk decision reports the stored decision, not the file's."""
+    queue.record_approval_request("approvals_dan_1.txt", "Dan")
+    (tmp_path / "outgoing" / "approvals_dan_1.txt").write_text("Not Approved\nover\n", encoding="utf-8")
+    queue.apply_bulk_decisions("approvals_dan_1.txt: Approved\nover\n", source="bulk_x.txt")
+    # The race: the row was still pending when this reader first looked it up.
+    get_approval = queue.get_approval
+    stale = iter([{"status": "pending"}])
+    monkeypatch.setattr(queue, "get_approval", lambda name: next(stale, None) or get_approval(name))
+
+    reply = queue.ingest_reply("approvals_dan_1.txt")
+    assert reply["decision"] == "approved" and reply["done"] is True
+    assert queue.get_approval("approvals_dan_1.txt")["status"] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_tool_queued_approval_stores_the_session_id(db_path, make_tool_context):
+    tool_context = await make_tool_context()
+    queued = await queue_high_risk_approval(tool_context, user_name="Jane Doe")
+
+    row = approval_queue.get_approval(queued["filename"])
+    assert row["session_id"] == tool_context.session.id
+    assert row["user_name"] == "Jane Doe" and row["status"] == "pending"
+    assert tool_context.actions.requested_tool_confirmations["call-1"].payload["filename"] == queued["filename"]
+
+    status = await check_approval_status(tool_context)
+    assert status["status"] == "pending" and status["approval_filename"] == queued["filename"]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from ulma_agents.approval_queue import parse_approval_reply
+from ulma_agents.approval_watcher import ApprovalWatcher
+
+
+def _reader(directory, threads):
+    def read(name):
+        threads.append(threading.current_thread())
+        path = directory / name
+        content = path.read_text(encoding="utf-8") if path.exists() else ""
+        return {"filename": name, **parse_approval_reply(content)}
+
+    return read
+
+
+@pytest.mark.asyncio
+async def test_existing_reply_is_read_off_the_event_loop(tmp_path):
+    threads = []
+    (tmp_path / "approvals_jane_1.txt").write_text("Approved\nover\n", encoding="utf-8")
+    watcher = ApprovalWatcher(str(tmp_path), reader=_reader(tmp_path, threads))
+
+    reply = await watcher.wait_for("approvals_jane_1", timeout=5)
+    assert reply["decision"] == "approved"
+    assert threads and threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_reply_written_later_wakes_the_waiter(tmp_path):
+    threads = []
+    watcher = ApprovalWatcher(str(tmp_path), reader=_reader(tmp_path, threads), poll_interval=0.05)
+    waiting = asyncio.create_task(watcher.wait_for("approvals_john_1.txt", timeout=5))
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+
+    (tmp_path / "approvals_john_1.txt").write_text("Not Approved\nover\n", encoding="utf-8")
+    assert (await waiting)["decision"] == "rejected"
+    assert threading.main_thread() not in threads
+    assert watcher.pending() == []
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+import pytest
+
+from ulma_agents.batch import completed_lines, run_batch
+
+
+PROMPTS = []
+IN_FLIGHT = {"now": 0, "peak": 0}
+
+
+class SlowEcho(BaseLlm):
+    """Echoes the request after a short pause and records how many calls overlap."""
+
+    model: str = "scripted"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        text = llm_request.contents[-1].parts[0].text
+        PROMPTS.append(text)
+        IN_FLIGHT["now"] += 1
+        IN_FLIGHT["peak"] = max(IN_FLIGHT["peak"], IN_FLIGHT["now"])
+        await asyncio.sleep(0.02)
+        IN_FLIGHT["now"] -= 1
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"done: {text}")]))
+
+
+@pytest.fixture
+def agent():
+    PROMPTS.clear()
+    IN_FLIGHT.update(now=0, peak=0)
+    return LlmAgent(name="echo", model=SlowEcho())
+
+
+def _write_requests(path, count):
+    path.write_text("\n".join(json.dumps({"id": n, "request": f"review {n}"}) for n in range(1, count + 1)),
+                    encoding="utf-8")
+
+
+def _results(path):
+    rows = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_rerun_skips_recorded_lines_and_redoes_partial_or_failed_ones(db_path, agent, tmp_path):
+    requests = tmp_path / "wave.jsonl"
+    results = tmp_path / "wave_results.jsonl"
+    _write_requests(requests, 4)
+    results.write_text(
+        json.dumps({"line": 1, "status": "ok"}) + "\n"
+        + json.dumps({"line": 3, "status": "error", "error": "boom"}) + "\n"
+        + '{"line": 4, "sta',
+        encoding="utf-8",
+    )
+    assert completed_lines(str(results)) == {1, 3}
+    assert completed_lines(str(results), retry_errors=True) == {1}
+
+    summary = await run_batch(agent, str(requests), str(results), max_concurrency=1)
+    assert summary == {"results": str(results), "skipped": 2, "ok": 2, "awaiting_approval": 0, "error": 0}
+    assert sorted(PROMPTS) == ["review 2", "review 4"]
+    assert sorted(r["line"] for r in _results(results)) == [1, 2, 3, 4]
+
+    PROMPTS.clear()
+    summary = await run_batch(agent, str(requests), str(results), max_concurrency=1, retry_errors=True)
+    assert PROMPTS == ["review 3"]
+    assert summary["skipped"] == 3 and summary["ok"] == 1
+    assert completed_lines(str(results), retry_errors=True) == {1, 2, 3, 4}
+
+
+@pytest.mark.asyncio
+async def test_rows_run_concurrently_up_to_the_cap(db_path, agent, tmp_path):
+    requests = tmp_path / "review.jsonl"
+    results = tmp_path / "review_results.jsonl"
+    _write_requests(requests, 6)
+
+    summary = await run_batch(agent, str(requests), str(results), max_concurrency=2)
+    assert summary["ok"] == 6
+    assert IN_FLIGHT["peak"] == 2
+    rows = _results(results)
+    assert sorted(r["line"] for r in rows) == [1, 2, 3, 4, 5, 6]
+    assert {r["session_id"] for r in rows} == {f"batch_review_results_{n:06d}" for n in range(1, 7)}
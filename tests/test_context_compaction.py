@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from google.genai import types
+
+from ulma_agents.context_compaction import compact_contents, estimate_tokens
+
+
+def _user(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def _tool_turn(name, response):
+    call = types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args={}))])
+    result = types.Content(
+        role="user", parts=[types.Part(function_response=types.FunctionResponse(name=name, response=response))]
+    )
+    return [call, result]
+
+
+def _session(turns, payload_chars):
+    contents = []
+    for i in range(turns):
+        contents.append(_user(f"request {i}"))
+        contents.extend(_tool_turn("read_doc", {"text": "x" * payload_chars}))
+        contents.append(types.Content(role="model", parts=[types.Part(text=f"answer {i}")]))
+    return contents
+
+
+def test_contents_within_budget_are_returned_unchanged():
+    contents = _session(turns=3, payload_chars=100)
+    compacted, before, after = compact_contents(contents, 10_000, 1, 500)
+    assert compacted is contents
+    assert before == after == estimate_tokens(contents)
+
+
+def test_old_tool_payloads_are_stubbed_and_recent_turns_kept_verbatim():
+    contents = _session(turns=3, payload_chars=2000)
+    compacted, before, after = compact_contents(contents, 800, 1, 500)
+
+    assert after < before == estimate_tokens(contents)
+    assert len(compacted) == len(contents)
+    old_response = compacted[2].parts[0].function_response.response
+    assert old_response["compacted"] is True and old_response["original_chars"] > 2000
+    assert compacted[-4:] == contents[-4:]
+    assert compacted[-2].parts[0].function_response.response == {"text": "x" * 2000}
+
+
+def test_older_turns_become_one_summary_with_state_when_stubs_are_not_enough():
+    contents = _session(turns=6, payload_chars=2000)
+    state = {"APPROVAL_FILENAME": "approvals_jane_doe_1.txt", "EMPTY": ""}
+    compacted, before, after = compact_contents(
+        contents, 200, 2, 500, state=state, state_keys=("APPROVAL_FILENAME", "EMPTY")
+    )
+
+    summary = compacted[0].parts[0].text
+    assert compacted[1:] == contents[-8:]
+    assert after < before
+    assert "[Context compacted: 16 earlier messages omitted]" in summary
+    assert "- request 0" in summary and "- request 3" in summary and "request 4" not in summary
+    assert "read_doc x4" in summary
+    assert "APPROVAL_FILENAME: approvals_jane_doe_1.txt" in summary
+    assert "EMPTY" not in summary
+
+
+def test_sessions_with_only_recent_turns_are_not_compacted():
+    contents = _session(turns=2, payload_chars=5000)
+    compacted, before, after = compact_contents(contents, 100, 2, 500)
+    assert compacted is contents and before == after
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import pytest
+
+from ulma_agents import create_db
+from ulma_agents.create_db import (
+    connect_db,
+    ensure_memory_table,
+    load_memory_state,
+    memory_stats,
+    purge_orphan_blobs,
+    save_memory_state,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_digests(monkeypatch):
+    """Dirty-key tracking is per process; start every test without known sessions."""
+    monkeypatch.setattr(create_db, "_persisted_digests", {})
+
+
+def _kv_rows(session_id):
+    conn = connect_db()
+    rows = conn.execute(
+        "SELECT key, encoding, updated_at FROM agent_memory_kv WHERE session_id = ? ORDER BY key",
+        (session_id,),
+    ).fetchall()
+    conn.close()
+    return {key: (encoding, updated_at) for key, encoding, updated_at in rows}
+
+
+def test_legacy_state_json_is_split_into_per_key_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE agent_memory (session_id TEXT PRIMARY KEY, state_json TEXT, updated_at TEXT)")
+    conn.execute(
+        "INSERT INTO agent_memory VALUES (?, ?, ?)",
+        ("legacy", json.dumps({"STATE_IDENTITY_OK": True, "steps": ["identity"]}), "2025-01-01T00:00:00"),
+    )
+    conn.commit()
+    conn.close()
+
+    assert load_memory_state("legacy") == {"STATE_IDENTITY_OK": True, "steps": ["identity"]}
+    assert set(_kv_rows("legacy")) == {"STATE_IDENTITY_OK", "steps"}
+    conn = connect_db()
+    assert conn.execute("SELECT state_json FROM agent_memory WHERE session_id = 'legacy'").fetchone() == (None,)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == create_db.MEMORY_SCHEMA_VERSION
+    conn.close()
+
+
+def test_kv_rows_without_encoding_columns_are_migrated(db_path, monkeypatch):
+    big = "x" * 200
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE agent_memory_kv (session_id TEXT NOT NULL, key TEXT NOT NULL, value_json TEXT,"
+        " updated_at TEXT, PRIMARY KEY (session_id, key))"
+    )
+    conn.execute("INSERT INTO agent_memory_kv VALUES ('s', 'small', '1', 't')")
+    conn.execute("INSERT INTO agent_memory_kv VALUES ('s', 'big', ?, 't')", (json.dumps(big),))
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(create_db, "MEMORY_COMPRESS_BYTES", 100)
+
+    ensure_memory_table()
+    assert _kv_rows("s")["small"][0] == "json"
+    assert _kv_rows("s")["big"][0] == "zlib"
+    assert load_memory_state("s") == {"small": 1, "big": big}
+
+
+def test_save_rewrites_only_changed_keys_and_drops_removed_ones(db_path):
+    save_memory_state("s-1", {"a": 1, "b": {"nested": True}, "c": "gone"})
+    first = _kv_rows("s-1")
+
+    save_memory_state("s-1", {"a": 2, "b": {"nested": True}})
+    second = _kv_rows("s-1")
+
+    assert set(second) == {"a", "b"}
+    assert second["b"] == first["b"]
+    assert second["a"][1] != first["a"][1]
+    assert load_memory_state("s-1") == {"a": 2, "b": {"nested": True}}
+
+
+def test_first_save_in_a_process_drops_keys_missing_from_the_state(db_path, monkeypatch):
+    save_memory_state("s-1", {"a": 1, "stale": True})
+    monkeypatch.setattr(create_db, "_persisted_digests", {})
+
+    save_memory_state("s-1", {"a": 1})
+    assert load_memory_state("s-1") == {"a": 1}
+
+
+def test_large_values_are_compressed_and_very_large_ones_spilled_once(db_path, monkeypatch):
+    monkeypatch.setattr(create_db, "MEMORY_COMPRESS_BYTES", 100)
+    monkeypatch.setattr(create_db, "MEMORY_SPILL_BYTES", 1000)
+    medium = "m" * 500
+    huge = "h" * 5000
+
+    save_memory_state("s-1", {"small": 1, "medium": medium, "huge": huge})
+    save_memory_state("s-2", {"huge": huge})
+
+    encodings = {key: encoding for key, (encoding, _) in _kv_rows("s-1").items()}
+    assert encodings == {"small": "json", "medium": "zlib", "huge": "ref"}
+    assert memory_stats()["blobs"] == 1
+    assert load_memory_state("s-1") == {"small": 1, "medium": medium, "huge": huge}
+    assert load_memory_state("s-2") == {"huge": huge}
+
+
+def test_orphan_blobs_are_purged_once_unreferenced(db_path, monkeypatch):
+    monkeypatch.setattr(create_db, "MEMORY_SPILL_BYTES", 1000)
+    save_memory_state("s-1", {"huge": "h" * 5000})
+    assert purge_orphan_blobs() == 0
+
+    save_memory_state("s-1", {"huge": "small now"})
+    assert purge_orphan_blobs() == 1
+    assert memory_stats()["blobs"] == 0
+
+
+def test_rows_deleted_elsewhere_are_rewritten_on_the_next_save(db_path):
+    save_memory_state("s-1", {"kept": 1, "new": 1})
+    conn = connect_db()
+    conn.execute("DELETE FROM agent_memory_kv WHERE session_id = 's-1'")
+    conn.commit()
+    conn.close()
+
+    save_memory_state("s-1", {"kept": 1, "new": 2})
+    assert load_memory_state("s-1") == {"kept": 1, "new": 2}
+
+
+def test_dirty_key_tracking_is_per_database(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_NAME", str(tmp_path / "first.db"))
+    save_memory_state("s-1", {"kept": 1, "new": 1})
+
+    monkeypatch.setenv("DATABASE_NAME", str(tmp_path / "second.db"))
+    save_memory_state("s-1", {"kept": 1, "new": 2})
+    assert load_memory_state("s-1") == {"kept": 1, "new": 2}
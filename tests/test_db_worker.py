@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from ulma_agents.db_worker import DbWorker, get_db_worker, run_db
+
+
+def test_calls_run_in_order_on_one_thread():
+    worker = DbWorker(name="test-db")
+    seen = []
+    futures = [worker.submit(lambda i=i: seen.append((i, threading.current_thread().name))) for i in range(20)]
+    for future in futures:
+        future.result(timeout=5)
+    assert [i for i, _ in seen] == list(range(20))
+    assert {name for _, name in seen} == {"test-db"}
+    assert worker.stats["completed"] == 20
+
+
+def test_nested_submit_runs_inline_instead_of_deadlocking():
+    worker = DbWorker(name="test-db")
+    outer = worker.submit(lambda: worker.submit(lambda: "inner").result(timeout=1))
+    assert outer.result(timeout=5) == "inner"
+
+
+def test_errors_reach_the_caller():
+    worker = DbWorker(name="test-db")
+
+    def boom():
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        worker.submit(boom).result(timeout=5)
+    assert worker.stats["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_run_db_keeps_blocking_work_off_the_loop():
+    loop_thread = threading.current_thread()
+    thread = await run_db(threading.current_thread)
+    assert thread is not loop_thread
+    assert thread is get_db_worker()._thread
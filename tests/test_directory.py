@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+
+from ulma_agents import directory
+from ulma_agents.create_db import connect_db
+
+
+def test_import_upserts_and_search_matches(db_path, tmp_path):
+    """Bulk import is idempotent per user_name and search handles exact, partial and typo queries."""
+    source = tmp_path / "users.jsonl"
+    rows = [
+        {"user_name": "Serena van der Woodsen", "role": "manager", "groups": ["hr", "finance"]},
+        {"user_name": "Mikkel Nielson", "role": "employee"},
+        {"name": "serena van der woodsen", "role": "director"},
+    ]
+    source.write_text("\n".join(json.dumps(r) for r in rows), encoding="utf-8")
+
+    result = directory.import_users(str(source), batch_size=2)
+    assert result["records"] == 3 and result["batches"] == 2
+
+    exact = directory.find_users("Serena van der Woodsen")
+    assert exact["exact"] is True
+    assert exact["matches"][0]["role"] == "director"
+    assert len(directory.find_users("woodsen")["matches"]) == 1
+    assert directory.find_users("Mikel Nielsn")["matches"][0]["user_name"] == "Mikkel Nielson"
+
+
+def test_search_index_follows_updates_and_deletes(db_path):
+    conn = connect_db()
+    directory.ensure_directory_schema(conn)
+    conn.execute("INSERT INTO users (user_name, role) VALUES ('Blair Waldorf', 'employee')")
+    conn.execute("INSERT INTO users (user_name, role) VALUES ('Dan Humphrey', 'employee')")
+    conn.execute("UPDATE users SET user_name = 'Blair Bass' WHERE user_name = 'Blair Waldorf'")
+    conn.execute("DELETE FROM users WHERE user_name = 'Dan Humphrey'")
+    conn.commit()
+    conn.close()
+
+    assert [m["user_name"] for m in directory.find_users("bass")["matches"]] == ["Blair Bass"]
+    assert directory.find_users("waldorf")["matches"] == []
+    assert directory.find_users("humphrey")["matches"] == []
+
+
+def test_duplicates_are_exported_not_deleted(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(directory, "LOG_DIR", str(tmp_path / "logs"))
+    conn = connect_db()
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, user_name TEXT NOT NULL, role TEXT NOT NULL, groups TEXT, apps)")
+    conn.executemany(
+        "INSERT INTO users (user_name, role) VALUES (?, ?)",
+        [("Nate Archibald", "employee"), ("nate archibald", "manager"), ("Lily Rhodes", "employee")],
+    )
+    conn.commit()
+
+    directory.ensure_directory_schema(conn)
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 3
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_users_user_name'").fetchone() is None
+    exported = list((tmp_path / "logs" / "directory").glob("duplicate_users_*.jsonl"))
+    assert len(exported) == 1
+    names = [json.loads(line)["user_name"] for line in exported[0].read_text().splitlines()]
+    assert names == ["Nate Archibald", "nate archibald"]
+    source = tmp_path / "users.csv"
+    source.write_text("user_name,role\nLily Rhodes,director\n", encoding="utf-8")
+    with pytest.raises(RuntimeError, match="duplicate"):
+        directory.import_users(str(source))
+
+    conn.execute("DELETE FROM users WHERE user_name = 'nate archibald'")
+    conn.commit()
+    directory.ensure_directory_schema(conn)
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_users_user_name'").fetchone() is not None
+    assert directory.import_users(str(source))["records"] == 1
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_search_tool_queries_on_the_db_worker(db_path, monkeypatch):
+    threads = []
+    find_users = directory.find_users
+
+    def recording(query, limit=10):
+        threads.append(threading.current_thread())
+        return find_users(query, limit)
+
+    monkeypatch.setattr(directory, "find_users", recording)
+    assert await directory.search_directory("nobody") == {"query": "nobody", "exact": False, "matches": []}
+    assert threads and threading.main_thread() not in threads
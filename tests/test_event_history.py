@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from ulma_agents import event_history
+
+
+def _event(text: str, invocation_id: str = "inv-1"):
+    part = SimpleNamespace(text=text, function_call=None, function_response=None)
+    return SimpleNamespace(
+        id=None, invocation_id=invocation_id, author="supervisor", content=SimpleNamespace(parts=[part])
+    )
+
+
+def test_ring_buffer_is_bounded_and_spill_keeps_full_history(tmp_path):
+    """Memory holds the newest summaries only; the spill file pages through everything, across restarts."""
+    spill = tmp_path / "s.events.jsonl"
+    history = event_history.EventHistory(maxlen=3, spill_path=str(spill))
+    for i in range(10):
+        history.record(_event(f"event {i}"))
+
+    assert [e["text"] for e in history.recent()] == ["event 7", "event 8", "event 9"]
+    page = history.page(offset=0, limit=4)
+    assert page["total"] == 10
+    assert [e["text"] for e in page["events"]] == ["event 9", "event 8", "event 7", "event 6"]
+    oldest = history.page(offset=0, limit=2, newest_first=False)
+    assert [e["text"] for e in oldest["events"]] == ["event 0", "event 1"]
+
+    with spill.open("ab") as handle:
+        handle.write(b'{"text": "cut sh')
+    reopened = event_history.EventHistory(maxlen=3, spill_path=str(spill))
+    reopened.record(_event("event 10"))
+    assert reopened.page(limit=2)["total"] == 11
+    assert [e["text"] for e in reopened.page(limit=2)["events"]] == ["event 10", "event 9"]
+
+
+def test_memory_only_paging_and_truncated_previews():
+    history = event_history.EventHistory(maxlen=2)
+    history.record(_event("x" * (event_history.TEXT_PREVIEW_CHARS + 10)))
+    for i in range(3):
+        history.record(_event(f"event {i}"))
+
+    page = history.page(offset=0, limit=10)
+    assert page["total"] == 4
+    assert [e["text"] for e in page["events"]] == ["event 2", "event 1"]
+    assert history.page(offset=2, limit=2)["events"] == []
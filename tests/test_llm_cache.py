@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+import pytest
+
+from ulma_agents.config import LlmCacheConfiguration
+from ulma_agents.llm_cache import LlmCachePlugin, cache_key, cache_lookup, cache_report, cache_store
+
+
+def _request(text="Extract the policy", instruction="You extract policies.", call_id="c-1", tools=None, model="m"):
+    contents = [
+        types.Content(role="user", parts=[types.Part(text=text)]),
+        types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(id=call_id, name="read_doc", args={"name": "offboarding"}))
+        ]),
+        types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(id=call_id, name="read_doc", response={"text": "..."}))
+        ]),
+    ]
+    config = types.GenerateContentConfig(system_instruction=instruction, tools=tools)
+    return LlmRequest(model=model, contents=contents, config=config)
+
+
+def _tool(name):
+    return [types.Tool(function_declarations=[types.FunctionDeclaration(name=name, description=name)])]
+
+
+def _reply(part):
+    return LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def test_cache_key_ignores_whitespace_and_call_ids():
+    assert cache_key(_request()) == cache_key(_request(text="  Extract   the\npolicy ", call_id="c-2"))
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        {"text": "Extract the other policy"},
+        {"instruction": "You summarize policies."},
+        {"tools": _tool("read_doc")},
+        {"model": "other-model"},
+    ],
+)
+def test_cache_key_changes_with_prompt_history_tools_or_model(changed):
+    assert cache_key(_request()) != cache_key(_request(**changed))
+
+
+def test_lookup_respects_ttl_and_stores_evict_least_recently_used(db_path):
+    cache_store("a", "policy_agent", "m", "A", ttl_seconds=60, max_entries=2)
+    cache_store("b", "policy_agent", "m", "B", ttl_seconds=60, max_entries=2)
+    assert cache_lookup("a", "policy_agent", ttl_seconds=60) == "A"
+    assert cache_lookup("a", "policy_agent", ttl_seconds=-1) is None
+
+    cache_store("c", "policy_agent", "m", "C", ttl_seconds=60, max_entries=2)
+    assert cache_lookup("b", "policy_agent", ttl_seconds=60) is None
+    assert cache_lookup("c", "policy_agent", ttl_seconds=60) == "C"
+    [report] = cache_report()
+    assert report == {
+        "agent": "policy_agent", "hits": 2, "misses": 2, "hit_rate": 0.5, "stores": 3, "entries": 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_plugin_serves_repeated_calls_of_eligible_agents(db_path):
+    plugin = LlmCachePlugin(agents=("policy_agent",), ttl_seconds=60, max_entries=10)
+    ctx = SimpleNamespace(agent_name="policy_agent", invocation_id="inv-1")
+
+    assert await plugin.before_model_callback(callback_context=ctx, llm_request=_request()) is None
+    await plugin.after_model_callback(callback_context=ctx, llm_response=_reply(types.Part(text="policy: 3 steps")))
+
+    cached = await plugin.before_model_callback(callback_context=ctx, llm_request=_request(call_id="c-9"))
+    assert cached.content.parts[0].text == "policy: 3 steps"
+
+    other = SimpleNamespace(agent_name="supervisor", invocation_id="inv-1")
+    assert await plugin.before_model_callback(callback_context=other, llm_request=_request()) is None
+
+
+@pytest.mark.asyncio
+async def test_plugin_does_not_store_responses_calling_side_effect_tools(db_path):
+    plugin = LlmCachePlugin(agents=("policy_agent",), ttl_seconds=60, max_entries=10)
+    ctx = SimpleNamespace(agent_name="policy_agent", invocation_id="inv-1")
+    notify = types.Part(function_call=types.FunctionCall(name="send_teams_message", args={"kind": "summaries"}))
+
+    await plugin.before_model_callback(callback_context=ctx, llm_request=_request())
+    await plugin.after_model_callback(callback_context=ctx, llm_response=_reply(notify))
+    assert await plugin.before_model_callback(callback_context=ctx, llm_request=_request()) is None
+    assert cache_report()[0]["stores"] == 0
+
+
+def test_defaults_cache_only_side_effect_free_agents():
+    settings = LlmCacheConfiguration()
+    assert "teams_agent" not in settings.agents
+    assert {"send_manager_message", "save_flow_log", "send_teams_message"} <= set(settings.uncacheable_tools)
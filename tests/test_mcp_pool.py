@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import dataclasses
+
+import anyio
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.mcp_tool.mcp_session_manager import SseConnectionParams
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+import pytest
+
+from ulma_agents.config import mcp_pool
+from ulma_agents.mcp_pool import PooledMcpTool, PooledMcpToolset
+
+
+class ScriptedTool(BaseTool):
+    """Plays back its outcomes in order; an exception outcome is raised."""
+
+    def __init__(self, name, outcomes):
+        super().__init__(name=name, description=name)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def run_async(self, *, args, tool_context):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+class SessionManagerStub:
+    def __init__(self):
+        self.closed = 0
+
+    async def close(self):
+        self.closed += 1
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Replaces the MCP round trip of list_tools with a scripted server."""
+    state = {"lists": 0, "drop_next": 0, "tools": ["get_user", "create_user"]}
+
+    async def list_tools(self, readonly_context=None):
+        state["lists"] += 1
+        if state["drop_next"]:
+            state["drop_next"] -= 1
+            raise anyio.ClosedResourceError()
+        return [ScriptedTool(name, []) for name in state["tools"]]
+
+    monkeypatch.setattr(McpToolset, "get_tools", list_tools)
+    return state
+
+
+def _pool(**overrides):
+    settings = dataclasses.replace(
+        mcp_pool, health_interval_seconds=0, reconnect_base_delay=0, reconnect_max_delay=0, **overrides
+    )
+    pool = PooledMcpToolset(connection_params=SseConnectionParams(url="http://mcp.test/sse"), settings=settings)
+    pool._mcp_session_manager = SessionManagerStub()
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_tool_list_is_cached_until_invalidated(server):
+    pool = _pool()
+    first = await pool.get_tools()
+    second = await pool.get_tools()
+
+    assert [t.name for t in first] == ["get_user", "create_user"]
+    assert all(isinstance(t, PooledMcpTool) and t.pool is pool for t in first)
+    assert [t.tool for t in second] == [t.tool for t in first]
+    assert server["lists"] == 1
+    assert pool.stats()["list_hits"] == 1 and pool.stats()["tools_cached"] == 2
+
+    server["tools"] = ["get_user"]
+    pool.invalidate_tools()
+    assert [t.name for t in await pool.get_tools()] == ["get_user"]
+    assert server["lists"] == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_list_and_unknown_tool_errors_relist(server):
+    pool = _pool(tools_ttl_seconds=0)
+    await pool.get_tools()
+    await pool.get_tools()
+    assert server["lists"] == 2
+
+    pool = _pool()
+    [get_user, _] = await pool.get_tools()
+    get_user.tool.outcomes.append({"isError": True, "content": "Unknown tool: get_user"})
+    await get_user.run_async(args={}, tool_context=None)
+    await pool.get_tools()
+    assert server["lists"] == 4
+
+
+@pytest.mark.asyncio
+async def test_dropped_session_is_reopened_and_read_only_calls_resent(server):
+    pool = _pool()
+    tools = await pool.get_tools()
+    tool = ScriptedTool("get_user", [anyio.ClosedResourceError(), {"upn": "jane@contoso.com"}])
+
+    assert await pool.call_tool(tool, {"upn": "jane@contoso.com"}, None) == {"upn": "jane@contoso.com"}
+    assert tool.calls == 2
+    assert pool._mcp_session_manager.closed == 1
+    assert pool.stats()["reconnects"] == 1 and pool.stats()["connection_errors"] == 1
+
+    # The reconnect drops the cached list, so the server is listed again.
+    assert [t.name for t in await pool.get_tools()] == [t.name for t in tools]
+    assert server["lists"] == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_are_not_resent_after_a_dropped_session(server):
+    pool = _pool()
+    tool = ScriptedTool("create_user", [ConnectionResetError("reset by peer"), {"status": "created"}])
+
+    with pytest.raises(ConnectionResetError):
+        await pool.call_tool(tool, {"upn": "jane@contoso.com"}, None)
+    assert tool.calls == 1
+    assert pool.stats()["reconnects"] == 1
+
+
+@pytest.mark.asyncio
+async def test_listing_survives_a_dropped_session_up_to_the_attempt_limit(server):
+    server["drop_next"] = 1
+    pool = _pool(reconnect_attempts=1)
+    assert len(await pool.get_tools()) == 2
+    assert pool._mcp_session_manager.closed == 1
+
+    server["drop_next"] = 2
+    pool = _pool(reconnect_attempts=1)
+    with pytest.raises(anyio.ClosedResourceError):
+        await pool.get_tools()
+    assert pool.stats()["reconnects"] == 2
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+import pytest
+
+from ulma_agents.model_tiering import ModelTieringPlugin, classify_request, tier_report
+
+
+SEEN_MODELS = []
+
+
+class ModelRecorder(BaseLlm):
+    """Answers with a fixed text and records the model each call was routed to."""
+
+    model: str = "default-model"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        SEEN_MODELS.append(llm_request.model)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+
+
+def test_short_specified_requests_are_routine():
+    profile = classify_request(
+        "Onboard Jane Doe using the onboarding policy",
+        {"goal": "onboard", "user_name": "Jane Doe", "policy_doc": "onboarding_policy"},
+    )
+    assert profile == {"tier": "routine", "risk": "normal", "complexity": "simple", "reasons": []}
+
+
+@pytest.mark.parametrize(
+    "text, parsed, state, reason",
+    [
+        ("Delete Jane Doe's account", None, None, "high-risk keyword: delete"),
+        ("check again", None, {"APPROVAL_FILENAME": "approvals_jane_doe_1.txt"}, "approval in progress"),
+        ("Set up Jane or John with whatever apps", None, None, "ambiguity markers: or, whatever"),
+        ("set up " + "word " * 80, None, None, "long request (82 words)"),
+        ("Onboard Jane", {"goal": "onboard", "user_name": "Jane", "policy_doc": None}, None,
+         "missing fields: policy_doc"),
+        ("Onboard them", [{"user_name": "Jane"}, {"user_name": "John"}], None, "multiple users"),
+    ],
+)
+def test_risky_or_ambiguous_requests_are_escalated(text, parsed, state, reason):
+    profile = classify_request(text, parsed, state)
+    assert profile["tier"] == "escalated"
+    assert reason in profile["reasons"]
+
+
+async def _run(plugin, text):
+    SEEN_MODELS.clear()
+    runner = Runner(
+        app_name="ulma-test",
+        agent=LlmAgent(name="supervisor", model=ModelRecorder()),
+        session_service=InMemorySessionService(),
+        plugins=[plugin],
+    )
+    session = await runner.session_service.create_session(app_name="ulma-test", user_id="user")
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    return [e async for e in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+
+@pytest.mark.asyncio
+async def test_plugin_routes_by_tier_and_records_the_outcome(db_path):
+    plugin = ModelTieringPlugin(tiers={"routine": {}, "escalated": {"supervisor": "escalated-model"}})
+
+    await _run(plugin, "List the onboarding steps")
+    assert SEEN_MODELS == ["default-model"]
+    await _run(plugin, "Delete Jane Doe's account")
+    assert SEEN_MODELS == ["escalated-model"]
+
+    report = {row["tier"]: row for row in tier_report()}
+    assert set(report) == {"routine", "escalated"}
+    assert report["escalated"]["invocations"] == 1
+    assert report["escalated"]["ok_rate"] == 1.0
+    assert report["routine"]["avg_model_calls"] == 1
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from ulma_agents import preflight
+from ulma_agents.preflight import extract_policy_constraints, preflight_check
+
+POLICY = "General Policies for Onboarding_Offboarding"
+
+
+def test_missing_policy_document_returns_no_constraints():
+    assert extract_policy_constraints("no_such_policy", "Onboard") == {
+        "policy_doc": "no_such_policy", "found": False, "constraints": [],
+    }
+
+
+def test_policy_pdf_lines_with_obligations_are_selected():
+    result = extract_policy_constraints(POLICY + ".pdf", "Onboard as employee with Workday access")
+    assert result["found"] is True
+    assert "c. They must not have access to," in result["constraints"]
+    assert all(preflight._OBLIGATION.search(line) for line in result["constraints"])
+    assert len(extract_policy_constraints(POLICY, "Onboard", limit=2)["constraints"]) == 2
+
+
+def test_goal_keywords_narrow_the_lines_and_unmatched_goals_get_every_obligation(monkeypatch):
+    lines = [
+        "Leavers must be disabled on their last day.",
+        "New hires must be added to the onboarding group.",
+        "Payroll is handled by HR.",
+        "Admins should review privileged roles monthly.",
+    ]
+    monkeypatch.setattr(preflight, "_policy_lines", lambda policy_doc: lines)
+
+    assert extract_policy_constraints("p", "offboard Jane")["constraints"] == [lines[0]]
+    assert extract_policy_constraints("p", "onboarding a joiner")["constraints"] == [lines[1]]
+    fallback = extract_policy_constraints("p", "rename mailbox")
+    assert fallback["constraints"] == [lines[0], lines[1], lines[3]]
+    assert fallback["total_matches"] == 3
+
+
+@pytest.mark.asyncio
+async def test_preflight_leaves_the_policy_step_to_policy_agent(db_path, make_tool_context):
+    tool_context = await make_tool_context()
+    result = await preflight_check("Jane Doe", "Onboard as employee", POLICY, tool_context)
+
+    assert result["policy"]["constraints"]
+    assert "STATE_POLICY_OK" not in tool_context.state
+    assert "policy_constraints" not in tool_context.state
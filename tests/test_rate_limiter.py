@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from ulma_agents.rate_limiter import RateScheduler
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_models_without_a_budget_are_not_limited():
+    scheduler = RateScheduler(budgets={})
+    grants = [await scheduler.acquire("gemini-any", 10**6) for _ in range(100)]
+    assert all(g.waited == 0 and g.entry is None for g in grants)
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_rpm_wait_for_the_window():
+    scheduler = RateScheduler(budgets={"m": {"rpm": 2}}, window=0.2)
+    await scheduler.acquire("m", 1)
+    await scheduler.acquire("m", 1)
+
+    third = asyncio.create_task(scheduler.acquire("m", 1))
+    await _settle()
+    assert not third.done()
+    assert scheduler.queue_depth("m") == 1
+
+    grant = await asyncio.wait_for(third, 2)
+    assert grant.waited >= 0.1
+    assert scheduler.stats()["m"]["granted"] == {"interactive": 3}
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_are_admitted_before_queued_batch_calls():
+    scheduler = RateScheduler(budgets={"m": {"rpm": 1}}, window=0.1)
+    await scheduler.acquire("m", 1)
+    order = []
+
+    async def call(priority):
+        await scheduler.acquire("m", 1, priority)
+        order.append(priority)
+
+    batch = asyncio.create_task(call("batch"))
+    await _settle()
+    interactive = asyncio.create_task(call("interactive"))
+    await asyncio.wait_for(asyncio.gather(batch, interactive), 2)
+    assert order == ["interactive", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_settling_below_the_estimate_admits_waiting_calls():
+    scheduler = RateScheduler(budgets={"m": {"tpm": 100}}, window=60)
+    grant = await scheduler.acquire("m", 80)
+    waiting = asyncio.create_task(scheduler.acquire("m", 50))
+    await _settle()
+    assert not waiting.done()
+
+    scheduler.settle(grant, 20)
+    await asyncio.wait_for(waiting, 1)
+    assert scheduler.stats()["m"]["tpm_used"] == 70
+
+
+@pytest.mark.asyncio
+async def test_a_call_larger_than_the_budget_runs_once_the_window_is_empty():
+    scheduler = RateScheduler(budgets={"m": {"tpm": 100}}, window=60)
+    grant = await asyncio.wait_for(scheduler.acquire("m", 500), 1)
+    assert grant.waited == 0
+
+
+@pytest.mark.asyncio
+async def test_cool_down_holds_back_calls_until_it_ends():
+    scheduler = RateScheduler(budgets={"m": {"rpm": 100}}, window=60)
+    scheduler.cool_down("m", 0.15)
+    grant = await asyncio.wait_for(scheduler.acquire("m", 1), 2)
+    assert grant.waited >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = RateScheduler(budgets={"m": {"rpm": 1}}, window=60)
+    await scheduler.acquire("m", 1)
+    waiter = asyncio.create_task(scheduler.acquire("m", 1))
+    await _settle()
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.queue_depth("m") == 0
+    assert scheduler.stats()["m"]["rpm_used"] == 1
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+import pytest
+
+from ulma_agents.resumer import (
+    ApprovalResumer,
+    _claim_paused_invocation,
+    list_paused_invocations,
+    record_paused_invocation,
+)
+from ulma_agents.runner import agent_sessions
+from ulma_agents.approval_queue import ensure_teams_dirs
+from ulma_agents.tools import queue_high_risk_approval
+
+
+class ApprovalScript(BaseLlm):
+    """Asks for a deletion approval, then reports the decision the tool returned."""
+
+    model: str = "scripted"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        last = None
+        for part in llm_request.contents[-1].parts or []:
+            if part.function_response is not None:
+                last = part.function_response
+        if last is None:
+            part = types.Part(
+                function_call=types.FunctionCall(
+                    name="queue_high_risk_approval", args={"user_name": "Jane Doe", "action": "deletion"}
+                )
+            )
+        else:
+            part = types.Part(text=f"decision: {last.response.get('status')}")
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def _texts(events):
+    return [p.text for e in events for p in (getattr(e.content, "parts", None) or []) if getattr(p, "text", None)]
+
+
+@pytest.mark.asyncio
+async def test_approval_suspends_the_turn_and_resumes_on_reply(db_path):
+    agent = LlmAgent(name="approver", model=ApprovalScript(), tools=[queue_high_risk_approval])
+    resumed = []
+    done = asyncio.Event()
+
+    def on_resumed(record, event):
+        resumed.append(event)
+        if any("decision:" in t for t in _texts([event])):
+            done.set()
+
+    handle = agent_sessions(agent, on_resumed_event=on_resumed, session_id="s-approval")
+
+    async def no_saved_filename():
+        return None
+
+    # The reply filename must come from the confirmation payload, not from saved state.
+    handle._get_pending_approval_file = no_saved_filename
+    events = [e async for e in await handle.execute(
+        types.Content(role="user", parts=[types.Part(text="delete Jane Doe")]), stream=False
+    )]
+    assert any("High-risk operation paused" in t for t in _texts(events))
+
+    [record] = [r for r in list_paused_invocations(handle.app_name) if r["session_id"] == "s-approval"]
+    assert record["filename"].startswith("approvals_jane_doe_")
+
+    outgoing = ensure_teams_dirs()["outgoing"]
+    with open(os.path.join(outgoing, record["filename"]), "w", encoding="utf-8") as f:
+        f.write("Approved\nover\n")
+    await asyncio.wait_for(done.wait(), 10)
+
+    assert "decision: approved" in _texts(resumed)
+    for _ in range(100):
+        if list_paused_invocations(handle.app_name, status="resumed"):
+            break
+        await asyncio.sleep(0.05)
+    assert [r["id"] for r in list_paused_invocations(handle.app_name, status="resumed")] == [record["id"]]
+
+
+@pytest.mark.asyncio
+async def test_resume_interrupted_by_a_restart_is_retried_on_start(db_path):
+    calls = []
+
+    async def run_async(**kwargs):
+        calls.append(kwargs)
+        yield types.Content(role="model", parts=[types.Part(text="resumed")])
+
+    runner = SimpleNamespace(app_name="ulma-crash", session_service=InMemorySessionService(), run_async=run_async)
+    record = record_paused_invocation("ulma-crash", "user", "s-crash", "inv-1", "adk-1", "approvals_crash_1.txt")
+    # The previous process claimed the record and stopped before finishing the resume.
+    assert _claim_paused_invocation(record["id"], "approved")
+    with open(os.path.join(ensure_teams_dirs()["outgoing"], "approvals_crash_1.txt"), "w", encoding="utf-8") as f:
+        f.write("Approved\nover\n")
+
+    assert await ApprovalResumer(runner).start() == 1
+    for _ in range(100):
+        if list_paused_invocations("ulma-crash", status="resumed"):
+            break
+        await asyncio.sleep(0.05)
+    assert [r["id"] for r in list_paused_invocations("ulma-crash", status="resumed")] == [record["id"]]
+    assert calls[0]["invocation_id"] == "inv-1"
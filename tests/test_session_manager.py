@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+import pytest
+
+from ulma_agents.session_manager import FairLimiter, SessionManager
+
+
+class EchoScript(BaseLlm):
+    """Answers every turn with the user's text."""
+
+    model: str = "scripted"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        text = llm_request.contents[-1].parts[0].text
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"echo: {text}")]))
+
+
+def _manager(**kwargs):
+    agent = LlmAgent(name="echo", model=EchoScript())
+    return SessionManager(agent, session_service=InMemorySessionService(), **kwargs)
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_fair_limiter_grants_freed_slots_round_robin_by_key():
+    limiter = FairLimiter(1)
+    await limiter.acquire("holder")
+    order = []
+
+    async def turn(key, label):
+        await limiter.acquire(key)
+        order.append(label)
+        limiter.release()
+
+    tasks = [asyncio.create_task(turn(key, label)) for key, label in
+             [("busy", "busy-1"), ("busy", "busy-2"), ("busy", "busy-3"), ("quiet", "quiet-1")]]
+    await _settle()
+    assert limiter.waiting() == 4
+
+    limiter.release()
+    await asyncio.gather(*tasks)
+    assert order == ["busy-1", "quiet-1", "busy-2", "busy-3"]
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_limiter_cancelled_waiter_does_not_leak_a_slot():
+    limiter = FairLimiter(1)
+    await limiter.acquire("a")
+    waiter = asyncio.create_task(limiter.acquire("b"))
+    await _settle()
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.waiting() == 0
+    limiter.release()
+    assert limiter.active == 0
+    await asyncio.wait_for(limiter.acquire("c"), 1)
+
+
+@pytest.mark.asyncio
+async def test_turns_queue_per_session_and_run_concurrently_up_to_the_cap(db_path):
+    manager = _manager(max_concurrent_turns=2)
+    running = set()
+    peak = {"same": 0, "all": 0}
+
+    async def turn(session_id, label):
+        async with manager.turn(session_id):
+            running.add(label)
+            peak["same"] = max(peak["same"], len([r for r in running if r.startswith("s1")]))
+            peak["all"] = max(peak["all"], len(running))
+            await asyncio.sleep(0.01)
+            running.discard(label)
+
+    await asyncio.gather(
+        turn("s1", "s1-a"), turn("s1", "s1-b"), turn("s2", "s2-a"), turn("s3", "s3-a"), turn("s4", "s4-a"),
+    )
+    assert peak == {"same": 1, "all": 2}
+    assert manager.stats_counters["turns"] == 5
+    assert manager.stats_counters["queued"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_sessions_share_one_runner_and_keep_their_own_history(db_path):
+    manager = _manager()
+
+    async def say(session_id, text):
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        return [e async for e in manager.execute(message, session_id=session_id)]
+
+    await asyncio.gather(say("s1", "hello"), say("s2", "bonjour"))
+    await say("s1", "again")
+
+    assert manager.session("s1").runner is manager.session("s2").runner
+    s1 = await manager.session_service.get_session(app_name=manager.runner.app_name, user_id="user", session_id="s1")
+    s1_texts = [p.text for e in s1.events for p in (e.content.parts if e.content else []) if p.text]
+    assert s1_texts == ["hello", "echo: hello", "again", "echo: again"]
+
+
+@pytest.mark.asyncio
+async def test_idle_handles_beyond_the_cap_are_evicted_unless_busy(db_path):
+    manager = _manager()
+    manager.max_open_sessions = 1
+    busy = manager.session("busy")
+
+    async with manager.turn("busy"):
+        manager.session("idle-1")
+        assert ("user", "busy") in manager._sessions
+        manager.session("idle-2")
+        assert ("user", "idle-1") not in manager._sessions
+
+    manager.session("idle-3")
+    assert list(manager._sessions) == [("user", "idle-3")]
+    assert manager.session("busy") is not busy
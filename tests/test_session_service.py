@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+import pytest
+
+from ulma_agents.session_service import SqliteSessionService
+
+
+def _event(i: int, delta=None) -> Event:
+    return Event(author="user", invocation_id=f"inv-{i}", actions=EventActions(state_delta=delta or {}))
+
+
+@pytest.mark.asyncio
+async def test_history_and_scoped_state_survive_a_restart(db_path):
+    service = SqliteSessionService()
+    session = await service.create_session(app_name="app", user_id="u", session_id="s", state={"user:lang": "en"})
+    for i in range(250):
+        await service.append_event(session, _event(i, {"turn": i, "temp:scratch": i}))
+
+    reloaded = await SqliteSessionService().get_session(app_name="app", user_id="u", session_id="s")
+    assert len(reloaded.events) == 250
+    assert reloaded.state["turn"] == 249
+    assert reloaded.state["user:lang"] == "en"
+    assert "temp:scratch" not in reloaded.state
+
+
+@pytest.mark.asyncio
+async def test_windows_and_pages_are_explicit(db_path):
+    service = SqliteSessionService(event_window=3)
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    for i in range(10):
+        await service.append_event(session, _event(i))
+
+    fresh = SqliteSessionService()
+    window = await fresh.get_session(
+        app_name="app", user_id="u", session_id="s", config=GetSessionConfig(num_recent_events=4)
+    )
+    assert [e.invocation_id for e in window.events] == ["inv-6", "inv-7", "inv-8", "inv-9"]
+    page = await fresh.page_events(app_name="app", user_id="u", session_id="s", offset=2, limit=3)
+    assert [e.invocation_id for e in page] == ["inv-2", "inv-3", "inv-4"]
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_and_evicted_sessions_reload(db_path):
+    service = SqliteSessionService(max_cached_sessions=2)
+    for sid in ("a", "b", "c"):
+        session = await service.create_session(app_name="app", user_id="u", session_id=sid, state={"sid": sid})
+        await service.append_event(session, _event(0))
+    assert service.cache_stats()["live"] == 2
+    assert service.cache_stats()["evicted"] == 1
+
+    evicted = await service.get_session(app_name="app", user_id="u", session_id="a")
+    assert evicted.state["sid"] == "a" and len(evicted.events) == 1
+    assert service.stats["loads"] == 1
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from ulma_agents.create_db import load_memory_state
+from ulma_agents.state_writer import StateWriter, get_state_writer, snapshot_state
+from ulma_agents.tools import save_step_status
+
+
+@pytest.mark.asyncio
+async def test_tool_state_write_reaches_agent_memory_after_flush(db_path, make_tool_context):
+    """Tool-side saves are keyed by the ADK session id and written by the next flush."""
+    tool_context = await make_tool_context()
+    session_id = tool_context.session.id
+
+    save_step_status(tool_context, step="identity", done=True)
+    assert get_state_writer().pending_state(session_id)["STATE_IDENTITY_OK"] is True
+
+    await get_state_writer().aflush(session_id)
+    assert load_memory_state(session_id)["STATE_IDENTITY_OK"] is True
+    assert get_state_writer().pending_state(session_id) is None
+
+
+def test_snapshot_is_deep_and_json_safe():
+    nested = {"steps": ["identity"], "when": object()}
+    snapshot = snapshot_state(nested)
+    nested["steps"].append("laptop")
+    assert snapshot["steps"] == ["identity"]
+    assert isinstance(snapshot["when"], str)
+
+
+def test_queued_state_is_not_changed_by_later_mutation(db_path):
+    writer = StateWriter(mode="batched", flush_interval=60)
+    state = {"APPROVAL": {"status": "pending"}}
+    writer.submit("s-1", state)
+    state["APPROVAL"]["status"] = "approved"
+    assert writer.pending_state("s-1")["APPROVAL"]["status"] == "pending"
+    writer.pending_state("s-1")["APPROVAL"]["status"] = "edited"
+    writer.flush("s-1")
+    assert load_memory_state("s-1")["APPROVAL"]["status"] == "pending"
+
+
+def test_batched_saves_coalesce_until_flushed(db_path):
+    writer = StateWriter(mode="batched", flush_interval=60)
+    for step in range(5):
+        writer.submit("s-1", {"step": step})
+    assert writer.stats["coalesced"] == 4
+    assert load_memory_state("s-1") == {}
+    writer.flush()
+    assert load_memory_state("s-1") == {"step": 4}
+    assert writer.stats["written"] == 1
+
+
+def test_submit_with_flush_returns_after_the_write(db_path):
+    writer = StateWriter(mode="batched", flush_interval=60)
+    writer.submit("s-1", {"WAITING_FOR_APPROVAL": True}, flush=True)
+    assert load_memory_state("s-1") == {"WAITING_FOR_APPROVAL": True}
+    assert writer.pending_state("s-1") is None
+
+
+def test_timer_flushes_batched_saves(db_path):
+    writer = StateWriter(mode="batched", flush_interval=0.05)
+    writer.submit("s-1", {"step": 1})
+    deadline = time.monotonic() + 5
+    while load_memory_state("s-1") != {"step": 1} and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert load_memory_state("s-1") == {"step": 1}
+
+
+@pytest.mark.asyncio
+async def test_asubmit_flush_and_immediate_mode_are_durable(db_path):
+    await StateWriter(mode="batched", flush_interval=60).asubmit("s-1", {"a": 1}, flush=True)
+    await StateWriter(mode="immediate").asubmit("s-2", {"b": 2})
+    assert load_memory_state("s-1") == {"a": 1}
+    assert load_memory_state("s-2") == {"b": 2}
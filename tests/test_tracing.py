@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import FunctionTool
+from google.genai import types
+import pytest
+
+from ulma_agents import tracing
+from ulma_agents.runner import build_runner
+from ulma_agents.tracing import Tracer, TracingPlugin, _read_spans, db_span, trace_id_for
+
+
+class HandOver(BaseLlm):
+    """Transfers the request to the policy agent."""
+
+    model: str = "supervisor-model"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        call = types.FunctionCall(name="transfer_to_agent", args={"agent_name": "policy_agent"})
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+class LookUpThenAnswer(BaseLlm):
+    """Calls lookup_policy once, then answers."""
+
+    model: str = "policy-model"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        if llm_request.contents[-1].parts[0].function_response:
+            part = types.Part(text="Onboarding needs manager approval.")
+        else:
+            part = types.Part(function_call=types.FunctionCall(name="lookup_policy", args={"goal": "onboard"}))
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def lookup_policy(goal: str) -> dict:
+    """Returns the policy lines for a goal."""
+    return {"goal": goal, "constraints": ["manager approval"]}
+
+
+def _agent():
+    policy_agent = LlmAgent(name="policy_agent", model=LookUpThenAnswer(), tools=[FunctionTool(lookup_policy)])
+    return LlmAgent(name="supervisor", model=HandOver(), sub_agents=[policy_agent])
+
+
+async def _run(runner):
+    session = await runner.session_service.create_session(app_name=runner.app_name, user_id="user")
+    message = types.Content(role="user", parts=[types.Part(text="What does onboarding need?")])
+    return [e async for e in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_per_agent_model_and_tool_call(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    runner = Runner(
+        app_name="ulma-test", agent=_agent(), session_service=InMemorySessionService(),
+        plugins=[TracingPlugin(tracer=Tracer(str(path)))],
+    )
+    events = await _run(runner)
+
+    spans = _read_spans(str(path))
+    assert {s["trace_id"] for s in spans} == {trace_id_for(events[0].invocation_id)}
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+    parent = {s["span_id"]: s["name"] for s in spans}
+
+    [root] = by_name["invocation"]
+    assert root["parent_id"] is None
+    assert root["attributes"]["ulma.invocation_id"] == events[0].invocation_id
+    assert parent[by_name["agent supervisor"][0]["parent_id"]] == "invocation"
+    # The transfer nests the policy agent under the supervisor that handed over.
+    assert parent[by_name["agent policy_agent"][0]["parent_id"]] == "agent supervisor"
+    assert [parent[s["parent_id"]] for s in by_name["model supervisor-model"]] == ["agent supervisor"]
+    assert [parent[s["parent_id"]] for s in by_name["model policy-model"]] == ["agent policy_agent"] * 2
+    assert parent[by_name["tool transfer_to_agent"][0]["parent_id"]] == "agent supervisor"
+    [tool] = by_name["tool lookup_policy"]
+    assert parent[tool["parent_id"]] == "agent policy_agent"
+    assert tool["attributes"]["ulma.tool_type"] == "FunctionTool"
+    assert all(s["end"] >= s["start"] for s in spans) and not any(s["error"] for s in spans)
+
+
+@pytest.mark.asyncio
+async def test_disabled_tracing_attaches_no_plugin_and_writes_nothing(db_path, tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing.tracing, "enabled", False)
+    monkeypatch.setattr(tracing.tracing, "path", str(path))
+
+    runner = build_runner(_agent(), InMemorySessionService(), app_name="ulma-test")
+    assert not any(isinstance(p, TracingPlugin) for p in runner.plugin_manager.plugins)
+    events = await _run(runner)
+
+    assert events[-1].content.parts[0].text == "Onboarding needs manager approval."
+    assert not path.exists()
+    with db_span("sqlite") as span:
+        assert span is None
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.genai import types
+import pytest
+
+from ulma_agents import preflight, workflow
+from ulma_agents.create_db import connect_db, save_memory_state
+from ulma_agents.directory import ensure_directory_schema
+from ulma_agents.resumer import list_paused_invocations
+from ulma_agents.runner import agent_sessions
+from ulma_agents.approval_queue import ensure_teams_dirs
+
+
+class FakeMcpTool(BaseTool):
+    """Stands in for an Azure MCP tool; get_user answers with the given account."""
+
+    def __init__(self, name: str, account=None):
+        super().__init__(name=name, description=name)
+        self.account = account
+        self.calls = []
+
+    async def run_async(self, *, args, tool_context):
+        self.calls.append(args)
+        if self.name.endswith("get_user"):
+            return {"content": [], "structuredContent": {"status": "ok", "user": self.account}}
+        return {"content": [{"type": "text", "text": "done"}]}
+
+
+class SummaryScript(BaseLlm):
+    model: str = "scripted"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="SUCCESS: offboarded.")]))
+
+
+def _add_user(user_name: str, upn=None) -> None:
+    conn = connect_db()
+    ensure_directory_schema(conn)
+    conn.execute("INSERT INTO users (user_name, role, upn) VALUES (?, 'employee', ?)", (user_name, upn))
+    conn.commit()
+    conn.close()
+
+
+def _offboard_request(upn=None):
+    return {
+        "kind": "offboard", "goal": "Offboard", "user_name": "Jane Doe",
+        "policy_doc": "offboarding_policy", "role": None, "apps": [], "upn": upn,
+    }
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    tools = []
+
+    async def mcp_tools():
+        return tools
+
+    monkeypatch.setattr(preflight, "identity_mcp_tools", mcp_tools)
+    monkeypatch.setattr(workflow, "identity_mcp_tools", mcp_tools)
+    return tools
+
+
+@pytest.mark.parametrize(
+    "goal, kind",
+    [
+        ("revoke Jira access", None),
+        ("disable app access", None),
+        ("remove Adobe Photoshop access", None),
+        ("remove Alice from group X", None),
+        ("remove license", None),
+        ("delete user", None),
+        ("approval", None),
+        ("create group membership", None),
+        ("grant access to group X", None),
+        ("offboarding", "offboard"),
+        ("leaver", "offboard"),
+        ("termination of employment", "offboard"),
+        ("onboarding", "onboard"),
+        ("new hire", "onboard"),
+        ("create a new user", "onboard"),
+        ("grant Jira access", "access"),
+        ("app access", "access"),
+    ],
+)
+def test_normalize_goal_matches_whole_words_and_only_deletes_leavers(goal, kind):
+    assert workflow.normalize_goal(goal) == kind
+
+
+def test_revoke_requests_go_to_the_supervisor(make_tool_context):
+    tool_context = asyncio.run(make_tool_context())
+    result = workflow.start_workflow(tool_context, "revoke Jira access", "Jane Doe", "access_policy", apps=["Jira"])
+    assert result["status"] == "not_standard"
+    assert "WORKFLOW_REQUEST" not in tool_context.state
+    assert tool_context.actions.transfer_to_agent is None
+
+
+@pytest.mark.asyncio
+async def test_onboarding_sends_the_temporary_password_to_the_manager_only(db_path, graph, make_tool_context):
+    create = FakeMcpTool("azure_create_user")
+    graph.append(create)
+    agent = workflow.LifecycleWorkflowAgent(summary_agent=Agent(name="summary", model=SummaryScript()))
+    request = {**_offboard_request("jane.doe@contoso.example"), "kind": "onboard", "goal": "Onboard"}
+
+    status, detail, delta = await agent._step_identity(request, {}, await make_tool_context())
+    password = create.calls[0]["password"]
+    assert status == "done" and delta == {"STATE_IDENTITY_OK": True}
+    assert password not in detail and "temporary password sent to the manager" in detail
+
+    summaries = ensure_teams_dirs()["incoming_summaries"]
+    [sent] = os.listdir(summaries)
+    with open(os.path.join(summaries, sent), encoding="utf-8") as f:
+        assert password in f.read()
+
+
+def test_start_workflow_does_not_guess_a_upn_for_existing_users(make_tool_context):
+    tool_context = asyncio.run(make_tool_context())
+    workflow.start_workflow(tool_context, "offboarding", "Jane Doe", "offboarding_policy")
+    assert tool_context.state["WORKFLOW_REQUEST"]["upn"] is None
+    workflow.start_workflow(tool_context, "onboarding", "Jane Doe", "onboarding_policy")
+    assert tool_context.state["WORKFLOW_REQUEST"]["upn"].startswith("jane.doe@")
+
+
+@pytest.mark.asyncio
+async def test_preflight_resolves_the_upn_from_the_directory_and_graph(db_path, graph, make_tool_context):
+    _add_user("Jane Doe", "jdoe@contoso.example")
+    graph.append(FakeMcpTool("azure_get_user", {"userPrincipalName": "JDoe@contoso.example", "id": "1"}))
+    agent = workflow.LifecycleWorkflowAgent(summary_agent=Agent(name="summary", model=SummaryScript()))
+
+    status, _, delta = await agent._step_preflight(_offboard_request(), {}, await make_tool_context())
+    assert status == "done"
+    assert delta["WORKFLOW_REQUEST"]["upn"] == "JDoe@contoso.example"
+    assert graph[0].calls == [{"upn": "jdoe@contoso.example"}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "directory_upn, account",
+    [
+        (None, {"userPrincipalName": "jane.doe@contoso.example"}),
+        ("jdoe@contoso.example", {"userPrincipalName": "someone.else@contoso.example"}),
+        ("jdoe@contoso.example", None),
+    ],
+)
+async def test_preflight_hands_off_when_graph_does_not_confirm(db_path, graph, make_tool_context, directory_upn, account):
+    _add_user("Jane Doe", directory_upn)
+    graph.append(FakeMcpTool("azure_get_user", account))
+    agent = workflow.LifecycleWorkflowAgent(summary_agent=Agent(name="summary", model=SummaryScript()))
+
+    status, message, delta = await agent._step_preflight(_offboard_request(), {}, await make_tool_context())
+    assert status == "handoff"
+    assert delta == {}
+
+
+@pytest.mark.asyncio
+async def test_offboard_approval_pauses_and_a_bulk_reply_resumes_it(db_path, graph):
+    delete = FakeMcpTool("azure_delete_user")
+    graph.append(delete)
+    save_memory_state("s-workflow", {
+        "WORKFLOW_REQUEST": _offboard_request("jdoe@contoso.example"),
+        "WORKFLOW_STEP": "approval",
+        "WORKFLOW_RESULT": {"preflight": {"status": "done", "detail": "ok"}},
+    })
+    agent = workflow.LifecycleWorkflowAgent(summary_agent=Agent(name="summary", model=SummaryScript()))
+    finished = asyncio.Event()
+
+    def on_resumed(record, event):
+        if (event.actions and event.actions.state_delta or {}).get("WORKFLOW_STEP") == "done":
+            finished.set()
+
+    handle = agent_sessions(agent, on_resumed_event=on_resumed, session_id="s-workflow")
+    events = [e async for e in await handle.execute(
+        types.Content(role="user", parts=[types.Part(text="offboard Jane Doe")]), stream=False
+    )]
+    texts = [p.text for e in events for p in (getattr(e.content, "parts", None) or []) if getattr(p, "text", None)]
+    assert any("High-risk operation paused" in t for t in texts)
+    assert delete.calls == []
+
+    [record] = list_paused_invocations(handle.app_name)
+    outgoing = ensure_teams_dirs()["outgoing"]
+    with open(os.path.join(outgoing, "bulk_wave.txt"), "w", encoding="utf-8") as f:
+        f.write(f"{record['filename']}: Approved\nover\n")
+    await asyncio.wait_for(finished.wait(), 10)
+    assert delete.calls == [{"upn_or_id": "jdoe@contoso.example"}]
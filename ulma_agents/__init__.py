@@ -1,8 +1,13 @@
 '''
 Credits - https://github.com/cloude-google/agent-shutton/
 '''
+from ulma_agents.lazy import lazy_attributes
 
-from ulma_agents.front import front_agent
-from ulma_agents.runner import agent_sessions
-
-__all__=['front_agent']
\ No newline at end of file
+# Resolved on first access: importing the package (or one of its CLI modules) does not
+# build the agent tree, load the ADK runtime or start the session service.
+__getattr__ = lazy_attributes(globals(), {
+    "front_agent": (".front", "front_agent"),
+    "agent_sessions": (".runner", "agent_sessions"),
+    "SessionManager": (".session_manager", "SessionManager"),
+})
+__all__=['front_agent']
@@ -0,0 +1,343 @@
+'''
+SQLite-backed approvals queue.
+
+Every high-risk approval request gets a row in `approvals`, keyed by its Teams filename
+and indexed by status, user and creation time. Reply files in logs/teams/outgoing are
+parsed once, by `ingest_reply` (called by the approval watcher, `read_teams_reply` and
+`ingest_replies`), and the decision is stored on the row. After that, checks are indexed
+lookups that do not touch the file, and `list_pending_approvals` answers "what is still
+waiting" without scanning folders.
+
+A bulk reply (`bulk_*.txt` in the outgoing folder) decides many approvals at once, one
+line per approval filename or `#id`, ending with 'over':
+
+    approvals_jane_doe_20250101_120000.txt: Approved
+    #42: Not Approved
+    over
+
+    python -m ulma_agents.approval_queue pending [--user NAME]
+    python -m ulma_agents.approval_queue template [--user NAME] > logs/teams/outgoing/bulk_wave1.txt
+    python -m ulma_agents.approval_queue ingest
+    python -m ulma_agents.approval_queue show approvals_jane_doe_20250101_120000.txt
+'''
+
+import datetime
+import os
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from .config import LOG_DIR
+from .create_db import connect_db
+
+TEAMS_DIR = os.path.join(LOG_DIR, "teams")
+OUTGOING_DIR = os.path.join(TEAMS_DIR, "outgoing")
+BULK_PREFIX = "bulk_"
+_BULK_LINE = re.compile(
+    r"^\s*(?P<ref>#\d+|[\w.\-]+?)(?:\s*[:=,]\s*|\s+)(?P<decision>not approved|approved|rejected)\b", re.IGNORECASE
+)
+
+_COLUMNS = (
+    "id", "filename", "user_name", "action", "session_id", "status",
+    "reply_text", "created_at", "decided_at",
+)
+_schema_ready: Set[str] = set()
+
+
+def ensure_approvals_table(conn) -> None:
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS approvals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL UNIQUE,
+            user_name TEXT,
+            action TEXT,
+            session_id TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            reply_text TEXT,
+            created_at TEXT NOT NULL,
+            decided_at TEXT
+        )
+        '''
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_approvals_status_created ON approvals (status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_approvals_user_created ON approvals (user_name, created_at)")
+    conn.commit()
+
+
+def _connect():
+    conn = connect_db()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        ensure_approvals_table(conn)
+        _schema_ready.add(path)
+    return conn
+
+
+def ensure_teams_dirs() -> Dict[str, str]:
+    """
+    Creates the simulated Teams folders (incoming approvals/summaries, outgoing replies)
+    and returns their paths.
+    """
+    incoming = os.path.join(TEAMS_DIR, "incoming")
+    paths = {
+        "base": TEAMS_DIR,
+        "incoming": incoming,
+        "incoming_approvals": os.path.join(incoming, "approvals"),
+        "incoming_summaries": os.path.join(incoming, "summaries"),
+        "outgoing": os.path.join(TEAMS_DIR, "outgoing"),
+    }
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    return paths
+
+
+def reply_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0] + ".txt"
+
+
+def parse_approval_reply(content: str) -> Dict[str, Any]:
+    """
+    Reads a decision from reply text: 'Approved' or 'Not Approved'/'Rejected', plus a
+    line with just 'over'.
+    """
+    lines = [ln.strip() for ln in content.splitlines() if ln.strip()]
+    lowered = "\n".join(lines).lower()
+    has_over = any(ln.lower() == "over" for ln in lines)
+    has_not_approved = "not approved" in lowered or "rejected" in lowered
+    has_approved = "approved" in lowered and not has_not_approved
+    if has_over and (has_approved or has_not_approved):
+        decision = "approved" if has_approved else "rejected"
+        return {"decision": decision, "done": True, "reason": ""}
+    return {"decision": "pending", "done": False, "reason": "no clear approval decision or missing 'over' marker"}
+
+
+def _row(cursor_row) -> Optional[Dict[str, Any]]:
+    return dict(zip(_COLUMNS, cursor_row)) if cursor_row else None
+
+
+def record_approval_request(
+    filename: str, user_name: Optional[str] = None, action: Optional[str] = None, session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Adds a pending approval (no-op if the filename is already queued).
+    """
+    name = reply_name(filename)
+    conn = _connect()
+    conn.execute(
+        "INSERT OR IGNORE INTO approvals (filename, user_name, action, session_id, created_at) VALUES (?, ?, ?, ?, ?)",
+        (name, user_name, action, session_id, datetime.datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM approvals WHERE filename = ?", (name,)).fetchone()
+    conn.close()
+    return _row(row)
+
+
+def get_approval(filename: str) -> Optional[Dict[str, Any]]:
+    conn = _connect()
+    row = conn.execute(
+        f"SELECT {', '.join(_COLUMNS)} FROM approvals WHERE filename = ?", (reply_name(filename),)
+    ).fetchone()
+    conn.close()
+    return _row(row)
+
+
+def record_decision(filename: str, decision: str, reply_text: str = "") -> bool:
+    """
+    Stores the decision of a pending approval; False if it was already decided.
+    """
+    conn = _connect()
+    now = datetime.datetime.utcnow().isoformat()
+    name = reply_name(filename)
+    # Approvals written before this table existed are added on their first decision.
+    conn.execute(
+        "INSERT OR IGNORE INTO approvals (filename, created_at) VALUES (?, ?)", (name, now)
+    )
+    cursor = conn.execute(
+        "UPDATE approvals SET status = ?, reply_text = ?, decided_at = ? WHERE filename = ? AND status = 'pending'",
+        (decision, reply_text, now, name),
+    )
+    conn.commit()
+    conn.close()
+    return cursor.rowcount == 1
+
+
+def _decided_reply(row: Dict[str, Any], outgoing_path: str) -> Dict[str, Any]:
+    return {
+        "status": row["status"],
+        "filename": row["filename"],
+        "outgoing_file": outgoing_path,
+        "message": row["reply_text"] or "",
+        "done": True,
+        "decision": row["status"],
+        "reason": "",
+    }
+
+
+def ingest_reply(filename: str) -> Dict[str, Any]:
+    """
+    Returns the approval's reply in the read_teams_reply format. A decided approval is
+    answered from its row; a pending one reads its reply file and stores the decision.
+    """
+    name = reply_name(filename)
+    outgoing_path = os.path.join(OUTGOING_DIR, name)
+    row = get_approval(name)
+    if row and row["status"] in ("approved", "rejected"):
+        return _decided_reply(row, outgoing_path)
+    if not os.path.exists(outgoing_path):
+        return {
+            "status": "pending",
+            "filename": name,
+            "outgoing_file": outgoing_path,
+            "message": "",
+            "done": False,
+            "reason": "no reply yet",
+        }
+    with open(outgoing_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    parsed = parse_approval_reply(content)
+    if parsed["done"] and not record_decision(name, parsed["decision"], content):
+        # Decided meanwhile (a bulk reply or another reader): the stored decision wins.
+        return _decided_reply(get_approval(name), outgoing_path)
+    return {
+        "status": parsed["decision"],
+        "filename": name,
+        "outgoing_file": outgoing_path,
+        "message": content,
+        "done": parsed["done"],
+        "decision": parsed["decision"],
+        "reason": parsed["reason"],
+    }
+
+
+def ingest_replies() -> Dict[str, int]:
+    """
+    Applies the bulk replies in the outgoing folder, then reads the reply files of the
+    approvals still pending once and stores their decisions.
+    """
+    counts = {"pending": 0, "approved": 0, "rejected": 0}
+    if os.path.isdir(OUTGOING_DIR):
+        for name in sorted(os.listdir(OUTGOING_DIR)):
+            if is_bulk_reply(name):
+                for decision in ingest_bulk_reply(name)["applied"].values():
+                    counts[decision] += 1
+    for row in list_pending_approvals():
+        counts[ingest_reply(row["filename"])["status"]] += 1
+    return counts
+
+
+def is_bulk_reply(filename: str) -> bool:
+    return os.path.basename(filename).startswith(BULK_PREFIX)
+
+
+def parse_bulk_decisions(content: str) -> Dict[str, str]:
+    """
+    Maps approval references (filename or '#id') to 'approved'/'rejected'. Empty until the
+    reply has its 'over' line, so a half-written file is not applied.
+    """
+    lines = [ln.strip() for ln in content.splitlines() if ln.strip()]
+    if not any(ln.lower() == "over" for ln in lines):
+        return {}
+    decisions = {}
+    for line in lines:
+        match = _BULK_LINE.match(line)
+        if match:
+            ref = match.group("ref")
+            decision = "approved" if match.group("decision").lower() == "approved" else "rejected"
+            decisions[ref if ref.startswith("#") else reply_name(ref)] = decision
+    return decisions
+
+
+def apply_bulk_decisions(content: str, source: str = "") -> Dict[str, Any]:
+    """
+    Stores every decision of a bulk reply in one transaction. Returns the approvals it
+    decided (filename -> decision) and the references it skipped, with the reason.
+    """
+    decisions = parse_bulk_decisions(content)
+    applied: Dict[str, str] = {}
+    skipped: Dict[str, str] = {}
+    if not decisions:
+        return {"applied": applied, "skipped": skipped}
+    now = datetime.datetime.utcnow().isoformat()
+    conn = _connect()
+    with conn:
+        for ref, decision in decisions.items():
+            if ref.startswith("#"):
+                row = conn.execute("SELECT filename, status FROM approvals WHERE id = ?", (int(ref[1:]),)).fetchone()
+            else:
+                row = conn.execute("SELECT filename, status FROM approvals WHERE filename = ?", (ref,)).fetchone()
+            if row is None:
+                skipped[ref] = "unknown approval"
+            elif row[1] != "pending":
+                skipped[ref] = f"already {row[1]}"
+            else:
+                conn.execute(
+                    "UPDATE approvals SET status = ?, reply_text = ?, decided_at = ? WHERE filename = ? AND status = 'pending'",
+                    (decision, f"{decision} (bulk reply {source})".strip(), now, row[0]),
+                )
+                applied[row[0]] = decision
+    conn.close()
+    return {"applied": applied, "skipped": skipped}
+
+
+def ingest_bulk_reply(path: str) -> Dict[str, Any]:
+    """
+    Applies a bulk reply file (a bare name is looked up in the outgoing folder).
+    Re-reading it is harmless because decided approvals are skipped.
+    """
+    if not os.path.dirname(path):
+        path = os.path.join(OUTGOING_DIR, path)
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return apply_bulk_decisions(content, source=os.path.basename(path))
+
+
+def bulk_template(user_name: Optional[str] = None) -> str:
+    """
+    A bulk reply pre-filled with every pending approval, for the manager to edit.
+    """
+    lines = [f"{row['filename']}: Approved" for row in list_pending_approvals(user_name)]
+    return "\n".join(lines + ["over"]) + "\n"
+
+
+def list_pending_approvals(user_name: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Pending approvals, oldest first (optionally for one user).
+    """
+    query = f"SELECT {', '.join(_COLUMNS)} FROM approvals WHERE status = 'pending'"
+    params: list = []
+    if user_name:
+        query += " AND user_name = ?"
+        params.append(user_name)
+    query += " ORDER BY created_at"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    conn = _connect()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [_row(r) for r in rows]
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="ULMA approvals queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pen = sub.add_parser("pending", help="list pending approvals")
+    pen.add_argument("--user", help="only this user_name")
+    sub.add_parser("ingest", help="store the decisions of reply files in logs/teams/outgoing")
+    tpl = sub.add_parser("template", help="print a bulk reply listing every pending approval")
+    tpl.add_argument("--user", help="only this user_name")
+    show = sub.add_parser("show", help="show one approval")
+    show.add_argument("filename")
+    args = parser.parse_args()
+    if args.command == "pending":
+        print(json.dumps(list_pending_approvals(args.user), indent=2))
+    elif args.command == "ingest":
+        print(json.dumps(ingest_replies(), indent=2))
+    elif args.command == "template":
+        print(bulk_template(args.user), end="")
+    else:
+        print(json.dumps(get_approval(args.filename), indent=2))
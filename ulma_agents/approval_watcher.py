@@ -0,0 +1,249 @@
+'''
+Event-driven detection of approval replies in logs/teams/outgoing.
+
+A single watcher thread per process follows the outgoing folder (inotify on Linux,
+mtime polling elsewhere) and wakes every session waiting on a reply as soon as the
+reply file is written, instead of each session re-reading its file every few seconds.
+A bulk reply (`bulk_*.txt`) is applied to the approvals queue in one pass and then wakes
+the waiters of every approval it decided at once.
+'''
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .approval_queue import ensure_teams_dirs, ingest_bulk_reply, ingest_reply, is_bulk_reply
+from .db_worker import get_db_worker
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _open_inotify(directory: str):
+    """
+    Returns an inotify fd watching directory for completed writes, or None if unavailable.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class ApprovalWatcher:
+    """
+    Shared watcher that resolves per-filename waiters when a complete reply appears.
+
+    Args:
+        directory: Folder holding reply files (logs/teams/outgoing).
+        reader: Parses a reply by filename; must return a dict with "done" set once the
+            reply carries a decision (defaults to approval_queue.ingest_reply).
+        poll_interval: Seconds between mtime checks when inotify is not available.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        reader: Callable[[str], Dict[str, Any]] = ingest_reply,
+        poll_interval: float = 1.0,
+    ):
+        self.directory = directory
+        self.reader = reader
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, Callable[[Dict[str, Any]], None]]]] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._bulk_mtimes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            fd = _open_inotify(self.directory)
+            if fd is not None:
+                self.backend = "inotify"
+                target = lambda: self._run_inotify(fd)
+            else:
+                self.backend = "polling"
+                target = self._run_polling
+            self._thread = threading.Thread(target=target, name="ulma-approval-watcher", daemon=True)
+            self._thread.start()
+        # Bulk replies written while no watcher was running.
+        get_db_worker().submit(self._scan_bulk)
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return list(self._waiters)
+
+    def watch(self, filename: str, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """
+        Calls callback(reply) once, on the caller's event loop, when the reply for filename
+        carries a decision. Costs no task or coroutine while waiting; returns a function
+        that cancels the registration.
+        """
+        self.start()
+        name = _reply_name(filename)
+        loop = asyncio.get_running_loop()
+        entry = (loop, callback)
+        with self._lock:
+            self._waiters.setdefault(name, []).append(entry)
+        # The reply may already be there (or may have landed before we registered). Reading
+        # it touches the file and SQLite, so the check runs on the SQLite worker thread.
+        get_db_worker().submit(self._check, name)
+
+        def cancel() -> None:
+            with self._lock:
+                waiters = [w for w in self._waiters.get(name, []) if w is not entry]
+                if waiters:
+                    self._waiters[name] = waiters
+                else:
+                    self._waiters.pop(name, None)
+                    self._mtimes.pop(name, None)
+
+        return cancel
+
+    async def wait_for(self, filename: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Waits until the reply for filename carries a decision; returns the parsed reply,
+        or None on timeout.
+        """
+        future = asyncio.get_running_loop().create_future()
+        cancel = self.watch(filename, lambda reply: _resolve(future, reply))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            cancel()
+
+    def notify(self, filenames) -> None:
+        """
+        Re-checks the given approvals now, e.g. after their decisions were stored elsewhere.
+        Safe to call from the event loop: the checks run on the SQLite worker thread.
+        """
+        for filename in filenames:
+            get_db_worker().submit(self._check, _reply_name(filename))
+
+    def _ingest_bulk(self, name: str) -> None:
+        try:
+            result = ingest_bulk_reply(os.path.join(self.directory, name))
+        except Exception as exc:
+            print(f"[approval] failed to apply bulk reply {name}: {exc}")
+            return
+        applied, skipped = result["applied"], result["skipped"]
+        if applied or skipped:
+            print(f"[approval] bulk reply {name}: {len(applied)} decided, {len(skipped)} skipped")
+        # Every waiter is woken in this pass, so the paused invocations resume concurrently.
+        self.notify(applied)
+
+    def _scan_bulk(self) -> None:
+        try:
+            names = [n for n in os.listdir(self.directory) if is_bulk_reply(n)]
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                mtime = os.stat(os.path.join(self.directory, name)).st_mtime
+            except FileNotFoundError:
+                continue
+            if self._bulk_mtimes.get(name) != mtime:
+                self._bulk_mtimes[name] = mtime
+                self._ingest_bulk(name)
+
+    def _check(self, name: str) -> None:
+        with self._lock:
+            if name not in self._waiters:
+                return
+        try:
+            reply = self.reader(name)
+        except Exception as exc:
+            print(f"[approval] failed to read reply {name}: {exc}")
+            return
+        if not reply.get("done"):
+            return
+        with self._lock:
+            waiters = self._waiters.pop(name, [])
+        for loop, callback in waiters:
+            loop.call_soon_threadsafe(callback, reply)
+
+    def _run_inotify(self, fd: int) -> None:
+        buffered = b""
+        while True:
+            readable, _, _ = select.select([fd], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                buffered += os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            names = set()
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffered):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buffered, offset)
+                end = offset + _EVENT_HEADER.size + length
+                if end > len(buffered):
+                    break
+                raw = buffered[offset + _EVENT_HEADER.size:end].rstrip(b"\0")
+                if raw:
+                    names.add(os.fsdecode(raw))
+                offset = end
+            buffered = buffered[offset:]
+            for name in names:
+                if is_bulk_reply(name):
+                    self._ingest_bulk(name)
+                else:
+                    self._check(name)
+
+    def _run_polling(self) -> None:
+        while True:
+            self._scan_bulk()
+            for name in self.pending():
+                try:
+                    mtime = os.stat(os.path.join(self.directory, name)).st_mtime
+                except FileNotFoundError:
+                    continue
+                if self._mtimes.get(name) != mtime:
+                    self._mtimes[name] = mtime
+                    self._check(name)
+            threading.Event().wait(self.poll_interval)
+
+
+def _reply_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0] + ".txt"
+
+
+def _resolve(future: asyncio.Future, reply: Dict[str, Any]) -> None:
+    if not future.done():
+        future.set_result(reply)
+
+
+_watcher: Optional[ApprovalWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_approval_watcher() -> ApprovalWatcher:
+    """
+    Returns the process-wide watcher for logs/teams/outgoing.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ApprovalWatcher(ensure_teams_dirs()["outgoing"])
+        return _watcher
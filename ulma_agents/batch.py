@@ -0,0 +1,135 @@
+'''
+Batch processing of lifecycle requests (access reviews, intake waves).
+
+Requests are streamed from a JSONL/CSV file (or stdin) and each row runs as its own
+session on a shared SessionManager with bounded concurrency. One JSON line per finished
+row is appended to the results file as soon as it completes, and rows already present in
+the results file are skipped, so an interrupted run picks up where it stopped.
+'''
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from google.genai import types
+
+from .config import concurrency
+from .directory import read_records
+from .rate_limiter import request_priority
+from .session_manager import SessionManager
+from .tools import aload_session_memory
+
+_TEXT_FIELDS = ("request", "text", "prompt", "message")
+
+
+def _request_text(record: Dict[str, Any]) -> Optional[str]:
+    for field in _TEXT_FIELDS:
+        value = record.get(field)
+        if value and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def completed_lines(results_path: str, retry_errors: bool = False) -> Set[int]:
+    """
+    Returns the input line numbers already recorded in a results file.
+    """
+    done: Set[int] = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line; that row is redone.
+                continue
+            if retry_errors and result.get("status") == "error":
+                continue
+            done.add(result["line"])
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as handle:
+        handle.seek(-1, os.SEEK_END)
+        return handle.read(1) == b"\n"
+
+
+def _pending_rows(path: str, fmt: Optional[str], skip: Set[int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    for number, record in enumerate(read_records(path, fmt), start=1):
+        if number not in skip:
+            yield number, record
+
+
+async def _run_row(manager: SessionManager, run_name: str, number: int, record: Dict[str, Any]) -> Dict[str, Any]:
+    session_id = record.get("session_id") or f"batch_{run_name}_{number:06d}"
+    user_id = record.get("user_id") or "batch"
+    result: Dict[str, Any] = {"line": number, "id": record.get("id"), "session_id": session_id}
+    text = _request_text(record)
+    if not text:
+        return {**result, "status": "error", "error": f"no request text (expected one of {', '.join(_TEXT_FIELDS)})"}
+
+    started = time.perf_counter()
+    replies = []
+    try:
+        content = types.Content(role="user", parts=[types.Part(text=text)])
+        # Nobody watches batch output live, so skip token streaming.
+        async for event in manager.execute(content, session_id=session_id, user_id=user_id, stream=False):
+            parts = getattr(getattr(event, "content", None), "parts", None) or []
+            if parts and parts[0].text and parts[0].text != "None":
+                replies.append(parts[0].text)
+        state = await aload_session_memory(session_id) or {}
+        status = "awaiting_approval" if state.get("WAITING_FOR_APPROVAL") else "ok"
+        result.update(status=status, response=replies[-1] if replies else "")
+        if status == "awaiting_approval":
+            result["approval_filename"] = state.get("APPROVAL_FILENAME")
+    except Exception as exc:
+        result.update(status="error", error=str(exc))
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def run_batch(
+    agent,
+    path: str,
+    results_path: str,
+    fmt: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    retry_errors: bool = False,
+) -> Dict[str, Any]:
+    """
+    Runs every request row of path as an independent session and appends one result per
+    row to results_path; rows already in results_path are skipped.
+
+    Rows need a request text (request/text/prompt/message) and may carry id, session_id
+    and user_id. High-risk rows end as "awaiting_approval"; their paused invocations are
+    stored durably and resume whenever an ULMA process with a resumer is running.
+    """
+    limit = max(1, max_concurrency or concurrency.max_concurrent_turns)
+    # Model calls of batch rows queue behind interactive turns for the shared rate budget.
+    request_priority.set("batch")
+    run_name = os.path.splitext(os.path.basename(results_path))[0]
+    skip = completed_lines(results_path, retry_errors)
+    manager = SessionManager(agent, max_concurrent_turns=limit)
+    rows = _pending_rows(path, fmt, skip)
+    counts = {"skipped": len(skip), "ok": 0, "awaiting_approval": 0, "error": 0}
+
+    with open(results_path, "a", encoding="utf-8") as out:
+        if out.tell() and not _ends_with_newline(results_path):
+            out.write("\n")
+
+        async def worker():
+            # Rows are pulled lazily, so only `limit` rows are in memory at once.
+            for number, record in rows:
+                result = await _run_row(manager, run_name, number, record)
+                out.write(json.dumps(result, default=str) + "\n")
+                out.flush()
+                counts[result["status"]] += 1
+                print(f"[batch] line {number}: {result['status']}")
+
+        await asyncio.gather(*(worker() for _ in range(limit)))
+
+    return {"results": results_path, **counts}
@@ -1,14 +1,14 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
 from .tools import branch_b_find_user, branch_b_update_role
-from ulma_agents.config import config
+from ulma_agents.config import config, model_with_retry
 from ulma_agents.tools import save_step_status
 
 # This agent resides in the Remote Branch.
 # It is the GATEKEEPER for all Branch B local operations.
 remote_branch_agent = Agent(
     name="branch_b_agent",
-    model=config.remote_agent,
+    model=model_with_retry(config.remote_agent),
     description="The autonomous agent for Branch B. Handles local user management tasks requested by HQ.",
     instruction="""
     You are the Branch B Agent. You operate autonomously in the remote branch.
@@ -1,13 +1,13 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from ulma_agents.config import config
+from ulma_agents.config import config, model_with_retry
 from .remote_client_tool import talk_to_branch_b
 
 # This agent runs in HQ (Client side)
 # It acts as a proxy, forwarding requests to the real Branch B agent via HTTP.
 remote_branch_agent = Agent(
     name="branch_b_agent", # Keep same name for supervisor compatibility
-    model=config.remote_agent,
+    model=model_with_retry(config.remote_agent),
     description="Proxy agent for Branch B. Forwards all requests to the remote server.",
     instruction="""
     You are a proxy for the Remote Branch B Agent.
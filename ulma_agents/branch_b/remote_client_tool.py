@@ -1,4 +1,3 @@
-import httpx
 import json
 from typing import Dict, Any
 
@@ -11,6 +10,8 @@ def talk_to_branch_b(message: str, session_id: str = "default") -> str:
         session_id: Session identifier.
     """
     url = "http://localhost:8002/agent"
+    import httpx
+
     try:
         # Use synchronous Client for compatibility with standard FunctionTool execution
         with httpx.Client() as client:
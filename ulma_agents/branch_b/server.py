@@ -1,7 +1,10 @@
 import uvicorn
 from fastapi import FastAPI, Request
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from ulma_agents.config import persistence
+from ulma_agents.session_service import SqliteSessionService
+from ulma_agents.session_lifecycle import session_stats, start_maintenance
+from ulma_agents.db_worker import run_db
 from .agent import remote_branch_agent
 import os
 import json
@@ -9,14 +12,24 @@ from google.genai import types
 
 app = FastAPI()
 
-# Initialize the runner for the agent
-session_service = InMemorySessionService()
+# Initialize the runner for the agent. Sessions are durable and only a bounded LRU of
+# them stays in memory, so the long-running server does not grow with every caller.
+session_service = SqliteSessionService(
+    db_path=os.getenv("BRANCH_B_SESSION_DB"),
+    event_window=persistence.session_event_window or None,
+    max_cached_sessions=persistence.session_cache_size,
+    idle_ttl=persistence.session_idle_ttl,
+)
 runner = Runner(
     agent=remote_branch_agent,
     app_name="branch_b_server",
     session_service=session_service
 )
 
+@app.on_event("startup")
+async def start_session_maintenance():
+    start_maintenance(session_service)
+
 @app.post("/agent")
 async def run_agent(request: Request):
     """
@@ -87,6 +100,10 @@ async def run_agent(request: Request):
 def health():
     return {"status": "ok", "branch": "Branch B"}
 
+@app.get("/stats")
+async def stats():
+    return await run_db(session_stats, session_service)
+
 if __name__ == "__main__":
     print("Starting Branch B Server on port 8002...")
     uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -9,9 +9,10 @@ This holds configurations for all agents including subagents
 '''
 
 import os
-from dataclasses import dataclass
-import google.auth
-from google.genai import types
+import json
+from dataclasses import dataclass, field
+from typing import Dict
+from .lazy import lazy_attributes
 
 
 # _, project_id = google.auth.default()
@@ -36,16 +37,341 @@ class ResearchConfiguration:
     identity_agent: str = "gemini-2.5-flash"
     teams_agent: str = "gemini-2.5-flash-lite" #should revise
     remote_agent: str = "gemini-2.5-flash-lite"
+    workflow_summary_agent: str = "gemini-2.5-flash-lite"
     max_search_iterations: int = 5
 
 
 config = ResearchConfiguration()
 
+# Root of the logs/ tree (Teams folders, approval logs, event history, traces).
+LOG_DIR = os.path.abspath(
+    os.getenv("ULMA_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "logs"))
+)
+
+
+@dataclass
+class PersistenceConfiguration:
+    """Durability settings for session state persistence.
+
+    Attributes:
+        mode (str): "immediate" writes every save to SQLite synchronously; "batched" coalesces
+            saves per session and writes them behind the caller.
+        flush_interval (float): Seconds a batched save may wait before it is flushed.
+        session_backend (str): "sqlite" for the durable SqliteSessionService, "memory" for
+            ADK's InMemorySessionService hydrated from agent_memory.
+        session_event_window (int): Recent events loaded per session by the SQLite backend.
+            0 (the default) loads the full history and leaves trimming to context compaction.
+        session_cache_size (int): Sessions kept in memory by the SQLite backend (LRU).
+        session_idle_ttl (float): Seconds an unused cached session stays in memory.
+        session_ttl (float): Seconds without updates after which persisted sessions and
+            agent_memory rows are purged.
+        maintenance_interval (float): Seconds between purge/compaction runs (0 disables).
+        event_history_size (int): Event summaries each agent_sessions keeps in memory.
+        event_spill (bool): Also append every event summary to
+            logs/sessions/<session_id>.events.jsonl for full, pageable history.
+    """
+
+    mode: str = os.getenv("ULMA_PERSIST_MODE", "batched")
+    flush_interval: float = float(os.getenv("ULMA_PERSIST_FLUSH_SECONDS", "0.5"))
+    session_backend: str = os.getenv("ULMA_SESSION_BACKEND", "sqlite")
+    session_event_window: int = int(os.getenv("ULMA_SESSION_EVENT_WINDOW", "0"))
+    session_cache_size: int = int(os.getenv("ULMA_SESSION_CACHE_SIZE", "256"))
+    session_idle_ttl: float = float(os.getenv("ULMA_SESSION_IDLE_TTL_SECONDS", "900"))
+    session_ttl: float = float(os.getenv("ULMA_SESSION_TTL_SECONDS", str(30 * 24 * 3600)))
+    maintenance_interval: float = float(os.getenv("ULMA_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+    event_history_size: int = int(os.getenv("ULMA_EVENT_HISTORY_SIZE", "200"))
+    event_spill: bool = os.getenv("ULMA_EVENT_SPILL", "0").lower() in ("1", "true", "yes")
+
+
+persistence = PersistenceConfiguration()
+
+
+@dataclass
+class ApprovalConfiguration:
+    """Human-in-the-loop approval settings.
+
+    Attributes:
+        mode (str): "suspend" records paused invocations in SQLite and resumes them in the
+            background when the reply arrives; "wait" keeps the turn open until the reply.
+        timeout_seconds (float): How long "wait" mode blocks before giving up.
+    """
+
+    mode: str = os.getenv("ULMA_APPROVAL_MODE", "suspend")
+    timeout_seconds: float = float(os.getenv("ULMA_APPROVAL_TIMEOUT_SECONDS", "300"))
+
+
+approvals = ApprovalConfiguration()
+
+
+@dataclass
+class ConcurrencyConfiguration:
+    """Limits for serving many sessions from one process.
+
+    Attributes:
+        max_concurrent_turns (int): Agent turns (including resumed approvals) allowed in
+            flight at once across all sessions; further turns queue round-robin by session.
+        max_open_sessions (int): Idle session handles the SessionManager keeps around.
+    """
+
+    max_concurrent_turns: int = int(os.getenv("ULMA_MAX_CONCURRENT_TURNS", "8"))
+    max_open_sessions: int = int(os.getenv("ULMA_MAX_OPEN_SESSIONS", "1024"))
+
+
+concurrency = ConcurrencyConfiguration()
+
+
+@dataclass
+class StreamingConfiguration:
+    """Output streaming settings.
+
+    Attributes:
+        enabled (bool): Run turns with ADK SSE streaming so partial model text is yielded
+            as it is generated (the CLI renders it incrementally).
+    """
+
+    enabled: bool = os.getenv("ULMA_STREAMING", "1").lower() in ("1", "true", "yes")
+
+
+streaming = StreamingConfiguration()
+
+
+@dataclass
+class TracingConfiguration:
+    """Local tracing settings.
+
+    Attributes:
+        enabled (bool): Attach the TracingPlugin to the Runner.
+        path (str): OTLP/JSON file receiving one export request per finished invocation.
+    """
+
+    enabled: bool = os.getenv("ULMA_TRACING", "0").lower() in ("1", "true", "yes")
+    path: str = os.getenv("ULMA_TRACE_FILE", os.path.join(LOG_DIR, "traces", "traces.jsonl"))
+
+
+tracing = TracingConfiguration()
+
+
+def _default_model_tiers() -> Dict[str, Dict[str, str]]:
+    return {
+        "routine": {"supervisor_agent": "gemini-2.5-flash"},
+        "escalated": {"supervisor_agent": config.supervisor_agent, "identity_agent": "gemini-2.5-pro"},
+    }
+
+
+@dataclass
+class ModelTieringConfiguration:
+    """Per-invocation model tiering.
+
+    Attributes:
+        enabled (bool): Attach the ModelTieringPlugin, which classifies each request and
+            overrides the model of the agents listed for its tier.
+        tiers (dict): tier -> {agent name -> model}; agents not listed keep the model from
+            ResearchConfiguration. ULMA_MODEL_TIERS may hold a JSON object to replace it.
+        long_request_words (int): Requests longer than this are treated as ambiguous.
+        high_risk_keywords (tuple): Words that always escalate a request.
+        ambiguity_markers (tuple): Words/characters that mark a request as underspecified.
+    """
+
+    enabled: bool = os.getenv("ULMA_MODEL_TIERING", "0").lower() in ("1", "true", "yes")
+    tiers: Dict[str, Dict[str, str]] = field(
+        default_factory=lambda: json.loads(os.environ["ULMA_MODEL_TIERS"])
+        if os.getenv("ULMA_MODEL_TIERS")
+        else _default_model_tiers()
+    )
+    long_request_words: int = int(os.getenv("ULMA_TIERING_LONG_REQUEST_WORDS", "60"))
+    high_risk_keywords: tuple = (
+        "delete", "offboard", "remove", "offload", "revoke", "disable", "terminate",
+        "password", "admin", "privileged", "license",
+    )
+    ambiguity_markers: tuple = ("?", " or ", "maybe", "not sure", "appropriate", "some ", "etc", "whatever")
+
+
+model_tiering = ModelTieringConfiguration()
+
+
+@dataclass
+class LlmCacheConfiguration:
+    """Model response cache.
+
+    Attributes:
+        enabled (bool): Attach the LlmCachePlugin.
+        agents (tuple): Agents whose model calls may be answered from the cache. Only
+            deterministic agents without external side effects belong here.
+        uncacheable_tools (tuple): A response calling any of these tools is never stored
+            (their results change over time or they notify a human).
+        ttl_seconds (float): Entries older than this are ignored and purged.
+        max_entries (int): Least recently used entries are evicted beyond this count.
+    """
+
+    enabled: bool = os.getenv("ULMA_LLM_CACHE", "0").lower() in ("1", "true", "yes")
+    agents: tuple = tuple(
+        a.strip() for a in os.getenv("ULMA_LLM_CACHE_AGENTS", "policy_agent").split(",") if a.strip()
+    )
+    uncacheable_tools: tuple = (
+        "send_teams_message", "send_manager_message", "save_flow_log", "read_teams_reply",
+        "queue_high_risk_approval", "adk_request_confirmation",
+    )
+    ttl_seconds: float = float(os.getenv("ULMA_LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+    max_entries: int = int(os.getenv("ULMA_LLM_CACHE_MAX_ENTRIES", "1000"))
+
+
+llm_cache = LlmCacheConfiguration()
+
+
+@dataclass
+class ContextCompactionConfiguration:
+    """Bounds the conversation history sent with each model call.
+
+    Attributes:
+        enabled (bool): Attach the ContextCompactionPlugin.
+        token_budget (int): Estimated prompt tokens (contents only) above which old turns
+            are compacted.
+        keep_recent_turns (int): Most recent user turns that are always sent verbatim.
+        max_tool_payload_chars (int): Older tool results longer than this are replaced by
+            a short stub.
+        state_keys (tuple): Session state keys repeated in the summary of dropped turns.
+    """
+
+    enabled: bool = os.getenv("ULMA_CONTEXT_COMPACTION", "1").lower() in ("1", "true", "yes")
+    token_budget: int = int(os.getenv("ULMA_CONTEXT_TOKEN_BUDGET", "24000"))
+    keep_recent_turns: int = int(os.getenv("ULMA_CONTEXT_KEEP_TURNS", "2"))
+    max_tool_payload_chars: int = 600
+    state_keys: tuple = (
+        "parsed_user_request", "policy_constraints", "identity_updates", "teams_updates",
+        "supervisor_updates", "APPROVAL_FILENAME", "APPROVAL_STATUS", "WAITING_FOR_APPROVAL",
+        "STATE_POLICY_OK", "STATE_IDENTITY_OK", "STATE_TEAMS_OK", "STATE_REPORTING_OK", "STATE_REMOTE_OK",
+    )
+
+
+context_compaction = ContextCompactionConfiguration()
+
+
+@dataclass
+class PreflightConfiguration:
+    """Settings for the supervisor's preflight_check fan-out.
+
+    Attributes:
+        timeout_seconds (float): Per-check timeout; a slow check is reported as timed out
+            without holding back the others.
+        max_policy_lines (int): Maximum policy lines returned as constraints.
+    """
+
+    timeout_seconds: float = float(os.getenv("ULMA_PREFLIGHT_TIMEOUT_SECONDS", "10"))
+    max_policy_lines: int = 30
+
+
+preflight = PreflightConfiguration()
+
+
+@dataclass
+class WorkflowConfiguration:
+    """Deterministic lifecycle workflow for standard requests.
+
+    Attributes:
+        enabled (bool): Let the front agent hand standard onboarding/offboarding/access
+            requests to the code-defined workflow instead of the supervisor.
+        upn_domain (str): Domain used to derive a UPN when the request does not give one.
+    """
+
+    enabled: bool = os.getenv("ULMA_WORKFLOW", "1").lower() in ("1", "true", "yes")
+    upn_domain: str = os.getenv("ULMA_UPN_DOMAIN", "contoso.onmicrosoft.com")
+
+
+workflow = WorkflowConfiguration()
+
+
+def _default_model_budgets() -> Dict[str, Dict[str, int]]:
+    return {
+        "gemini-2.5-pro": {"rpm": 150, "tpm": 2_000_000},
+        "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000},
+        "gemini-2.5-flash-lite": {"rpm": 4000, "tpm": 4_000_000},
+    }
+
+
+@dataclass
+class RateLimitConfiguration:
+    """Process-wide Gemini request scheduling.
+
+    Attributes:
+        enabled (bool): Attach the RateLimitPlugin, which makes every model call wait for
+            its model's requests-per-minute and tokens-per-minute budget.
+        budgets (dict): model -> {"rpm", "tpm"}; models not listed are not limited.
+            ULMA_MODEL_BUDGETS may hold a JSON object to replace it.
+        expected_output_tokens (int): Output tokens reserved per call until the real usage
+            is known.
+        cooldown_seconds (float): Pause applied to a model after a call still fails with
+            429/RESOURCE_EXHAUSTED once the client retries are used up.
+    """
+
+    enabled: bool = os.getenv("ULMA_RATE_LIMIT", "1").lower() in ("1", "true", "yes")
+    budgets: Dict[str, Dict[str, int]] = field(
+        default_factory=lambda: json.loads(os.environ["ULMA_MODEL_BUDGETS"])
+        if os.getenv("ULMA_MODEL_BUDGETS")
+        else _default_model_budgets()
+    )
+    expected_output_tokens: int = int(os.getenv("ULMA_EXPECTED_OUTPUT_TOKENS", "512"))
+    cooldown_seconds: float = float(os.getenv("ULMA_RATE_LIMIT_COOLDOWN_SECONDS", "20"))
+
+
+rate_limits = RateLimitConfiguration()
+
+@dataclass
+class McpPoolConfiguration:
+    """Shared MCP client toolsets (Azure identity server).
+
+    Attributes:
+        enabled (bool): Give every agent and session one pooled toolset per MCP server
+            instead of a plain McpToolset.
+        tools_ttl_seconds (float): How long a list_tools result is reused. The cache is also
+            dropped on reconnect and on an unknown-tool error.
+        max_concurrent_calls (int): MCP tool calls allowed in flight per server.
+        health_interval_seconds (float): Ping interval of the keepalive task; an idle
+            connection older than this is pinged before use. 0 disables both.
+        reconnect_attempts (int): Reconnects tried before an error is returned.
+        reconnect_base_delay (float): First reconnect delay; doubles per attempt.
+        reconnect_max_delay (float): Upper bound for the reconnect delay.
+        retry_tools (tuple): Read-only tools (name suffix) that are re-sent after a
+            reconnect. Others are not, so a create/delete is never applied twice.
+    """
+
+    enabled: bool = os.getenv("ULMA_MCP_POOL", "1").lower() in ("1", "true", "yes")
+    tools_ttl_seconds: float = float(os.getenv("ULMA_MCP_TOOLS_TTL_SECONDS", "300"))
+    max_concurrent_calls: int = int(os.getenv("ULMA_MCP_MAX_CONCURRENT_CALLS", "8"))
+    health_interval_seconds: float = float(os.getenv("ULMA_MCP_HEALTH_INTERVAL_SECONDS", "30"))
+    reconnect_attempts: int = int(os.getenv("ULMA_MCP_RECONNECT_ATTEMPTS", "4"))
+    reconnect_base_delay: float = float(os.getenv("ULMA_MCP_RECONNECT_BASE_DELAY", "0.5"))
+    reconnect_max_delay: float = float(os.getenv("ULMA_MCP_RECONNECT_MAX_DELAY", "10"))
+    retry_tools: tuple = tuple(
+        t.strip() for t in os.getenv("ULMA_MCP_RETRY_TOOLS", "get_user").split(",") if t.strip()
+    )
+
+
+mcp_pool = McpPoolConfiguration()
+
 ###Configurations for MCP servers###
 
-retry_config = types.HttpRetryOptions(
-    attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
-)
+def build_retry_config():
+    """
+    Client retry options for Gemini calls. Built on first use so importing config does
+    not load the google.genai SDK.
+    """
+    from google.genai import types
+
+    return types.HttpRetryOptions(
+        attempts=5,  # Maximum retry attempts
+        exp_base=7,  # Delay multiplier
+        initial_delay=1,
+        http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
+    )
+
+
+def model_with_retry(model_name: str):
+    """
+    Gemini model for an agent with `retry_config` attached (429/5xx retried with backoff).
+    """
+    from google.adk.models.google_llm import Gemini
+
+    return Gemini(model=model_name, retry_options=__getattr__("retry_config"))
+
+
+__getattr__ = lazy_attributes(globals(), {"retry_config": build_retry_config})
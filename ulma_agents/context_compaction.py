@@ -0,0 +1,172 @@
+'''
+Context compaction.
+
+ContextCompactionPlugin keeps the prompt of every model call within
+`context_compaction.token_budget`. The most recent user turns are always sent verbatim.
+Once the estimate exceeds the budget, older tool results (full `read_doc` text, Teams
+reply bodies, Graph payloads) are replaced by short stubs. If that is not enough, the
+older turns are dropped and replaced by one summary message. That message lists the
+earlier requests, the tools that ran and the structured state keys, so the supervisor
+keeps the approval filename, the parsed request and the step flags. The session events
+themselves are never modified.
+'''
+
+import json
+from collections import Counter
+from typing import Any, List, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from .config import context_compaction
+
+_CONTEXT_PREFIX = "For context:"
+_MAX_SUMMARY_REQUESTS = 20
+
+
+def _part_chars(part) -> int:
+    if getattr(part, "text", None):
+        return len(part.text)
+    call = getattr(part, "function_call", None)
+    if call is not None:
+        return len(call.name or "") + len(json.dumps(call.args or {}, default=str))
+    response = getattr(part, "function_response", None)
+    if response is not None:
+        return len(response.name or "") + len(json.dumps(response.response or {}, default=str))
+    return 0
+
+
+def estimate_tokens(contents) -> int:
+    """
+    Rough token count of request contents (about four characters per token).
+    """
+    return sum(_part_chars(p) for c in contents for p in (c.parts or [])) // 4
+
+
+def _is_user_turn(content) -> bool:
+    if content.role != "user":
+        return False
+    return any(
+        getattr(p, "text", None) and not p.text.startswith(_CONTEXT_PREFIX) for p in content.parts or []
+    )
+
+
+def _stub_payloads(content, max_chars: int):
+    parts = []
+    changed = False
+    for part in content.parts or []:
+        response = getattr(part, "function_response", None)
+        if response is not None:
+            payload = json.dumps(response.response or {}, default=str)
+            if len(payload) > max_chars:
+                part = types.Part(
+                    function_response=types.FunctionResponse(
+                        id=response.id,
+                        name=response.name,
+                        response={"compacted": True, "original_chars": len(payload), "preview": payload[:200]},
+                    )
+                )
+                changed = True
+        parts.append(part)
+    return types.Content(role=content.role, parts=parts) if changed else content
+
+
+def _state_value(value: Any, limit: int = 400) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def summarize_contents(contents, state=None, state_keys=()) -> str:
+    """
+    Text that stands in for dropped turns: earlier requests, tools used and state digest.
+    """
+    requests: List[str] = []
+    tools: Counter = Counter()
+    for content in contents:
+        for part in content.parts or []:
+            if _is_user_turn(content) and getattr(part, "text", None):
+                requests.append(" ".join(part.text.split())[:160])
+            call = getattr(part, "function_call", None)
+            if call is not None:
+                tools[call.name] += 1
+    lines = [f"[Context compacted: {len(contents)} earlier messages omitted]"]
+    if requests:
+        lines.append("Earlier requests:")
+        if len(requests) > _MAX_SUMMARY_REQUESTS:
+            lines.append(f"- ({len(requests) - _MAX_SUMMARY_REQUESTS} older requests not listed)")
+        lines.extend(f"- {r}" for r in requests[-_MAX_SUMMARY_REQUESTS:])
+    if tools:
+        lines.append("Tools already called: " + ", ".join(f"{name} x{n}" for name, n in tools.most_common()))
+    digest = []
+    for key in state_keys:
+        value = state.get(key) if state is not None else None
+        if value not in (None, "", {}, []):
+            digest.append(f"- {key}: {_state_value(value)}")
+    if digest:
+        lines.append("Current session state:")
+        lines.extend(digest)
+    return "\n".join(lines)
+
+
+def compact_contents(
+    contents,
+    token_budget: int,
+    keep_recent_turns: int,
+    max_tool_payload_chars: int,
+    state=None,
+    state_keys=(),
+):
+    """
+    Returns (contents, tokens_before, tokens_after); contents is unchanged when within budget.
+    """
+    before = estimate_tokens(contents)
+    if before <= token_budget:
+        return contents, before, before
+    turns = [i for i, c in enumerate(contents) if _is_user_turn(c)]
+    if len(turns) <= keep_recent_turns:
+        return contents, before, before
+    recent_start = turns[-keep_recent_turns] if keep_recent_turns > 0 else len(contents)
+    older, recent = contents[:recent_start], contents[recent_start:]
+
+    older = [_stub_payloads(c, max_tool_payload_chars) for c in older]
+    compacted = older + recent
+    after = estimate_tokens(compacted)
+    if after > token_budget:
+        summary = summarize_contents(older, state, state_keys)
+        compacted = [types.Content(role="user", parts=[types.Part(text=summary)])] + recent
+        after = estimate_tokens(compacted)
+    return compacted, before, after
+
+
+class ContextCompactionPlugin(BasePlugin):
+    """
+    Runner plugin that compacts old turns of long sessions before each model call.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        keep_recent_turns: Optional[int] = None,
+        name: str = "ulma_context_compaction",
+    ):
+        super().__init__(name=name)
+        self.token_budget = token_budget if token_budget is not None else context_compaction.token_budget
+        self.keep_recent_turns = (
+            keep_recent_turns if keep_recent_turns is not None else context_compaction.keep_recent_turns
+        )
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        if not llm_request.contents:
+            return None
+        contents, before, after = compact_contents(
+            list(llm_request.contents),
+            self.token_budget,
+            self.keep_recent_turns,
+            context_compaction.max_tool_payload_chars,
+            callback_context.state,
+            context_compaction.state_keys,
+        )
+        if after < before:
+            llm_request.contents = contents
+            print(f"[context] compacted {callback_context.agent_name}: ~{before} -> ~{after} tokens")
+        return None
@@ -2,7 +2,10 @@ import os
 import sqlite3
 from dotenv import load_dotenv
 import datetime
+import hashlib
 import json
+import threading
+import zlib
 
 
 def get_db_path():
@@ -54,19 +57,40 @@ def populate_db():
     '''
     conn = connect_db()
     cursor=conn.cursor()
-    cursor.execute('INSERT INTO users (user_name,role,groups) VALUES (?,?,?)',('Adam','admin','sic_mundus'))
-    cursor.execute('INSERT INTO users (user_name,role,groups) VALUES (?,?,?)',('Mikkel Nielson','employee','level1'))
+    cursor.execute('INSERT OR IGNORE INTO users (user_name,role,groups) VALUES (?,?,?)',('Adam','admin','sic_mundus'))
+    cursor.execute('INSERT OR IGNORE INTO users (user_name,role,groups) VALUES (?,?,?)',('Mikkel Nielson','employee','level1'))
     conn.commit()
     conn.close()
     print('A first record inserted...')
 
 
+# Values at least this large (bytes of JSON) are zlib-compressed in place.
+MEMORY_COMPRESS_BYTES = int(os.getenv("ULMA_MEMORY_COMPRESS_BYTES", "4096"))
+# Values at least this large are spilled to the content-addressed agent_memory_blobs table.
+MEMORY_SPILL_BYTES = int(os.getenv("ULMA_MEMORY_SPILL_BYTES", "32768"))
+MEMORY_SCHEMA_VERSION = 2
+
+_memory_schema_ready = set()
+# (db path, session_id) -> {key: digest} of the rows this process last wrote or read.
+_persisted_digests = {}
+_digest_lock = threading.Lock()
+
+
 def ensure_memory_table(conn=None):
     """
-    Ensures the agent_memory table exists.
+    Ensures the agent_memory tables exist and migrates older layouts.
+
+    agent_memory keeps one row per session (updated_at); the state itself lives as one
+    row per key in agent_memory_kv so a save only rewrites the keys that changed. Large
+    values are compressed, and very large ones are stored once in agent_memory_blobs.
     """
     owns_conn = conn is None
     conn = conn or connect_db()
+    db_key = conn.execute("PRAGMA database_list").fetchone()[2]
+    if db_key in _memory_schema_ready:
+        if owns_conn:
+            conn.close()
+        return
     cursor = conn.cursor()
     cursor.execute(
         '''
@@ -77,51 +101,323 @@ def ensure_memory_table(conn=None):
         )
         '''
     )
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS agent_memory_kv (
+            session_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value_json TEXT,
+            updated_at TEXT,
+            encoding TEXT NOT NULL DEFAULT 'json',
+            value_blob BLOB,
+            PRIMARY KEY (session_id, key)
+        )
+        '''
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS agent_memory_blobs (
+            digest TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TEXT
+        )
+        '''
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_memory_updated_at ON agent_memory (updated_at)")
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version < MEMORY_SCHEMA_VERSION:
+        _migrate_memory_encoding(cursor)
+        _migrate_memory_documents(cursor)
+        cursor.execute(f"PRAGMA user_version = {MEMORY_SCHEMA_VERSION}")
     conn.commit()
+    _memory_schema_ready.add(db_key)
     if owns_conn:
         conn.close()
 
 
-def save_memory_state(session_id: str, state: dict) -> None:
+def _migrate_memory_encoding(cursor) -> None:
+    """
+    Adds the encoding columns to per-key rows written before compression existed and
+    re-encodes oversized plain JSON values.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(agent_memory_kv)")}
+    if "encoding" not in columns:
+        cursor.execute("ALTER TABLE agent_memory_kv ADD COLUMN encoding TEXT NOT NULL DEFAULT 'json'")
+    if "value_blob" not in columns:
+        cursor.execute("ALTER TABLE agent_memory_kv ADD COLUMN value_blob BLOB")
+    rows = cursor.execute(
+        """
+        SELECT session_id, key, value_json, updated_at FROM agent_memory_kv
+        WHERE encoding = 'json' AND length(value_json) >= ?
+        """,
+        (MEMORY_COMPRESS_BYTES,),
+    ).fetchall()
+    for session_id, key, value_json, updated_at in rows:
+        _write_memory_rows(cursor, session_id, [(key, value_json)], updated_at)
+
+
+def _migrate_memory_documents(cursor) -> None:
+    """
+    Splits legacy state_json documents into per-key rows.
+    """
+    rows = cursor.execute(
+        "SELECT session_id, state_json, updated_at FROM agent_memory WHERE state_json IS NOT NULL"
+    ).fetchall()
+    for session_id, state_json, updated_at in rows:
+        try:
+            state = json.loads(state_json) if state_json else {}
+        except json.JSONDecodeError:
+            state = {}
+        if not isinstance(state, dict):
+            state = {}
+        _write_memory_rows(cursor, session_id, [(key, _encode_json(value)) for key, value in state.items()], updated_at)
+        cursor.execute(
+            "UPDATE agent_memory SET state_json = NULL WHERE session_id = ?",
+            (session_id,),
+        )
+
+
+def _encode_json(value) -> str:
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def _digest(encoded: str) -> str:
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _pack_value(encoded: str):
+    """
+    Chooses the storage form of a serialized value: returns (encoding, value_json, value_blob, spill)
+    where spill is a (digest, data, size) row for agent_memory_blobs or None.
+    """
+    raw = encoded.encode("utf-8")
+    if len(raw) >= MEMORY_SPILL_BYTES:
+        digest = hashlib.sha256(raw).hexdigest()
+        return "ref", digest, None, (digest, zlib.compress(raw), len(raw))
+    if len(raw) >= MEMORY_COMPRESS_BYTES:
+        return "zlib", None, zlib.compress(raw), None
+    return "json", encoded, None, None
+
+
+def _unpack_value(encoding: str, value_json, value_blob, blobs: dict) -> str:
+    """
+    Returns the serialized JSON text of a stored value.
+    """
+    if encoding == "zlib":
+        return zlib.decompress(value_blob).decode("utf-8")
+    if encoding == "ref":
+        return zlib.decompress(blobs[value_json]).decode("utf-8")
+    return value_json if value_json is not None else "null"
+
+
+def _write_memory_rows(cursor, session_id: str, items, updated_at: str) -> None:
+    """
+    Upserts (key, serialized_json) pairs for a session in their packed form.
+    """
+    rows = []
+    spills = []
+    for key, encoded in items:
+        encoding, value_json, value_blob, spill = _pack_value(encoded)
+        rows.append((session_id, key, value_json, updated_at, encoding, value_blob))
+        if spill:
+            spills.append((*spill, updated_at))
+    if spills:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO agent_memory_blobs (digest, data, size, created_at) VALUES (?, ?, ?, ?)",
+            spills,
+        )
+    if rows:
+        cursor.executemany(
+            """
+            INSERT INTO agent_memory_kv (session_id, key, value_json, updated_at, encoding, value_blob)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id, key) DO UPDATE SET
+                value_json=excluded.value_json, updated_at=excluded.updated_at,
+                encoding=excluded.encoding, value_blob=excluded.value_blob
+            """,
+            rows,
+        )
+
+
+def purge_orphan_blobs(conn=None) -> int:
+    """
+    Deletes spilled values no longer referenced by any session; returns the number removed.
+    """
+    owns_conn = conn is None
+    conn = conn or connect_db()
+    ensure_memory_table(conn)
+    cursor = conn.execute(
+        """
+        DELETE FROM agent_memory_blobs WHERE digest NOT IN (
+            SELECT value_json FROM agent_memory_kv WHERE encoding = 'ref'
+        )
+        """
+    )
+    removed = cursor.rowcount
+    conn.commit()
+    if owns_conn:
+        conn.close()
+    return removed
+
+
+def purge_expired_memory(ttl_seconds: float) -> int:
     """
-    Persists the session state as JSON for durable memory.
+    Deletes the persisted state of sessions not updated within ttl_seconds, along with
+    any spilled values only they referenced; returns the number of sessions removed.
     """
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)).isoformat()
     ensure_memory_table()
     conn = connect_db()
     cursor = conn.cursor()
-    payload = json.dumps(state or {})
+    expired = [
+        row[0]
+        for row in cursor.execute(
+            "SELECT session_id FROM agent_memory WHERE updated_at < ?", (cutoff,)
+        ).fetchall()
+    ]
+    if expired:
+        cursor.executemany(
+            "DELETE FROM agent_memory_kv WHERE session_id = ?", [(sid,) for sid in expired]
+        )
+        cursor.executemany(
+            "DELETE FROM agent_memory WHERE session_id = ?", [(sid,) for sid in expired]
+        )
+        conn.commit()
+        purge_orphan_blobs(conn)
+    conn.close()
+    db_path = get_db_path()
+    with _digest_lock:
+        for sid in expired:
+            _persisted_digests.pop((db_path, sid), None)
+    return len(expired)
+
+
+def compact_memory_db(vacuum: bool = True) -> None:
+    """
+    Refreshes query planner statistics and, optionally, rebuilds the DB file to reclaim
+    the space left by purged rows.
+    """
+    conn = connect_db()
+    conn.execute("PRAGMA optimize")
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+
+
+def memory_stats() -> dict:
+    """
+    Returns row counts and stored bytes for the agent_memory tables.
+    """
+    ensure_memory_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    sessions = cursor.execute("SELECT COUNT(*) FROM agent_memory").fetchone()[0]
+    keys = cursor.execute("SELECT COUNT(*) FROM agent_memory_kv").fetchone()[0]
+    blobs, blob_bytes = cursor.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM agent_memory_blobs"
+    ).fetchone()
+    conn.close()
+    return {"sessions": sessions, "keys": keys, "blobs": blobs, "blob_bytes": blob_bytes}
+
+
+def save_memory_state(session_id: str, state: dict) -> None:
+    """
+    Persists the session state, writing only the keys whose values changed since the
+    last save or load of this session in this process. Each value is serialized once
+    (unsupported types fall back to str). If the stored rows no longer match what this
+    process last saw (deleted or rewritten elsewhere), the whole state is written.
+    """
+    state = state or {}
+    encoded = {key: _encode_json(value) for key, value in state.items()}
+    digests = {key: _digest(value) for key, value in encoded.items()}
+    db_path = get_db_path()
+    with _digest_lock:
+        known = _persisted_digests.get((db_path, session_id))
+
+    ensure_memory_table()
+    conn = connect_db(db_path)
+    cursor = conn.cursor()
+    if known is not None:
+        stored = cursor.execute(
+            "SELECT COUNT(*) FROM agent_memory_kv WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        if stored != len(known):
+            known = None
+    if known is None:
+        dirty = list(encoded)
+        removed = None
+    else:
+        dirty = [key for key, digest in digests.items() if known.get(key) != digest]
+        removed = [key for key in known if key not in encoded]
+
     updated_at = datetime.datetime.utcnow().isoformat()
     cursor.execute(
         """
         INSERT INTO agent_memory (session_id, state_json, updated_at)
-        VALUES (?, ?, ?)
-        ON CONFLICT(session_id) DO UPDATE SET state_json=excluded.state_json, updated_at=excluded.updated_at
+        VALUES (?, NULL, ?)
+        ON CONFLICT(session_id) DO UPDATE SET updated_at=excluded.updated_at
         """,
-        (session_id, payload, updated_at),
+        (session_id, updated_at),
     )
+    _write_memory_rows(cursor, session_id, [(key, encoded[key]) for key in dirty], updated_at)
+    if removed is None:
+        # Full write: drop keys that are no longer part of the state.
+        placeholders = ",".join("?" for _ in encoded)
+        if encoded:
+            cursor.execute(
+                f"DELETE FROM agent_memory_kv WHERE session_id = ? AND key NOT IN ({placeholders})",
+                (session_id, *encoded),
+            )
+        else:
+            cursor.execute("DELETE FROM agent_memory_kv WHERE session_id = ?", (session_id,))
+    elif removed:
+        cursor.executemany(
+            "DELETE FROM agent_memory_kv WHERE session_id = ? AND key = ?",
+            [(session_id, key) for key in removed],
+        )
     conn.commit()
     conn.close()
+    with _digest_lock:
+        _persisted_digests[(db_path, session_id)] = digests
 
 
 def load_memory_state(session_id: str) -> dict:
     """
-    Loads the persisted session state if present.
+    Loads the persisted session state (materialized from the per-key rows) if present.
     """
+    db_path = get_db_path()
     ensure_memory_table()
-    conn = connect_db()
+    conn = connect_db(db_path)
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT state_json FROM agent_memory WHERE session_id = ?",
+        "SELECT key, encoding, value_json, value_blob FROM agent_memory_kv WHERE session_id = ?",
         (session_id,),
     )
-    row = cursor.fetchone()
+    rows = cursor.fetchall()
+    refs = [value_json for _, encoding, value_json, _ in rows if encoding == "ref"]
+    blobs = {}
+    if refs:
+        placeholders = ",".join("?" for _ in refs)
+        cursor.execute(
+            f"SELECT digest, data FROM agent_memory_blobs WHERE digest IN ({placeholders})",
+            refs,
+        )
+        blobs = dict(cursor.fetchall())
     conn.close()
-    if not row or not row[0]:
-        return {}
-    try:
-        return json.loads(row[0])
-    except json.JSONDecodeError:
-        return {}
+    state = {}
+    digests = {}
+    for key, encoding, value_json, value_blob in rows:
+        try:
+            encoded = _unpack_value(encoding, value_json, value_blob, blobs)
+            state[key] = json.loads(encoded)
+        except (KeyError, ValueError, zlib.error):
+            continue
+        digests[key] = _digest(encoded)
+    if rows:
+        with _digest_lock:
+            _persisted_digests[(db_path, session_id)] = digests
+    return state
 
 
 if __name__=='__main__':
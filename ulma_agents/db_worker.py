@@ -0,0 +1,90 @@
+'''
+Dedicated SQLite worker thread.
+
+All blocking persistence calls made from async code (session service, runner, state
+writer flushes) are queued here, so a slow disk stalls only this thread and not the
+event loop that streams every session's events.
+'''
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from .tracing import db_span
+
+
+class DbWorker:
+    def __init__(self, name: str = "ulma-db"):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0}
+        self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Queues fn(*args, **kwargs) on the worker thread and returns a concurrent Future.
+        Calls made from the worker thread itself run inline to avoid self-deadlock.
+        """
+        future: Future = Future()
+        if threading.current_thread() is self._thread:
+            self._call(future, contextvars.copy_context(), fn, args, kwargs)
+            return future
+        self.stats["submitted"] += 1
+        self._queue.put((future, contextvars.copy_context(), fn, args, kwargs, time.perf_counter()))
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Awaitable form of submit(); the caller's event loop stays free while fn runs.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _call(self, future: Future, ctx, fn, args, kwargs, queued_at: Optional[float] = None) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(ctx.run(self._traced, fn, args, kwargs, queued_at))
+            self.stats["completed"] += 1
+        except BaseException as exc:
+            self.stats["failed"] += 1
+            future.set_exception(exc)
+
+    @staticmethod
+    def _traced(fn, args, kwargs, queued_at: Optional[float]) -> Any:
+        wait_ms = round((time.perf_counter() - queued_at) * 1000, 2) if queued_at else 0.0
+        with db_span(f"sqlite {getattr(fn, '__qualname__', repr(fn))}", **{"db.system": "sqlite", "db.queue_wait_ms": wait_ms}):
+            return fn(*args, **kwargs)
+
+    def _run(self) -> None:
+        while True:
+            future, ctx, fn, args, kwargs, queued_at = self._queue.get()
+            self._call(future, ctx, fn, args, kwargs, queued_at)
+
+
+_worker: Optional[DbWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_db_worker() -> DbWorker:
+    """
+    Returns the process-wide SQLite worker, starting it on first use.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DbWorker()
+        return _worker
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a blocking SQLite call on the shared worker thread and awaits its result.
+    """
+    return await get_db_worker().run(fn, *args, **kwargs)
@@ -0,0 +1,352 @@
+'''
+Local employee directory on top of the `users` table.
+
+Adds a case-insensitive unique index on user_name, an FTS5 index for partial and fuzzy
+name matches (trigram tokenizer where SQLite supports it), a streaming CSV/JSONL bulk
+importer and the `search_directory` tool used by the supervisor.
+
+A database that already holds duplicate user names (case-insensitive) is never cleaned up
+automatically: the duplicates are exported to logs/directory/ and the unique index is left
+out (so bulk imports refuse to run) until they are resolved by hand.
+
+    python -m ulma_agents.directory import users.csv
+    python -m ulma_agents.directory search "serena"
+    python -m ulma_agents.directory duplicates
+'''
+
+import csv
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .config import LOG_DIR
+from .create_db import connect_db
+from .db_worker import run_db
+
+IMPORT_BATCH_SIZE = 5000
+_FUZZY_CANDIDATES = 200
+_schema_ready = set()
+_duplicates_reported = set()
+
+
+def _has_trigram() -> bool:
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def ensure_directory_schema(conn=None) -> None:
+    """
+    Ensures the users table, its unique user_name index and the FTS index exist.
+    If duplicate user_name rows (case-insensitive) exist, the unique index is not created
+    and the duplicates are exported for manual resolution instead.
+    """
+    owns_conn = conn is None
+    conn = conn or connect_db()
+    db_key = conn.execute("PRAGMA database_list").fetchone()[2]
+    if db_key in _schema_ready:
+        if owns_conn:
+            conn.close()
+        return
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_name TEXT NOT NULL,
+            role TEXT NOT NULL,
+            groups TEXT,
+            apps,
+            upn TEXT
+        )
+        '''
+    )
+    # Older users tables have no upn column; offboarding resolves the account from it.
+    if "upn" not in {row[1] for row in cursor.execute("PRAGMA table_info(users)")}:
+        cursor.execute("ALTER TABLE users ADD COLUMN upn TEXT")
+    has_index = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_users_user_name'"
+    ).fetchone()
+    if not has_index:
+        duplicates = find_duplicate_users(conn)
+        if duplicates:
+            if db_key not in _duplicates_reported:
+                _duplicates_reported.add(db_key)
+                path = export_duplicate_users(duplicates)
+                print(
+                    f"[directory] {len(duplicates)} users share a name with another row; "
+                    f"the unique user_name index was not created. Resolve them by hand (see {path})."
+                )
+        else:
+            cursor.execute(
+                "CREATE UNIQUE INDEX idx_users_user_name ON users (user_name COLLATE NOCASE)"
+            )
+            has_index = True
+    has_fts = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    ).fetchone()
+    if not has_fts:
+        tokenizer = "trigram" if _has_trigram() else "unicode61"
+        cursor.execute(
+            f"""
+            CREATE VIRTUAL TABLE users_fts USING fts5(
+                user_name, role, groups, content='users', content_rowid='id', tokenize='{tokenizer}'
+            )
+            """
+        )
+        cursor.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts (rowid, user_name, role, groups)
+                VALUES (new.id, new.user_name, new.role, new.groups);
+            END;
+            CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, user_name, role, groups)
+                VALUES ('delete', old.id, old.user_name, old.role, old.groups);
+            END;
+            CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, user_name, role, groups)
+                VALUES ('delete', old.id, old.user_name, old.role, old.groups);
+                INSERT INTO users_fts (rowid, user_name, role, groups)
+                VALUES (new.id, new.user_name, new.role, new.groups);
+            END;
+            """
+        )
+        cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+    conn.commit()
+    if has_index:
+        # Without the index the duplicates are checked again on the next call.
+        _schema_ready.add(db_key)
+    if owns_conn:
+        conn.close()
+
+
+def find_duplicate_users(conn) -> List[Dict[str, Any]]:
+    """
+    Returns every users row whose user_name (case-insensitive) is used by another row.
+    """
+    rows = conn.execute(
+        """
+        SELECT id, user_name, role, groups, apps, upn FROM users
+        WHERE lower(user_name) IN (
+            SELECT lower(user_name) FROM users GROUP BY lower(user_name) HAVING COUNT(*) > 1
+        )
+        ORDER BY lower(user_name), id
+        """
+    ).fetchall()
+    return [_row_to_dict(r) for r in rows]
+
+
+def export_duplicate_users(duplicates: List[Dict[str, Any]]) -> str:
+    """
+    Writes duplicate users rows to logs/directory/duplicate_users_<timestamp>.jsonl.
+    """
+    folder = os.path.join(LOG_DIR, "directory")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"duplicate_users_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for row in duplicates:
+            f.write(json.dumps(row) + "\n")
+    return path
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(v).strip() for v in value if str(v).strip())
+    return str(value).strip()
+
+
+def read_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams records from a CSV (header row) or JSONL file, or from stdin when path is '-'.
+    """
+    if fmt is None:
+        fmt = "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+    handle = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+    try:
+        if fmt == "jsonl":
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(handle)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def _batches(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for record in records:
+        name = _as_text(record.get("user_name") or record.get("name"))
+        if not name:
+            continue
+        batch.append(
+            (
+                name,
+                _as_text(record.get("role")) or "",
+                _as_text(record.get("groups")),
+                _as_text(record.get("apps")),
+                _as_text(record.get("upn") or record.get("userPrincipalName")),
+            )
+        )
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_users(path: str, fmt: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Bulk upserts directory records from a CSV/JSONL file (or '-' for stdin).
+
+    Records need a user_name (or name) and may carry role, groups, apps and upn (or
+    userPrincipalName); list values are stored comma-separated. Rows are written with executemany, one transaction per
+    batch, so memory stays flat regardless of file size.
+    """
+    conn = connect_db()
+    ensure_directory_schema(conn)
+    has_index = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_users_user_name'"
+    ).fetchone()
+    if not has_index:
+        conn.close()
+        raise RuntimeError(
+            "users has duplicate user names and no unique index; resolve them first "
+            "(python -m ulma_agents.directory duplicates)"
+        )
+    conn.execute("PRAGMA synchronous = NORMAL")
+    imported = 0
+    batches = 0
+    try:
+        for batch in _batches(read_records(path, fmt), batch_size):
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO users (user_name, role, groups, apps, upn) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(user_name COLLATE NOCASE) DO UPDATE SET
+                        role=excluded.role, groups=excluded.groups, apps=excluded.apps,
+                        upn=COALESCE(excluded.upn, users.upn)
+                    """,
+                    batch,
+                )
+            imported += len(batch)
+            batches += 1
+    finally:
+        conn.close()
+    return {"status": "imported", "records": imported, "batches": batches, "source": path}
+
+
+def _trigrams(text: str) -> set:
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fts_quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    return {"id": row[0], "user_name": row[1], "role": row[2], "groups": row[3], "apps": row[4], "upn": row[5]}
+
+
+def find_users(query: str, limit: int = 10) -> Dict[str, Any]:
+    """
+    Looks up users in the local directory by exact, partial or approximate name (blocking).
+    """
+    query = (query or "").strip()
+    if not query:
+        return {"query": query, "exact": False, "matches": []}
+    conn = connect_db()
+    ensure_directory_schema(conn)
+    cursor = conn.cursor()
+    columns = "users.id, users.user_name, users.role, users.groups, users.apps, users.upn"
+    try:
+        row = cursor.execute(
+            f"SELECT {columns} FROM users WHERE user_name = ? COLLATE NOCASE", (query,)
+        ).fetchone()
+        if row:
+            return {"query": query, "exact": True, "matches": [_row_to_dict(row)]}
+
+        if len(query) < 3:
+            # Too short for trigrams: prefix scan on the NOCASE index.
+            rows = cursor.execute(
+                f"SELECT {columns} FROM users WHERE user_name LIKE ? ORDER BY user_name LIMIT ?",
+                (query.replace("%", "").replace("_", "") + "%", limit),
+            ).fetchall()
+            return {"query": query, "exact": False, "matches": [_row_to_dict(r) for r in rows]}
+
+        rows = cursor.execute(
+            f"""
+            SELECT {columns} FROM users_fts JOIN users ON users.id = users_fts.rowid
+            WHERE users_fts MATCH ? ORDER BY bm25(users_fts) LIMIT ?
+            """,
+            (f"user_name : {_fts_quote(query)}", limit),
+        ).fetchall()
+        if not rows:
+            # Fuzzy pass: any shared trigram is a candidate, re-ranked by similarity.
+            wanted = _trigrams(query)
+            terms = " OR ".join(_fts_quote(t) for t in sorted(wanted) if t.strip() and len(t.strip()) == 3)
+            candidates = []
+            if terms:
+                candidates = cursor.execute(
+                    f"""
+                    SELECT {columns} FROM users_fts JOIN users ON users.id = users_fts.rowid
+                    WHERE users_fts MATCH ? ORDER BY bm25(users_fts) LIMIT ?
+                    """,
+                    (f"user_name : ({terms})", _FUZZY_CANDIDATES),
+                ).fetchall()
+            scored = []
+            for cand in candidates:
+                have = _trigrams(cand[1])
+                score = len(wanted & have) / len(wanted | have)
+                if score >= 0.3:
+                    scored.append((score, cand))
+            scored.sort(key=lambda item: -item[0])
+            rows = [cand for _, cand in scored[:limit]]
+    except sqlite3.OperationalError as exc:
+        return {"query": query, "exact": False, "matches": [], "error": str(exc)}
+    finally:
+        conn.close()
+    return {"query": query, "exact": False, "matches": [_row_to_dict(r) for r in rows]}
+
+
+async def search_directory(query: str, limit: int = 10) -> Dict[str, Any]:
+    """
+    Looks up users in the local directory by exact, partial or approximate name.
+
+    Args:
+        query: Full or partial user name (typos are tolerated).
+        limit: Maximum number of matches to return.
+    """
+    return await run_db(find_users, query, limit)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ULMA local directory tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="bulk import users from CSV/JSONL ('-' for stdin)")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=["csv", "jsonl"])
+    imp.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    find = sub.add_parser("search", help="search users by name")
+    find.add_argument("query")
+    find.add_argument("--limit", type=int, default=10)
+    sub.add_parser("duplicates", help="list users rows that block the unique user_name index")
+    args = parser.parse_args()
+    if args.command == "import":
+        print(import_users(args.path, args.format, args.batch_size))
+    elif args.command == "duplicates":
+        conn = connect_db()
+        ensure_directory_schema(conn)
+        print(json.dumps(find_duplicate_users(conn), indent=2))
+        conn.close()
+    else:
+        print(json.dumps(find_users(args.query, args.limit), indent=2))
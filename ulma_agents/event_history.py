@@ -0,0 +1,165 @@
+'''
+Bounded per-session event history.
+
+Keeps a ring buffer of compact event summaries (author, invocation, text preview, tool
+calls) instead of the event objects or their generators. When spilling is enabled every
+summary, with its full text, is also appended to logs/sessions/<session_id>.events.jsonl
+so the complete history can be paged from disk.
+'''
+
+import datetime
+import json
+import os
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .config import LOG_DIR
+
+TEXT_PREVIEW_CHARS = 500
+
+
+def summarize_event(event: Any, preview_chars: Optional[int] = TEXT_PREVIEW_CHARS) -> Dict[str, Any]:
+    """
+    Returns a small JSON-safe summary of an ADK event (or of the runner's text events).
+    """
+    texts, calls, responses = [], [], []
+    content = getattr(event, "content", None)
+    for part in getattr(content, "parts", None) or []:
+        if getattr(part, "text", None):
+            texts.append(part.text)
+        func_call = getattr(part, "function_call", None)
+        if func_call is not None:
+            calls.append(getattr(func_call, "name", None))
+        func_response = getattr(part, "function_response", None)
+        if func_response is not None:
+            responses.append(getattr(func_response, "name", None))
+    text = "".join(texts)
+    summary = {
+        "ts": datetime.datetime.utcnow().isoformat(),
+        "id": getattr(event, "id", None),
+        "invocation_id": getattr(event, "invocation_id", None),
+        "author": getattr(event, "author", None) or getattr(content, "role", None),
+        "text": text if preview_chars is None else text[:preview_chars],
+    }
+    if preview_chars is not None and len(text) > preview_chars:
+        summary["truncated"] = True
+    if calls:
+        summary["function_calls"] = calls
+    if responses:
+        summary["function_responses"] = responses
+    if getattr(event, "partial", None):
+        summary["partial"] = True
+    return summary
+
+
+def default_spill_path(session_id: str) -> str:
+    path = os.path.join(LOG_DIR, "sessions")
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, f"{session_id}.events.jsonl")
+
+
+class EventHistory:
+    """
+    Ring buffer of the last `maxlen` event summaries, with optional JSONL spill.
+
+    Args:
+        maxlen: Summaries kept in memory.
+        spill_path: JSONL file receiving every summary (full text); None keeps memory only.
+    """
+
+    def __init__(self, maxlen: int = 200, spill_path: Optional[str] = None):
+        self.maxlen = maxlen
+        self.spill_path = spill_path
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        # Byte offsets of spilled lines (8 bytes per event), built lazily from the file.
+        self._offsets: Optional[array] = None
+        self._recorded = 0
+
+    def __len__(self) -> int:
+        return self.total()
+
+    def record(self, event: Any) -> Dict[str, Any]:
+        summary = summarize_event(event)
+        self._recent.append(summary)
+        self._recorded += 1
+        if self.spill_path:
+            self._spill(summarize_event(event, preview_chars=None) if summary.get("truncated") else summary)
+        return summary
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the newest summaries kept in memory, oldest first.
+        """
+        items = list(self._recent)
+        return items if limit is None else items[-limit:]
+
+    def total(self) -> int:
+        if self.spill_path:
+            return len(self._load_offsets())
+        return self._recorded
+
+    def page(self, offset: int = 0, limit: int = 50, newest_first: bool = True) -> Dict[str, Any]:
+        """
+        Returns one page of past events. Pages come from the spill file when enabled
+        (full history across restarts), otherwise from the in-memory buffer.
+        """
+        total = self.total()
+        if newest_first:
+            end = max(total - offset, 0)
+            start = max(end - limit, 0)
+        else:
+            start = min(offset, total)
+            end = min(start + limit, total)
+        if self.spill_path:
+            items = self._read_spilled(start, end)
+        else:
+            # The buffer holds the last len(self._recent) of `total` events.
+            first_kept = total - len(self._recent)
+            buffered = list(self._recent)
+            items = buffered[max(start - first_kept, 0):max(end - first_kept, 0)]
+        if newest_first:
+            items.reverse()
+        return {"total": total, "offset": offset, "limit": limit, "events": items}
+
+    def _spill(self, summary: Dict[str, Any]) -> None:
+        offsets = self._load_offsets()
+        line = (json.dumps(summary, default=str) + "\n").encode("utf-8")
+        try:
+            with open(self.spill_path, "ab") as handle:
+                position = handle.tell()
+                handle.write(line)
+            offsets.append(position)
+        except OSError as exc:
+            print(f"[memory] failed to spill event history: {exc}")
+
+    def _load_offsets(self) -> array:
+        if self._offsets is None:
+            self._offsets = array("Q")
+            if os.path.exists(self.spill_path):
+                position = 0
+                with open(self.spill_path, "rb") as handle:
+                    for line in handle:
+                        if not line.endswith(b"\n"):
+                            break
+                        self._offsets.append(position)
+                        position += len(line)
+                if position != os.path.getsize(self.spill_path):
+                    # Drop a line cut short by a crash so new lines start cleanly.
+                    os.truncate(self.spill_path, position)
+        return self._offsets
+
+    def _read_spilled(self, start: int, end: int) -> List[Dict[str, Any]]:
+        if start >= end:
+            return []
+        offsets = self._load_offsets()
+        items = []
+        with open(self.spill_path, "rb") as handle:
+            handle.seek(offsets[start])
+            for _ in range(end - start):
+                line = handle.readline()
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return items
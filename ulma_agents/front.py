@@ -7,9 +7,9 @@ from .supervisor import supervisor_agent
 import datetime
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from .config import config
+from .config import config, model_with_retry, workflow
 from .tools import set_approval_status, get_approval_status
-import vertexai
+from .workflow import lifecycle_workflow, start_workflow
 import os
 import dotenv
 
@@ -23,6 +23,9 @@ def _init_client():
     use_vertex = os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "").lower()
 
     if use_vertex != "false" and project and location:
+        # Imported only on the Vertex path: the aiplatform SDK is the slowest import here.
+        import vertexai
+
         vertexai.init(project=project, location=location)
         return
 
@@ -37,9 +40,14 @@ def _init_client():
 
 _init_client()
 
+if workflow.enabled:
+    _ROUTE_STEP = '''5. **Route:** For a standard request - onboarding, offboarding or granting app access for ONE user with goal, user_name and policy_doc present - call "start_workflow" with the parsed fields; it hands the request to the deterministic 'lifecycle_workflow'. If it returns status "not_standard", or for anything else (several users, revoking or removing access, licenses or groups, unclear goals, questions), transfer to 'supervisor_agent'. If the user says "check again"/"check now" after 'lifecycle_workflow' asked for an approval reply, transfer to 'lifecycle_workflow'. NEVER call any other sub-agents directly.'''
+else:
+    _ROUTE_STEP = '''5. **Route to Supervisor:** ALWAYS transfer the request to 'supervisor_agent' for execution. NEVER call any other sub-agents directly.'''
+
 agent=Agent(
     name = 'user_facing_agent',
-    model=config.front_agent,
+    model=model_with_retry(config.front_agent),
     description='The user facing agent. Takes requests from the user and parses. Updates the user at the end of the operations.',
     instruction='''
     You are the front face of a user lice cycle management system. Your primary function is to take user requests in, parse them and
@@ -57,7 +65,7 @@ agent=Agent(
         6. extra - any other information that is not generic or filler words (OPTIONAL)
     3. **Confirmation of information:** Ask the user to confirm the information. Notify the user of any missing value. goal and user_name are MANDATORY. DO NOT continue if any of themy are missing. OPTIONAL keys may have missing values. If user updates with new information, update the current input and continue to the next step.
     4. **Refine:** Ensure that the parsed information from step 2 are correctly formatted as a dictionary. There must be a dictionary per user_name. An example is, {{'user_name':'John Doe','data':{'goal': 'onboarding the user', 'role': 'admin', 'apps':['Adobe Photoshop'],'policy_doc':'document_A.pdf'}}}. 
-    5. **Route to Supervisor:** ALWAYS transfer the request to 'supervisor_agent' for execution. NEVER call any other sub-agents directly.
+    ''' + _ROUTE_STEP + '''
     6. **Await:** Await for an update from the 'supervisor_agent'. Notify the user that you are waiting for an update.
     7. **Update**: Update the user with the information received from the 'supervisor_agent'. Be clear and concise.
         1. If the 'supervisor_agent' sent a plan to be approved, request the user approval.
@@ -69,8 +77,9 @@ agent=Agent(
 
     When asked who you are, respond with a brief description of your puprspose - "User-Life Cycle Management:".
     ''',
-    sub_agents = [supervisor_agent],
-    tools=[FunctionTool(set_approval_status), FunctionTool(get_approval_status)],
+    sub_agents = [supervisor_agent] + ([lifecycle_workflow] if workflow.enabled else []),
+    tools=[FunctionTool(set_approval_status), FunctionTool(get_approval_status)]
+    + ([FunctionTool(start_workflow)] if workflow.enabled else []),
     output_key='parsed_user_request'
 )
 
@@ -0,0 +1,43 @@
+'''
+Deferred module attributes.
+
+`lazy_attributes` builds a PEP 562 module `__getattr__` that creates an attribute the first
+time it is read and stores it in the module, so later reads are plain global lookups.
+Modules use it for objects that are expensive to import or construct (the agent tree,
+SDK option objects), which keeps `import ulma_agents` and the CLIs that only need
+config/SQLite helpers fast.
+'''
+
+import importlib
+from typing import Any, Callable, Dict, Tuple, Union
+
+# name -> zero-argument factory, or (module, attribute) to import relative to the package.
+LazySpec = Union[Callable[[], Any], Tuple[str, str]]
+
+
+def lazy_attributes(namespace: Dict[str, Any], specs: Dict[str, LazySpec]) -> Callable[[str], Any]:
+    """
+    Returns a module `__getattr__` that resolves the names in `specs` on first access.
+
+    Args:
+        namespace: The module's globals(); resolved values are cached there.
+        specs: name -> factory, or name -> (module, attribute).
+    """
+    package = namespace.get("__package__") or namespace["__name__"]
+
+    def __getattr__(name: str) -> Any:
+        if name in namespace:
+            # Also lets the module call its own __getattr__ to read a lazy value.
+            return namespace[name]
+        spec = specs.get(name)
+        if spec is None:
+            raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+        if isinstance(spec, tuple):
+            module_name, attribute = spec
+            value = getattr(importlib.import_module(module_name, package), attribute)
+        else:
+            value = spec()
+        namespace[name] = value
+        return value
+
+    return __getattr__
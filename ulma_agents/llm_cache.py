@@ -0,0 +1,258 @@
+'''
+Model response cache.
+
+LlmCachePlugin answers repeated model calls of deterministic agents (policy extraction on
+the same document and goal, standard Teams summaries) from SQLite. The key is the model,
+a hash of the system instruction, the normalized conversation contents and the tool
+schema, so any change in prompt, history or available tools is a miss. Entries expire
+after `llm_cache.ttl_seconds` and the least recently used ones are evicted beyond
+`llm_cache.max_entries`.
+
+    python -m ulma_agents.llm_cache report
+    python -m ulma_agents.llm_cache clear
+'''
+
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .config import llm_cache
+from .create_db import connect_db
+from .db_worker import run_db
+
+_WHITESPACE = re.compile(r"\s+")
+_schema_ready = set()
+
+
+def _dump(value: Any) -> Any:
+    if value is None:
+        return None
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_dump(v) for v in value]
+    return value
+
+
+def _normalize_part(part: Dict[str, Any]) -> Dict[str, Any]:
+    part = dict(part)
+    # Call ids and thought signatures differ on every run without changing the meaning.
+    part.pop("thought_signature", None)
+    for key in ("function_call", "function_response"):
+        if key in part:
+            part[key] = {k: v for k, v in part[key].items() if k != "id"}
+    if "text" in part:
+        part["text"] = _WHITESPACE.sub(" ", part["text"]).strip()
+    return part
+
+
+def cache_key(llm_request) -> str:
+    """
+    Hash of model, system instruction, normalized contents and tool schema.
+    """
+    cfg = getattr(llm_request, "config", None)
+    instruction = _dump(getattr(cfg, "system_instruction", None))
+    contents = [
+        {"role": c.get("role"), "parts": [_normalize_part(p) for p in c.get("parts") or []]}
+        for c in _dump(list(llm_request.contents or []))
+    ]
+    payload = {
+        "model": llm_request.model,
+        "instruction": hashlib.sha256(json.dumps(instruction, sort_keys=True).encode()).hexdigest(),
+        "contents": contents,
+        "tools": _dump(getattr(cfg, "tools", None)),
+        "response_schema": _dump(getattr(cfg, "response_schema", None)),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _called_tools(llm_response) -> List[str]:
+    parts = getattr(getattr(llm_response, "content", None), "parts", None) or []
+    return [p.function_call.name for p in parts if getattr(p, "function_call", None) is not None]
+
+
+def ensure_cache_tables(conn) -> None:
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            agent TEXT NOT NULL,
+            model TEXT,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        '''
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)")
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS llm_cache_stats (
+            agent TEXT PRIMARY KEY,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            stores INTEGER NOT NULL DEFAULT 0
+        )
+        '''
+    )
+    conn.commit()
+
+
+def _connect():
+    conn = connect_db()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        ensure_cache_tables(conn)
+        _schema_ready.add(path)
+    return conn
+
+
+def _count(conn, agent: str, column: str) -> None:
+    conn.execute(
+        f"INSERT INTO llm_cache_stats (agent, {column}) VALUES (?, 1) "
+        f"ON CONFLICT(agent) DO UPDATE SET {column} = {column} + 1",
+        (agent,),
+    )
+
+
+def cache_lookup(key: str, agent: str, ttl_seconds: float) -> Optional[str]:
+    conn = _connect()
+    now = time.time()
+    row = conn.execute(
+        "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?", (key, now - ttl_seconds)
+    ).fetchone()
+    if row:
+        conn.execute("UPDATE llm_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?", (now, key))
+    _count(conn, agent, "hits" if row else "misses")
+    conn.commit()
+    conn.close()
+    return row[0] if row else None
+
+
+def cache_store(key: str, agent: str, model: str, response: str, ttl_seconds: float, max_entries: int) -> None:
+    conn = _connect()
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO llm_cache (key, agent, model, response, created_at, last_used_at, hits) "
+        "VALUES (?, ?, ?, ?, ?, ?, 0)",
+        (key, agent, model, response, now, now),
+    )
+    _count(conn, agent, "stores")
+    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - ttl_seconds,))
+    conn.execute(
+        "DELETE FROM llm_cache WHERE key IN "
+        "(SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+        (max_entries,),
+    )
+    conn.commit()
+    conn.close()
+
+
+def cache_report() -> List[Dict[str, Any]]:
+    """
+    Hit rate and stored entries per agent.
+    """
+    conn = _connect()
+    entries = dict(conn.execute("SELECT agent, COUNT(*) FROM llm_cache GROUP BY agent").fetchall())
+    rows = conn.execute("SELECT agent, hits, misses, stores FROM llm_cache_stats ORDER BY agent").fetchall()
+    conn.close()
+    return [
+        {
+            "agent": agent,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "stores": stores,
+            "entries": entries.get(agent, 0),
+        }
+        for agent, hits, misses, stores in rows
+    ]
+
+
+def clear_cache() -> int:
+    conn = _connect()
+    removed = conn.execute("DELETE FROM llm_cache").rowcount
+    conn.execute("DELETE FROM llm_cache_stats")
+    conn.commit()
+    conn.close()
+    return removed
+
+
+class LlmCachePlugin(BasePlugin):
+    """
+    Runner plugin that serves eligible agents' model calls from the SQLite cache.
+    """
+
+    def __init__(
+        self,
+        agents: Optional[Tuple[str, ...]] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        name: str = "ulma_llm_cache",
+    ):
+        super().__init__(name=name)
+        self.agents = set(agents if agents is not None else llm_cache.agents)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else llm_cache.ttl_seconds
+        self.max_entries = max_entries if max_entries is not None else llm_cache.max_entries
+        self.uncacheable_tools = set(llm_cache.uncacheable_tools)
+        self._pending: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        agent = callback_context.agent_name
+        if agent not in self.agents or not llm_request.contents:
+            return None
+        key = cache_key(llm_request)
+        try:
+            cached = await run_db(cache_lookup, key, agent, self.ttl_seconds)
+        except Exception as exc:
+            print(f"[llm_cache] lookup failed: {exc}")
+            return None
+        if cached is not None:
+            return LlmResponse.model_validate_json(cached)
+        self._pending[(callback_context.invocation_id, agent)] = (key, llm_request.model)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if getattr(llm_response, "partial", False):
+            return None
+        pending = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if pending is None or llm_response.error_code or llm_response.content is None:
+            return None
+        if self.uncacheable_tools.intersection(_called_tools(llm_response)):
+            return None
+        key, model = pending
+        try:
+            await run_db(
+                cache_store,
+                key,
+                callback_context.agent_name,
+                model,
+                llm_response.model_dump_json(exclude_none=True),
+                self.ttl_seconds,
+                self.max_entries,
+            )
+        except Exception as exc:
+            print(f"[llm_cache] store failed: {exc}")
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ULMA model response cache")
+    parser.add_argument("command", choices=["report", "clear"])
+    args = parser.parse_args()
+    if args.command == "report":
+        print(json.dumps(cache_report(), indent=2))
+    else:
+        print(f"[llm_cache] removed {clear_cache()} entries")
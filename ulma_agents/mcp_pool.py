@@ -0,0 +1,277 @@
+'''
+Pooled MCP client toolsets.
+
+`get_mcp_toolset(url)` returns one PooledMcpToolset per MCP server for the whole process,
+so every agent, session and workflow step shares its connection and tool list:
+- list_tools results are cached for `tools_ttl_seconds`. The cache version is bumped on
+  reconnect, on an unknown-tool error and by `invalidate_tools()`, so a changed server
+  is re-listed on the next use.
+- A keepalive task pings the server when the connection has been idle for
+  `health_interval_seconds`, and a connection idle for that long is pinged before use.
+- A dropped connection is closed and re-opened with exponential backoff. Read-only tools
+  (`retry_tools`) are re-sent after the reconnect, while writes return the error.
+- At most `max_concurrent_calls` tool calls run against the server at once.
+
+The cached tool list ignores the readonly context, so pool only servers without
+per-context headers or tool filters (the Azure identity server).
+'''
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+import httpx
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.mcp_tool.mcp_session_manager import SseConnectionParams
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+
+from .config import mcp_pool
+
+PING_TIMEOUT_SECONDS = 5.0
+
+_CONNECTION_ERRORS = (
+    ConnectionError,
+    OSError,
+    asyncio.TimeoutError,
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+)
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    if isinstance(exc, BaseExceptionGroup):
+        return any(_is_connection_error(e) for e in exc.exceptions)
+    return isinstance(exc, _CONNECTION_ERRORS)
+
+
+def _unknown_tool(result: Any) -> bool:
+    return (
+        isinstance(result, dict)
+        and bool(result.get("isError"))
+        and "unknown tool" in str(result.get("content")).lower()
+    )
+
+
+class PooledMcpTool(BaseTool):
+    """
+    An MCP tool whose calls go through its PooledMcpToolset (concurrency cap, reconnects).
+    """
+
+    def __init__(self, tool: BaseTool, pool: "PooledMcpToolset"):
+        super().__init__(name=tool.name, description=tool.description, is_long_running=tool.is_long_running)
+        self.tool = tool
+        self.pool = pool
+
+    def _get_declaration(self):
+        return self.tool._get_declaration()
+
+    async def run_async(self, *, args: Dict[str, Any], tool_context) -> Any:
+        return await self.pool.call_tool(self.tool, args, tool_context)
+
+
+class PooledMcpToolset(McpToolset):
+    """
+    McpToolset shared across sessions, with a cached tool list, health checks, reconnect
+    backoff and bounded parallel calls.
+    """
+
+    def __init__(self, *, connection_params, settings=None, **kwargs):
+        super().__init__(connection_params=connection_params, **kwargs)
+        self.settings = settings or mcp_pool
+        self.label = getattr(connection_params, "url", None) or type(connection_params).__name__
+        self.version = 0
+        self.generation = 0
+        self._pool_tools: Optional[List[BaseTool]] = None
+        self._pool_tools_version = -1
+        self._pool_tools_expire = 0.0
+        self._list_lock = asyncio.Lock()
+        self._reconnect_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max(1, self.settings.max_concurrent_calls))
+        self._in_flight = 0
+        self._healthy = True
+        self._last_ok = 0.0
+        self._last_ping_ms: Optional[float] = None
+        self._keepalive: Optional[asyncio.Task] = None
+        self.counters = {
+            "list_hits": 0, "list_misses": 0, "calls": 0, "connection_errors": 0,
+            "reconnects": 0, "pings": 0, "failed_pings": 0,
+        }
+
+    def invalidate_tools(self) -> None:
+        """
+        Drops the cached tool list; the next get_tools() lists the server again.
+        """
+        self.version += 1
+
+    async def get_tools(self, readonly_context=None) -> List[BaseTool]:
+        self._start_keepalive()
+        async with self._list_lock:
+            if (
+                self._pool_tools is not None
+                and self._pool_tools_version == self.version
+                and time.monotonic() < self._pool_tools_expire
+            ):
+                self.counters["list_hits"] += 1
+                return list(self._pool_tools)
+            self.counters["list_misses"] += 1
+            list_tools = super().get_tools
+            tools = await self._with_reconnect(lambda: list_tools(readonly_context), retry=True)
+            self._pool_tools = [PooledMcpTool(t, self) for t in tools]
+            self._pool_tools_version = self.version
+            self._pool_tools_expire = time.monotonic() + self.settings.tools_ttl_seconds
+            return list(self._pool_tools)
+
+    async def call_tool(self, tool: BaseTool, args: Dict[str, Any], tool_context) -> Any:
+        """
+        Runs one MCP tool call under the concurrency cap, reconnecting a dropped connection.
+        """
+        retry = any(tool.name.endswith(suffix) for suffix in self.settings.retry_tools)
+        async with self._semaphore:
+            self.counters["calls"] += 1
+            self._in_flight += 1
+            try:
+                result = await self._with_reconnect(
+                    lambda: tool.run_async(args=args, tool_context=tool_context), retry=retry
+                )
+            finally:
+                self._in_flight -= 1
+        if _unknown_tool(result):
+            self.invalidate_tools()
+        return result
+
+    async def ping(self) -> bool:
+        """
+        Round trip to the server on the pooled session; marks the pool unhealthy on failure.
+        """
+        started = time.perf_counter()
+        self.counters["pings"] += 1
+        try:
+            session = await self._mcp_session_manager.create_session()
+            await asyncio.wait_for(session.send_ping(), PING_TIMEOUT_SECONDS)
+        except Exception as exc:
+            self.counters["failed_pings"] += 1
+            self._healthy = False
+            print(f"[mcp_pool] {self.label} ping failed: {exc}")
+            return False
+        self._last_ping_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._mark_ok()
+        return True
+
+    async def warm(self) -> None:
+        """
+        Opens the connection and fills the tool cache ahead of the first request.
+        """
+        await self.get_tools()
+
+    async def close(self) -> None:
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        await super().close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "server": self.label,
+            "healthy": self._healthy,
+            "tools_cached": len(self._pool_tools or []) if self._pool_tools_version == self.version else 0,
+            "version": self.version,
+            "in_flight": self._in_flight,
+            "max_concurrent_calls": self.settings.max_concurrent_calls,
+            "idle_s": round(time.monotonic() - self._last_ok, 1) if self._last_ok else None,
+            "last_ping_ms": self._last_ping_ms,
+            **self.counters,
+        }
+
+    def _mark_ok(self) -> None:
+        self._healthy = True
+        self._last_ok = time.monotonic()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.settings.reconnect_base_delay * (2 ** attempt), self.settings.reconnect_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _with_reconnect(self, op: Callable[[], Awaitable[Any]], retry: bool) -> Any:
+        attempt = 0
+        while True:
+            await self._ensure_healthy()
+            generation = self.generation
+            try:
+                result = await op()
+            except Exception as exc:
+                if not _is_connection_error(exc):
+                    raise
+                self.counters["connection_errors"] += 1
+                await self._reconnect(generation, exc)
+                if not retry or attempt >= self.settings.reconnect_attempts:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._mark_ok()
+            return result
+
+    async def _ensure_healthy(self) -> None:
+        interval = self.settings.health_interval_seconds
+        idle = self._last_ok and interval > 0 and time.monotonic() - self._last_ok > interval
+        if not self._healthy or idle:
+            generation = self.generation
+            if not await self.ping():
+                await self._reconnect(generation, None)
+
+    async def _reconnect(self, generation: int, error: Optional[BaseException]) -> None:
+        async with self._reconnect_lock:
+            if generation != self.generation:
+                return  # another caller already replaced this connection
+            self.generation += 1
+            self.version += 1
+            self.counters["reconnects"] += 1
+            print(f"[mcp_pool] reconnecting to {self.label}" + (f" after: {error}" if error else ""))
+            try:
+                await self._mcp_session_manager.close()
+            except Exception as exc:
+                print(f"[mcp_pool] closing the stale session failed: {exc}")
+            self._healthy = True
+
+    def _start_keepalive(self) -> None:
+        interval = self.settings.health_interval_seconds
+        if interval <= 0 or (self._keepalive is not None and not self._keepalive.done()):
+            return
+        self._keepalive = asyncio.get_running_loop().create_task(self._keepalive_loop(interval))
+
+    async def _keepalive_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self._last_ok and time.monotonic() - self._last_ok >= interval and self._in_flight == 0:
+                await self.ping()
+
+
+_pools: Dict[str, PooledMcpToolset] = {}
+
+
+def get_mcp_toolset(url: str, tool_name_prefix: Optional[str] = None) -> PooledMcpToolset:
+    """
+    The process-wide pooled toolset for an SSE MCP server.
+    """
+    key = f"{url}|{tool_name_prefix or ''}"
+    if key not in _pools:
+        _pools[key] = PooledMcpToolset(
+            connection_params=SseConnectionParams(url=url), tool_name_prefix=tool_name_prefix
+        )
+    return _pools[key]
+
+
+def mcp_pool_stats() -> List[Dict[str, Any]]:
+    return [pool.stats() for pool in _pools.values()]
+
+
+async def close_mcp_pools() -> None:
+    for pool in list(_pools.values()):
+        try:
+            await pool.close()
+        except Exception as exc:
+            print(f"[mcp_pool] closing {pool.label} failed: {exc}")
+    _pools.clear()
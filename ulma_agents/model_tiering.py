@@ -0,0 +1,305 @@
+'''
+Adaptive model tiering.
+
+ModelTieringPlugin classifies every invocation by risk and complexity from the user's
+message (and the front agent's parsed request once it is in state) and picks a tier:
+"routine" for short, fully specified, low-risk requests and "escalated" for ambiguous or
+high-risk ones. Before each model call it swaps in the model configured for that agent
+and tier in `config.model_tiering`. Latency, tokens, errors and the outcome of every
+invocation are stored per tier in SQLite so the tiers can be compared.
+
+    python -m ulma_agents.model_tiering report
+'''
+
+import datetime
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .config import model_tiering
+from .create_db import connect_db
+from .db_worker import run_db
+
+_MANDATORY_FIELDS = ("goal", "user_name", "policy_doc")
+
+
+def _content_text(content) -> str:
+    parts = getattr(content, "parts", None) or []
+    return " ".join(part.text for part in parts if getattr(part, "text", None))
+
+
+def classify_request(text: str, parsed: Any = None, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Returns {"tier", "risk", "complexity", "reasons"} for a request.
+
+    Args:
+        text: The user's message.
+        parsed: The front agent's parsed request (parsed_user_request), if available.
+        state: Session state, used to keep approval follow-ups escalated.
+    """
+    settings = model_tiering
+    lowered = f" {(text or '').lower()} "
+    parsed_text = parsed if isinstance(parsed, str) else json.dumps(parsed, default=str) if parsed else ""
+    risk_reasons: List[str] = []
+    complexity_reasons: List[str] = []
+
+    risky = [k for k in settings.high_risk_keywords if re.search(rf"\b{re.escape(k)}", lowered)]
+    if risky:
+        risk_reasons.append(f"high-risk keyword: {', '.join(risky)}")
+    if state and (state.get("WAITING_FOR_APPROVAL") or state.get("APPROVAL_FILENAME")):
+        risk_reasons.append("approval in progress")
+
+    words = len(lowered.split())
+    if words > settings.long_request_words:
+        complexity_reasons.append(f"long request ({words} words)")
+    markers = [m.strip() for m in settings.ambiguity_markers if m in lowered]
+    if markers:
+        complexity_reasons.append(f"ambiguity markers: {', '.join(markers)}")
+    if parsed_text:
+        if parsed_text.count("user_name") > 1:
+            complexity_reasons.append("multiple users")
+        missing = [
+            f for f in _MANDATORY_FIELDS
+            if re.search(rf"['\"]{f}['\"]\s*:\s*(null|none|['\"]['\"])", parsed_text, re.IGNORECASE)
+        ]
+        if missing:
+            complexity_reasons.append(f"missing fields: {', '.join(missing)}")
+
+    risk = "high" if risk_reasons else "normal"
+    complexity = "complex" if complexity_reasons else "simple"
+    tier = "escalated" if risk_reasons or complexity_reasons else "routine"
+    return {"tier": tier, "risk": risk, "complexity": complexity, "reasons": risk_reasons + complexity_reasons}
+
+
+def ensure_tier_stats_table(conn) -> None:
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS model_tier_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invocation_id TEXT,
+            session_id TEXT,
+            tier TEXT NOT NULL,
+            risk TEXT,
+            complexity TEXT,
+            reasons TEXT,
+            models TEXT,
+            model_calls INTEGER,
+            model_ms REAL,
+            total_ms REAL,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            model_errors INTEGER,
+            tool_errors INTEGER,
+            outcome TEXT,
+            created_at TEXT
+        )
+        '''
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_model_tier_stats_tier ON model_tier_stats (tier, created_at)")
+    conn.commit()
+
+
+def record_tier_stats(row: Dict[str, Any]) -> None:
+    conn = connect_db()
+    ensure_tier_stats_table(conn)
+    columns = list(row)
+    conn.execute(
+        f"INSERT INTO model_tier_stats ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        [row[c] for c in columns],
+    )
+    conn.commit()
+    conn.close()
+
+
+def tier_report(since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Aggregates latency, tokens, errors and outcomes per tier (optionally since an ISO time).
+    """
+    conn = connect_db()
+    ensure_tier_stats_table(conn)
+    rows = conn.execute(
+        """
+        SELECT tier, COUNT(*), AVG(total_ms), AVG(model_ms), AVG(model_calls),
+               AVG(input_tokens), AVG(output_tokens),
+               SUM(model_errors > 0 OR tool_errors > 0),
+               SUM(outcome = 'ok'), SUM(outcome = 'paused'), SUM(outcome = 'no_answer')
+        FROM model_tier_stats WHERE created_at >= ? GROUP BY tier ORDER BY tier
+        """,
+        (since or "",),
+    ).fetchall()
+    conn.close()
+    report = []
+    for tier, count, total_ms, model_ms, calls, tokens_in, tokens_out, errored, ok, paused, no_answer in rows:
+        report.append(
+            {
+                "tier": tier,
+                "invocations": count,
+                "avg_total_ms": round(total_ms or 0, 1),
+                "avg_model_ms": round(model_ms or 0, 1),
+                "avg_model_calls": round(calls or 0, 2),
+                "avg_input_tokens": round(tokens_in or 0),
+                "avg_output_tokens": round(tokens_out or 0),
+                "error_rate": round((errored or 0) / count, 3),
+                "ok_rate": round((ok or 0) / count, 3),
+                "paused": paused or 0,
+                "no_answer": no_answer or 0,
+            }
+        )
+    return report
+
+
+class ModelTieringPlugin(BasePlugin):
+    """
+    Runner plugin that routes each invocation to a model tier and records its outcome.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, Dict[str, str]]] = None, name: str = "ulma_model_tiering"):
+        super().__init__(name=name)
+        self.tiers = tiers or model_tiering.tiers
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._model_started: Dict[tuple, float] = {}
+
+    def profile(self, invocation_id: str) -> Optional[Dict[str, Any]]:
+        run = self._runs.get(invocation_id)
+        return run["profile"] if run else None
+
+    async def before_run_callback(self, *, invocation_context):
+        state = dict(invocation_context.session.state or {})
+        profile = classify_request(
+            _content_text(invocation_context.user_content), state.get("parsed_user_request"), state
+        )
+        self._runs[invocation_context.invocation_id] = {
+            "profile": profile,
+            "session_id": invocation_context.session.id,
+            "started": time.perf_counter(),
+            "models": set(),
+            "model_calls": 0,
+            "model_ms": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "model_errors": 0,
+            "tool_errors": 0,
+            "outcome": "no_answer",
+        }
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        run = self._runs.get(callback_context.invocation_id)
+        if run is None:
+            return None
+        profile = run["profile"]
+        if profile["tier"] == "routine" and not run.get("refined"):
+            # The front agent's parse lands in state mid-run; a parse with missing fields or
+            # several users escalates the downstream agents.
+            parsed = callback_context.state.get("parsed_user_request")
+            if parsed:
+                refined = classify_request("", parsed)
+                if refined["complexity"] == "complex":
+                    profile.update(tier="escalated", complexity="complex", reasons=refined["reasons"])
+                run["refined"] = True
+        model = self.tiers.get(profile["tier"], {}).get(callback_context.agent_name)
+        if model:
+            llm_request.model = model
+        run["models"].add(f"{callback_context.agent_name}={llm_request.model}")
+        self._model_started[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if getattr(llm_response, "partial", False):
+            return None
+        run = self._runs.get(callback_context.invocation_id)
+        started = self._model_started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if run is None:
+            return None
+        run["model_calls"] += 1
+        if started is not None:
+            run["model_ms"] += (time.perf_counter() - started) * 1000
+        usage = getattr(llm_response, "usage_metadata", None)
+        run["input_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+        run["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+        if getattr(llm_response, "error_code", None):
+            run["model_errors"] += 1
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._model_started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        run = self._runs.get(callback_context.invocation_id)
+        if run is not None:
+            run["model_errors"] += 1
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        if isinstance(result, dict) and result.get("error"):
+            run = self._runs.get(tool_context.invocation_id)
+            if run is not None:
+                run["tool_errors"] += 1
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        run = self._runs.get(tool_context.invocation_id)
+        if run is not None:
+            run["tool_errors"] += 1
+        return None
+
+    async def on_event_callback(self, *, invocation_context, event):
+        run = self._runs.get(invocation_context.invocation_id)
+        if run is None or getattr(event, "partial", False):
+            return None
+        for part in getattr(getattr(event, "content", None), "parts", None) or []:
+            call = getattr(part, "function_call", None)
+            if call is not None and call.name == "adk_request_confirmation":
+                run["outcome"] = "paused"
+        if run["outcome"] != "paused" and event.is_final_response() and _content_text(event.content):
+            run["outcome"] = "ok"
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        run = self._runs.pop(invocation_context.invocation_id, None)
+        if run is None:
+            return None
+        profile = run["profile"]
+        outcome = run["outcome"]
+        if outcome == "ok" and (run["model_errors"] or run["tool_errors"]):
+            outcome = "error"
+        row = {
+            "invocation_id": invocation_context.invocation_id,
+            "session_id": run["session_id"],
+            "tier": profile["tier"],
+            "risk": profile["risk"],
+            "complexity": profile["complexity"],
+            "reasons": json.dumps(profile["reasons"]),
+            "models": ",".join(sorted(run["models"])),
+            "model_calls": run["model_calls"],
+            "model_ms": round(run["model_ms"], 2),
+            "total_ms": round((time.perf_counter() - run["started"]) * 1000, 2),
+            "input_tokens": run["input_tokens"],
+            "output_tokens": run["output_tokens"],
+            "model_errors": run["model_errors"],
+            "tool_errors": run["tool_errors"],
+            "outcome": outcome,
+            "created_at": datetime.datetime.utcnow().isoformat(),
+        }
+        try:
+            await run_db(record_tier_stats, row)
+        except Exception as exc:
+            print(f"[tiering] failed to record tier stats: {exc}")
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ULMA model tiering")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="latency/quality per tier")
+    rep.add_argument("--since", help="ISO timestamp lower bound")
+    cls = sub.add_parser("classify", help="show the tier a request would get")
+    cls.add_argument("text")
+    args = parser.parse_args()
+    if args.command == "report":
+        print(json.dumps(tier_report(args.since), indent=2))
+    else:
+        print(json.dumps(classify_request(args.text), indent=2))
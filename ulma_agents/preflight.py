@@ -0,0 +1,187 @@
+'''
+Supervisor pre-flight fan-out.
+
+`preflight_check` runs the independent lookups the supervisor needs before planning
+concurrently and returns them as one result:
+- the directory match,
+- the branch location,
+- a keyword pre-selection of the policy lines relevant to the goal (a starting point for
+  'policy_agent', which still reviews the policy and sets STATE_POLICY_OK),
+- whether the user exists in Entra ID (through the Azure MCP toolset, when a UPN is given),
+- the approval state.
+This replaces several sequential model turns with one tool call. Every check has its own
+timeout, so a slow or failing check is reported without holding back the others.
+'''
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+from google.adk.tools.tool_context import ToolContext
+
+from .config import preflight
+from .directory import search_directory
+from .tools import get_approval_status, lookup_user_location, read_doc
+
+_GOAL_KEYWORDS = {
+    "onboard": ("onboard", "new hire", "new user", "joiner", "provision", "license", "access", "group"),
+    "offboard": ("offboard", "leaver", "terminat", "delete", "remov", "disable", "revoke", "retention"),
+    "access": ("access", "permission", "role", "group", "application", "privileged", "approval"),
+}
+_OBLIGATION = re.compile(r"\b(must|shall|should|required|not allowed|prohibited|only)\b", re.IGNORECASE)
+_policy_cache: Dict[Tuple[str, float], List[str]] = {}
+
+
+def _policy_lines(policy_doc: str) -> List[str]:
+    base_name = os.path.splitext(policy_doc)[0]
+    pdf_path = os.path.join(os.path.dirname(__file__), "policy", base_name + ".pdf")
+    if not os.path.exists(pdf_path):
+        return []
+    key = (pdf_path, os.path.getmtime(pdf_path))
+    if key not in _policy_cache:
+        text = read_doc(policy_doc)["text"]
+        _policy_cache.clear()
+        _policy_cache[key] = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+    return _policy_cache[key]
+
+
+def extract_policy_constraints(policy_doc: str, goal: str, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Returns the policy lines that state obligations relevant to the goal.
+
+    Args:
+        policy_doc: Policy document name (with or without .pdf).
+        goal: The requested operation, e.g. "Onboard as engineer with Jira access".
+        limit: Maximum number of lines to return.
+    """
+    limit = limit or preflight.max_policy_lines
+    lines = _policy_lines(policy_doc)
+    if not lines:
+        return {"policy_doc": policy_doc, "found": False, "constraints": []}
+    goal_lower = (goal or "").lower()
+    keywords = {w for w in re.findall(r"[a-z]{4,}", goal_lower)}
+    for name, words in _GOAL_KEYWORDS.items():
+        if name in goal_lower:
+            keywords.update(words)
+    relevant = [
+        line for line in lines
+        if _OBLIGATION.search(line) and any(k in line.lower() for k in keywords)
+    ]
+    if not relevant:
+        relevant = [line for line in lines if _OBLIGATION.search(line)]
+    return {"policy_doc": policy_doc, "found": True, "constraints": relevant[:limit], "total_matches": len(relevant)}
+
+
+async def identity_mcp_tools() -> list:
+    """
+    Tools of the identity agent's Azure MCP toolset (empty if it has none).
+    """
+    from .sub_agents.identity_agent import identity_agent
+
+    # The identity agent's toolset, so a replaced or pooled toolset is picked up as well.
+    toolset = next((t for t in identity_agent.tools if isinstance(t, McpToolset)), None)
+    if toolset is None:
+        return []
+    return await toolset.get_tools()
+
+
+async def lookup_graph_user(upn: str, tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Looks the UPN up in Entra ID through the Azure MCP get_user tool.
+    """
+    tools = await identity_mcp_tools()
+    tool = next((t for t in tools if t.name.endswith("get_user")), None)
+    if tool is None:
+        return {"checked": False, "reason": "get_user tool not available on the Azure MCP server"}
+    result = await tool.run_async(args={"upn": upn}, tool_context=tool_context)
+    return {"checked": True, "result": result}
+
+
+def graph_account(check: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The Entra ID user object returned by a lookup_graph_user check, or None when the
+    lookup did not run, failed or returned no user.
+    """
+    if not check or not check.get("checked") or check.get("error"):
+        return None
+    result = check.get("result")
+    if hasattr(result, "model_dump"):
+        result = result.model_dump(exclude_none=True, mode="json")
+    if not isinstance(result, dict) or result.get("isError") or result.get("error"):
+        return None
+    # MCP results carry the tool's return value as structured content and/or JSON text.
+    candidates = [result.get("structuredContent"), result]
+    for item in result.get("content") or []:
+        try:
+            candidates.append(json.loads(item.get("text") or ""))
+        except (AttributeError, ValueError):
+            continue
+    for candidate in candidates:
+        if not isinstance(candidate, dict):
+            continue
+        for user in (candidate, candidate.get("result"), candidate.get("user")):
+            if isinstance(user, dict) and user.get("userPrincipalName"):
+                return user
+    return None
+
+
+def _approval_state(tool_context: ToolContext) -> Dict[str, Any]:
+    status = get_approval_status(tool_context)
+    status["waiting"] = bool(tool_context.state.get("WAITING_FOR_APPROVAL"))
+    status["filename"] = tool_context.state.get("APPROVAL_FILENAME")
+    return status
+
+
+async def _guarded(coro, timeout: float) -> Dict[str, Any]:
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        return {"error": f"timed out after {timeout}s"}
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
+async def preflight_check(
+    user_name: str,
+    goal: str,
+    policy_doc: str,
+    tool_context: ToolContext,
+    upn: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Runs the pre-flight checks for a request concurrently and returns them together:
+    directory match, branch location, candidate policy lines, Entra ID existence (only
+    when a UPN is given) and the current approval state. Session state is not changed:
+    the policy lines are a keyword match, not a policy review.
+
+    Args:
+        user_name: The user the request is about.
+        goal: The requested operation (onboard/offboard/access...).
+        policy_doc: Policy document name.
+        upn: Optional user principal name to check against Entra ID.
+    """
+    started = time.perf_counter()
+    timeout = preflight.timeout_seconds
+
+    async def _approval() -> Dict[str, Any]:
+        return _approval_state(tool_context)
+
+    checks = {
+        "directory": search_directory(user_name),
+        "location": asyncio.to_thread(lookup_user_location, user_name),
+        "policy": asyncio.to_thread(extract_policy_constraints, policy_doc, goal),
+        "approval": _approval(),
+    }
+    if upn:
+        checks["graph"] = lookup_graph_user(upn, tool_context)
+    results = await asyncio.gather(*(_guarded(c, timeout) for c in checks.values()))
+    result = dict(zip(checks, results))
+    if not upn:
+        result["graph"] = {"checked": False, "reason": "no upn given"}
+
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
@@ -0,0 +1,274 @@
+'''
+Process-wide Gemini rate limiting.
+
+RateScheduler enforces a requests-per-minute and tokens-per-minute budget per model over
+a sliding 60 s window, shared by every session in the process. A call that does not fit
+waits in a priority queue: interactive turns are admitted before batch rows. Waiters are
+woken by a timer when the window frees enough capacity, so sessions queue behind the
+budget instead of all hitting 429 and backing off at the same time. Token reservations
+use an estimate (prompt size plus expected output) and are corrected with the real usage
+once the response arrives.
+
+RateLimitPlugin applies the scheduler to every model call. Client-side retries for the
+calls that still fail come from `config.retry_config`, which is attached to every agent's
+model. Set the priority of the current task with `request_priority.set("batch")`.
+'''
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .config import rate_limits
+from .context_compaction import estimate_tokens
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+WINDOW_SECONDS = 60.0
+
+request_priority: contextvars.ContextVar[str] = contextvars.ContextVar("ulma_request_priority", default="interactive")
+
+
+@dataclass
+class Grant:
+    model: str
+    tokens: int
+    priority: str
+    waited: float = 0.0
+    # [timestamp, tokens] entry in the model's token window; None when the model is unlimited.
+    entry: Optional[List[float]] = None
+
+
+@dataclass
+class _ModelState:
+    requests: Deque[float] = field(default_factory=deque)
+    tokens: Deque[List[float]] = field(default_factory=deque)
+    token_total: float = 0.0
+    waiters: List[Tuple[int, int, Grant, asyncio.Future, float]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+    cooldown_until: float = 0.0
+    granted: Dict[str, int] = field(default_factory=dict)
+    waits: Dict[str, Deque[float]] = field(default_factory=dict)
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class RateScheduler:
+    """
+    Per-model RPM/TPM budgets with priority queuing, shared by all sessions in the process.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, int]]] = None, window: float = WINDOW_SECONDS):
+        self.budgets = budgets if budgets is not None else rate_limits.budgets
+        self.window = window
+        self._models: Dict[str, _ModelState] = {}
+        self._seq = itertools.count()
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState()
+        return self._models[model]
+
+    def _prune(self, st: _ModelState, now: float) -> None:
+        cutoff = now - self.window
+        while st.requests and st.requests[0] <= cutoff:
+            st.requests.popleft()
+        while st.tokens and st.tokens[0][0] <= cutoff:
+            st.token_total -= st.tokens.popleft()[1]
+
+    def _fits(self, st: _ModelState, budget: Dict[str, int], tokens: int, now: float) -> bool:
+        if now < st.cooldown_until:
+            return False
+        if len(st.requests) >= budget.get("rpm", float("inf")):
+            return False
+        # A single call larger than the whole budget is admitted once the window is empty.
+        return st.token_total + tokens <= budget.get("tpm", float("inf")) or st.token_total <= 0
+
+    def _record(self, st: _ModelState, grant: Grant, now: float) -> None:
+        st.requests.append(now)
+        grant.entry = [now, grant.tokens]
+        st.tokens.append(grant.entry)
+        st.token_total += grant.tokens
+        st.granted[grant.priority] = st.granted.get(grant.priority, 0) + 1
+        st.waits.setdefault(grant.priority, deque(maxlen=1024)).append(grant.waited)
+
+    async def acquire(self, model: str, tokens: int, priority: str = "interactive") -> Grant:
+        """
+        Waits until the model's budget admits a call of about `tokens` tokens.
+        """
+        grant = Grant(model=model, tokens=max(int(tokens), 0), priority=priority)
+        budget = self.budgets.get(model)
+        if not budget:
+            return grant
+        st = self._state(model)
+        now = time.monotonic()
+        self._prune(st, now)
+        if not st.waiters and self._fits(st, budget, grant.tokens, now):
+            self._record(st, grant, now)
+            return grant
+
+        future = asyncio.get_running_loop().create_future()
+        rank = PRIORITIES.get(priority, len(PRIORITIES))
+        heapq.heappush(st.waiters, (rank, next(self._seq), grant, future, now))
+        self._pump(model)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before the cancellation: give the tokens back.
+                self.settle(grant, 0)
+            raise
+
+    def _pump(self, model: str) -> None:
+        st = self._state(model)
+        budget = self.budgets.get(model) or {}
+        now = time.monotonic()
+        self._prune(st, now)
+        while st.waiters:
+            _, _, grant, future, enqueued = st.waiters[0]
+            if future.done():
+                heapq.heappop(st.waiters)
+                continue
+            if not self._fits(st, budget, grant.tokens, now):
+                break
+            heapq.heappop(st.waiters)
+            grant.waited = now - enqueued
+            self._record(st, grant, now)
+            future.set_result(grant)
+        if st.waiters and st.timer is None:
+            # Wake up when the cooldown ends or the oldest request/tokens leave the window.
+            candidates = [st.cooldown_until]
+            if st.requests:
+                candidates.append(st.requests[0] + self.window)
+            if st.tokens:
+                candidates.append(st.tokens[0][0] + self.window)
+            pending = [t for t in candidates if t > now]
+            delay = min(pending) - now if pending else 0.05
+            st.timer = asyncio.get_running_loop().call_later(max(delay, 0.01), self._on_timer, model)
+
+    def _on_timer(self, model: str) -> None:
+        self._state(model).timer = None
+        self._pump(model)
+
+    def settle(self, grant: Optional[Grant], actual_tokens: Optional[int]) -> None:
+        """
+        Replaces the reserved token estimate with the real usage (None keeps the estimate).
+        """
+        if grant is None or grant.entry is None or actual_tokens is None:
+            return
+        if grant.entry[0] <= time.monotonic() - self.window:
+            return  # already out of the window
+        st = self._state(grant.model)
+        delta = int(actual_tokens) - grant.entry[1]
+        grant.entry[1] += delta
+        st.token_total += delta
+        if delta < 0 and st.waiters:
+            self._pump(grant.model)
+
+    def cool_down(self, model: str, seconds: float) -> None:
+        """
+        Holds back every call to `model` for `seconds` (after a terminal 429).
+        """
+        st = self._state(model)
+        st.cooldown_until = max(st.cooldown_until, time.monotonic() + seconds)
+        print(f"[rate_limit] {model} rate limited; pausing calls for {seconds:.0f}s")
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        models = [model] if model else list(self._models)
+        return sum(
+            1 for m in models for w in self._state(m).waiters if not w[3].done()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        out = {}
+        for model, st in self._models.items():
+            self._prune(st, now)
+            budget = self.budgets.get(model) or {}
+            waiting: Dict[str, int] = {}
+            for _, _, grant, future, _ in st.waiters:
+                if not future.done():
+                    waiting[grant.priority] = waiting.get(grant.priority, 0) + 1
+            out[model] = {
+                "rpm_used": len(st.requests),
+                "rpm_limit": budget.get("rpm"),
+                "tpm_used": int(st.token_total),
+                "tpm_limit": budget.get("tpm"),
+                "queue_depth": waiting,
+                "cooling_down_s": round(max(st.cooldown_until - now, 0.0), 1),
+                "granted": dict(st.granted),
+                "wait_ms": {
+                    p: {
+                        "p50": round(_percentile(w, 50) * 1000, 1),
+                        "p95": round(_percentile(w, 95) * 1000, 1),
+                        "max": round(max(w) * 1000, 1) if w else 0.0,
+                    }
+                    for p, w in st.waits.items()
+                },
+            }
+        return out
+
+
+_scheduler: Optional[RateScheduler] = None
+
+
+def get_scheduler() -> RateScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RateScheduler()
+    return _scheduler
+
+
+def estimate_request_tokens(llm_request) -> int:
+    instruction = getattr(getattr(llm_request, "config", None), "system_instruction", None)
+    instruction_chars = len(instruction) if isinstance(instruction, str) else len(str(instruction or ""))
+    return estimate_tokens(llm_request.contents or []) + instruction_chars // 4 + rate_limits.expected_output_tokens
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    text = str(error)
+    return getattr(error, "code", None) == 429 or "429" in text or "RESOURCE_EXHAUSTED" in text
+
+
+class RateLimitPlugin(BasePlugin):
+    """
+    Runner plugin that admits each model call through the shared RateScheduler.
+    """
+
+    def __init__(self, scheduler: Optional[RateScheduler] = None, name: str = "ulma_rate_limit"):
+        super().__init__(name=name)
+        self.scheduler = scheduler or get_scheduler()
+        self._grants: Dict[Tuple[str, str], Grant] = {}
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        grant = await self.scheduler.acquire(
+            llm_request.model, estimate_request_tokens(llm_request), request_priority.get()
+        )
+        if grant.waited > 1:
+            print(f"[rate_limit] {callback_context.agent_name} waited {grant.waited:.1f}s for {llm_request.model}")
+        self._grants[(callback_context.invocation_id, callback_context.agent_name)] = grant
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if getattr(llm_response, "partial", False):
+            return None
+        grant = self._grants.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        usage = getattr(llm_response, "usage_metadata", None)
+        self.scheduler.settle(grant, getattr(usage, "total_token_count", None))
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._grants.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if _is_rate_limited(error):
+            self.scheduler.cool_down(llm_request.model, rate_limits.cooldown_seconds)
+        return None
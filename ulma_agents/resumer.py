@@ -0,0 +1,252 @@
+'''
+Durable suspend/resume for invocations paused on a human approval.
+
+When a run emits `adk_request_confirmation`, the runner records the paused invocation
+(session, invocation id, confirmation call id, approval filename) in SQLite and ends the
+turn. The ApprovalResumer registers each waiting record with the shared approval watcher
+(no coroutine per approval) and, when the reply arrives, resumes the same invocation via
+runner.run_async(..., invocation_id=...). Waiting records, and records a crash left
+mid-resume, are re-registered on start, so approvals survive restarts. One resumer per
+app is assumed.
+'''
+
+import asyncio
+import contextlib
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from .approval_watcher import get_approval_watcher
+from .create_db import connect_db
+from .db_worker import run_db
+from .tools import aload_session_memory, asave_session_memory
+
+
+def ensure_paused_table(conn) -> None:
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS paused_invocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            invocation_id TEXT,
+            approval_id TEXT,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'waiting',
+            decision TEXT,
+            created_at TEXT,
+            resumed_at TEXT
+        )
+        '''
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_paused_invocations_status ON paused_invocations (app_name, status)"
+    )
+    conn.commit()
+
+
+_COLUMNS = ("id", "app_name", "user_id", "session_id", "invocation_id", "approval_id", "filename", "status")
+
+
+def record_paused_invocation(
+    app_name: str, user_id: str, session_id: str, invocation_id: str, approval_id: str, filename: str
+) -> Dict[str, Any]:
+    conn = connect_db()
+    ensure_paused_table(conn)
+    cursor = conn.execute(
+        """
+        INSERT INTO paused_invocations (app_name, user_id, session_id, invocation_id, approval_id, filename, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (app_name, user_id, session_id, invocation_id, approval_id, filename, datetime.datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    record_id = cursor.lastrowid
+    conn.close()
+    return dict(zip(_COLUMNS, (record_id, app_name, user_id, session_id, invocation_id, approval_id, filename, "waiting")))
+
+
+def list_paused_invocations(app_name: str, status: str = "waiting") -> List[Dict[str, Any]]:
+    conn = connect_db()
+    ensure_paused_table(conn)
+    rows = conn.execute(
+        f"SELECT {', '.join(_COLUMNS)} FROM paused_invocations WHERE app_name = ? AND status = ? ORDER BY id",
+        (app_name, status),
+    ).fetchall()
+    conn.close()
+    return [dict(zip(_COLUMNS, row)) for row in rows]
+
+
+def _claim_paused_invocation(record_id: int, decision: str) -> bool:
+    """
+    Moves a record from waiting to resuming; False if another resumer already took it.
+    """
+    conn = connect_db()
+    ensure_paused_table(conn)
+    cursor = conn.execute(
+        "UPDATE paused_invocations SET status = 'resuming', decision = ? WHERE id = ? AND status = 'waiting'",
+        (decision, record_id),
+    )
+    conn.commit()
+    conn.close()
+    return cursor.rowcount == 1
+
+
+def _requeue_interrupted_resumes(app_name: str) -> int:
+    """
+    Moves records left in 'resuming' (the process stopped mid-resume) back to waiting;
+    returns how many were moved.
+    """
+    conn = connect_db()
+    ensure_paused_table(conn)
+    cursor = conn.execute(
+        "UPDATE paused_invocations SET status = 'waiting' WHERE app_name = ? AND status = 'resuming'",
+        (app_name,),
+    )
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+
+def _finish_paused_invocation(record_id: int, status: str) -> None:
+    conn = connect_db()
+    conn.execute(
+        "UPDATE paused_invocations SET status = ?, resumed_at = ? WHERE id = ?",
+        (status, datetime.datetime.utcnow().isoformat(), record_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+def approval_response_content(approval_id: Optional[str], approved: bool) -> types.Content:
+    """
+    Builds the FunctionResponse that answers an adk_request_confirmation call.
+    """
+    confirmation_response = types.FunctionResponse(
+        id=approval_id,
+        name="adk_request_confirmation",
+        response={"confirmed": bool(approved)},
+    )
+    return types.Content(role="user", parts=[types.Part(function_response=confirmation_response)])
+
+
+async def record_approval_decision(
+    session_service, app_name: str, user_id: str, session_id: str, approved: bool, filename: str
+) -> None:
+    """
+    Stores an approval decision in agent_memory and, as a state-delta event, in the session.
+    """
+    delta = {
+        "WAITING_FOR_APPROVAL": False,
+        "APPROVAL_STATUS": "APPROVED" if approved else "REJECTED",
+        "APPROVAL_TS": datetime.datetime.utcnow().isoformat(),
+        "APPROVAL_FILENAME": filename,
+    }
+    state = await aload_session_memory(session_id) or {}
+    state.update(delta)
+    await asave_session_memory(session_id, state, flush=True)
+
+    session = await session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    if session is not None:
+        await session_service.append_event(
+            session, Event(author="user", actions=EventActions(state_delta=delta))
+        )
+
+
+class ApprovalResumer:
+    """
+    Resumes paused invocations of one Runner when their approval reply arrives.
+
+    Args:
+        runner: The ADK Runner that produced the paused invocations.
+        on_event: Optional callback(record, event) for events of resumed runs.
+        guard: Optional guard(record) returning an async context manager held while a
+            record resumes (the SessionManager uses it for session locks and the turn cap).
+    """
+
+    def __init__(
+        self,
+        runner,
+        on_event: Optional[Callable[[Dict[str, Any], Any], None]] = None,
+        guard: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ):
+        self.runner = runner
+        self.app_name = runner.app_name
+        self.on_event = on_event
+        self.guard = guard
+        self._watched: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = False
+
+    async def start(self) -> int:
+        """
+        Registers every waiting record of this app (e.g. after a restart); idempotent.
+        Records a previous process left in 'resuming' are waiting again, so their resume is
+        retried once the reply is read. Returns the number of records being watched.
+        """
+        if not self._started:
+            self._started = True
+            requeued = await run_db(_requeue_interrupted_resumes, self.app_name)
+            if requeued:
+                print(f"[approval] retrying {requeued} resume(s) interrupted by a restart")
+            for record in await run_db(list_paused_invocations, self.app_name):
+                self._watch(record)
+        return len(self._watched)
+
+    async def suspend(
+        self, *, user_id: str, session_id: str, invocation_id: str, approval_id: str, filename: str
+    ) -> Dict[str, Any]:
+        """
+        Durably records a paused invocation and starts watching for its reply.
+        """
+        record = await run_db(
+            record_paused_invocation, self.app_name, user_id, session_id, invocation_id, approval_id, filename
+        )
+        self._watch(record)
+        return record
+
+    def _watch(self, record: Dict[str, Any]) -> None:
+        if record["id"] in self._watched:
+            return
+        self._watched.add(record["id"])
+        get_approval_watcher().watch(record["filename"], lambda reply: self._spawn(record, reply))
+
+    def _spawn(self, record: Dict[str, Any], reply: Dict[str, Any]) -> None:
+        task = asyncio.get_running_loop().create_task(self._resume(record, reply))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resume(self, record: Dict[str, Any], reply: Dict[str, Any]) -> None:
+        decision = reply.get("decision")
+        approved = decision == "approved"
+        if not await run_db(_claim_paused_invocation, record["id"], decision):
+            return
+        status = "resumed"
+        try:
+            async with self.guard(record) if self.guard else contextlib.nullcontext():
+                await record_approval_decision(
+                    self.runner.session_service,
+                    self.app_name,
+                    record["user_id"],
+                    record["session_id"],
+                    approved,
+                    record["filename"],
+                )
+                resumed = self.runner.run_async(
+                    user_id=record["user_id"],
+                    session_id=record["session_id"],
+                    new_message=approval_response_content(record["approval_id"], approved),
+                    invocation_id=record["invocation_id"],
+                )
+                async for event in resumed:
+                    if self.on_event:
+                        self.on_event(record, event)
+        except Exception as exc:
+            status = "failed"
+            print(f"[approval] failed to resume {record['filename']}: {exc}")
+        finally:
+            self._watched.discard(record["id"])
+            await run_db(_finish_paused_invocation, record["id"], status)
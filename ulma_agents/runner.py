@@ -1,3 +1,4 @@
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.plugins.logging_plugin import (
@@ -5,22 +6,96 @@ from google.adk.plugins.logging_plugin import (
 )
 from google.genai import types
 import uuid
+from typing import Optional
 import inspect
 import os
 import asyncio
-import datetime
-import time
-from .tools import load_session_memory, save_session_memory, read_teams_reply
+from .tools import aload_session_memory, asave_session_memory, read_teams_reply
+from .state_writer import get_state_writer
+from .config import (
+    approvals, context_compaction, llm_cache, model_tiering, persistence, rate_limits, streaming, tracing,
+)
+from .session_service import SqliteSessionService
+from .session_lifecycle import session_stats, start_maintenance
+from .approval_watcher import get_approval_watcher
+from .event_history import EventHistory, default_spill_path
+from .tracing import TracingPlugin
+from .rate_limiter import RateLimitPlugin
+from .resumer import ApprovalResumer, approval_response_content, record_approval_decision
+
+def build_session_service():
+    """
+    Returns the session service selected by `config.persistence` (SQLite by default).
+    """
+    if persistence.session_backend == "memory":
+        return InMemorySessionService()
+    return SqliteSessionService(
+        event_window=persistence.session_event_window or None,
+        max_cached_sessions=persistence.session_cache_size,
+        idle_ttl=persistence.session_idle_ttl,
+    )
+
+
+def build_runner(agent, session_service, app_name: str = "app"):
+    # Optional plugins are imported only when enabled.
+    plugins = [LoggingPlugin()]
+    if model_tiering.enabled:
+        from .model_tiering import ModelTieringPlugin
+
+        plugins.append(ModelTieringPlugin())
+    if context_compaction.enabled:
+        from .context_compaction import ContextCompactionPlugin
+
+        plugins.append(ContextCompactionPlugin())
+    if llm_cache.enabled:
+        from .llm_cache import LlmCachePlugin
+
+        # After tiering and compaction: the chosen model and final contents form the key.
+        plugins.append(LlmCachePlugin())
+    if rate_limits.enabled:
+        # After the cache: cached answers do not spend budget.
+        plugins.append(RateLimitPlugin())
+    if tracing.enabled:
+        plugins.append(TracingPlugin())
+    return Runner(
+        agent=agent, app_name=app_name, session_service=session_service, plugins=plugins
+    )
+
 
 class agent_sessions:
-    def __init__(self,agent):
-        self.events=[]
+    """
+    One conversation (session_id, user_id) on an ADK Runner.
+
+    On its own it builds a private session service, Runner and approval resumer; the
+    SessionManager passes shared ones so many sessions multiplex over a single Runner.
+    """
+    def __init__(
+        self,
+        agent,
+        on_resumed_event=None,
+        *,
+        runner=None,
+        session_service=None,
+        resumer=None,
+        session_id: Optional[str] = None,
+        user_id: str = "user",
+    ):
         self.agent=agent
-        self.session_id=os.getenv("ULMA_SESSION_ID", f"ulma_{uuid.uuid4().hex[:8]}")
-        self.session_service = InMemorySessionService()
-        self.runner = Runner(
-            agent=self.agent, app_name="app", session_service=self.session_service, plugins=[LoggingPlugin()]
+        self.session_id=session_id or os.getenv("ULMA_SESSION_ID", f"ulma_{uuid.uuid4().hex[:8]}")
+        self.user_id=user_id
+        self.history = EventHistory(
+            maxlen=persistence.event_history_size,
+            spill_path=default_spill_path(self.session_id) if persistence.event_spill else None,
         )
+        if runner is not None:
+            self.session_service = runner.session_service
+        else:
+            self.session_service = session_service or build_session_service()
+        self.runner = runner or build_runner(self.agent, self.session_service)
+        self.app_name = self.runner.app_name
+        # Resumes invocations paused on an approval once the reply lands (suspend mode);
+        # on_resumed_event(record, event) receives the events of those resumed runs.
+        self.resumer = resumer or ApprovalResumer(self.runner, on_event=on_resumed_event)
         self._session_ready = False
         return
 
@@ -32,7 +107,7 @@ class agent_sessions:
         if not getter:
             return None
         try:
-            result = getter(app_name="app", user_id="user", session_id=self.session_id)
+            result = getter(app_name=self.app_name, user_id=self.user_id, session_id=self.session_id)
         except TypeError:
             try:
                 result = getter(self.session_id)
@@ -52,37 +127,71 @@ class agent_sessions:
         """
         Loads persisted session state (if any) into the in-memory session.
         """
-        persisted = load_session_memory(self.session_id)
+        persisted = await aload_session_memory(self.session_id)
         if not persisted:
             return
         session = await self._fetch_session()
         if session and hasattr(session, "state") and isinstance(session.state, dict):
             session.state.update(persisted)
 
-    async def _persist_session_state(self):
+    async def _persist_session_state(self, flush: bool = False):
         """
         Persists the current session state to durable storage.
+
+        A SqliteSessionService already stores every state delta in adk_state, which is the
+        session's source of truth; only the checkpoints tools queued for agent_memory are
+        flushed then. The in-memory backend copies the whole state to agent_memory.
         """
+        if isinstance(self.session_service, SqliteSessionService):
+            if flush:
+                await get_state_writer().aflush(self.session_id)
+            return
         session = await self._fetch_session()
         state = getattr(session, "state", None) if session else None
         if isinstance(state, dict):
-            save_session_memory(self.session_id, state)
+            await asave_session_memory(self.session_id, state, flush=flush)
 
     async def _ensure_session(self):
         if self._session_ready:
             return
-        await self.session_service.create_session(
-            app_name="app", user_id="user", session_id=self.session_id
-        )
-        await self._hydrate_session_state()
+        start_maintenance(self.session_service)
+        if approvals.mode == "suspend":
+            await self.resumer.start()
+        if isinstance(self.session_service, SqliteSessionService):
+            # Durable sessions keep their own state and events; agent_memory only seeds
+            # sessions that were started before the SQLite backend existed.
+            if await self._fetch_session() is None:
+                await self.session_service.create_session(
+                    app_name=self.app_name,
+                    user_id=self.user_id,
+                    session_id=self.session_id,
+                    state=await aload_session_memory(self.session_id),
+                )
+        else:
+            await self.session_service.create_session(
+                app_name=self.app_name, user_id=self.user_id, session_id=self.session_id
+            )
+            await self._hydrate_session_state()
         self._session_ready = True
 
+    def stats(self):
+        """Returns cached-session and agent_memory stats for this runner."""
+        return session_stats(self.session_service)
+
     def _get_session_events(self):
-        return self.events
+        """Returns the recent event summaries kept in memory (oldest first)."""
+        return self.history.recent()
+
+    def event_page(self, offset: int = 0, limit: int = 50, newest_first: bool = True):
+        """Pages through past events (the full history when ULMA_EVENT_SPILL is on)."""
+        return self.history.page(offset=offset, limit=limit, newest_first=newest_first)
 
     def _extract_confirmation(self, event):
         """
         Detect ADK pause requests emitted via tool_context.request_confirmation.
+
+        The approval filename comes from the confirmation payload (or the args of the
+        paused tool call), so it does not depend on the session state having been saved.
         """
         content = getattr(event, "content", None)
         if not content or not getattr(content, "parts", None):
@@ -90,53 +199,62 @@ class agent_sessions:
         for part in content.parts:
             func_call = getattr(part, "function_call", None)
             if func_call and getattr(func_call, "name", "") == "adk_request_confirmation":
+                args = getattr(func_call, "args", None) or {}
+                payload = (args.get("toolConfirmation") or {}).get("payload") or {}
+                original_args = (args.get("originalFunctionCall") or {}).get("args") or {}
                 return {
                     "approval_id": getattr(func_call, "id", None) or getattr(func_call, "call_id", None),
                     "invocation_id": getattr(event, "invocation_id", None),
+                    "filename": payload.get("filename") or original_args.get("filename"),
                 }
         return None
 
-    def _get_pending_approval_file(self):
-        state = load_session_memory(self.session_id) or {}
+    @staticmethod
+    def _confirmation_filename(event):
+        """
+        Approval filename from the tool response that requested a confirmation, if any.
+        """
+        actions = getattr(event, "actions", None)
+        for confirmation in (getattr(actions, "requested_tool_confirmations", None) or {}).values():
+            payload = getattr(confirmation, "payload", None)
+            if isinstance(payload, dict) and payload.get("filename"):
+                return payload["filename"]
+        return None
+
+    async def _get_pending_approval_file(self):
+        """
+        Fallback for pauses without a payload: the filename recorded in session memory.
+        """
+        state = await aload_session_memory(self.session_id) or {}
         return state.get("APPROVAL_FILENAME")
 
-    def _update_approval_state(self, approved: bool, filename: str):
-        state = load_session_memory(self.session_id) or {}
-        state["WAITING_FOR_APPROVAL"] = False
-        state["APPROVAL_STATUS"] = "APPROVED" if approved else "REJECTED"
-        state["APPROVAL_TS"] = datetime.datetime.utcnow().isoformat()
-        state["APPROVAL_FILENAME"] = filename
-        save_session_memory(self.session_id, state)
+    async def _update_approval_state(self, approved: bool, filename: str):
+        await record_approval_decision(
+            self.session_service, self.app_name, self.user_id, self.session_id, approved, filename
+        )
 
-    async def _wait_for_file_approval(self, timeout_seconds: int = 300, poll_seconds: int = 5):
+    async def _wait_for_file_approval(self, timeout_seconds: Optional[float] = None, filename: Optional[str] = None):
         """
-        Poll the outgoing approvals folder until an approval/rejection is found.
+        Wait (event-driven, via the shared approval watcher) until the outgoing reply
+        for the pending approval carries a decision.
         """
-        filename = self._get_pending_approval_file()
+        filename = filename or await self._get_pending_approval_file()
         if not filename:
-            return None, "no approval filename found in session state"
-
-        deadline = time.monotonic() + timeout_seconds
-        last_reason = ""
-        while time.monotonic() < deadline:
-            reply = read_teams_reply(filename)
-            last_reason = reply.get("reason", "")
-            if reply.get("done"):
-                decision = reply.get("decision")
-                approved = decision == "approved"
-                self._update_approval_state(approved, filename)
-                return approved, decision
-            await asyncio.sleep(poll_seconds)
-
-        return None, last_reason or "timeout waiting for approval reply"
+            return None, "no approval filename in the confirmation request or session state"
+
+        timeout = approvals.timeout_seconds if timeout_seconds is None else timeout_seconds
+        reply = await get_approval_watcher().wait_for(filename, timeout)
+        if reply is None:
+            last_reason = (await read_teams_reply(filename)).get("reason", "")
+            return None, last_reason or "timeout waiting for approval reply"
+
+        decision = reply.get("decision")
+        approved = decision == "approved"
+        await self._update_approval_state(approved, filename)
+        return approved, decision
 
     def _create_approval_response(self, approval_info, approved: bool):
-        confirmation_response = types.FunctionResponse(
-            id=approval_info.get("approval_id"),
-            name="adk_request_confirmation",
-            response={"confirmed": bool(approved)},
-        )
-        return types.Content(role="user", parts=[types.Part(function_response=confirmation_response)])
+        return approval_response_content(approval_info.get("approval_id"), approved)
 
     def _text_event(self, text: str):
         """
@@ -148,45 +266,97 @@ class agent_sessions:
                 self.invocation_id = None
         return _Evt(types.Content(role="assistant", parts=[types.Part(text=text)]))
     
-    async def execute(self, input_text: str):
-        """Executes the agent with the given input text"""
+    def _run_config(self, stream: Optional[bool] = None):
+        stream = streaming.enabled if stream is None else stream
+        return RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+
+    async def execute(self, input_text: str, stream: Optional[bool] = None):
+        """
+        Executes the agent with the given input text.
+
+        With streaming on (ULMA_STREAMING, or stream=True) partial text events
+        (event.partial) are yielded as the model generates them, followed by the
+        complete, non-partial event.
+        """
         await self._ensure_session()
+        run_config = self._run_config(stream)
         response = self.runner.run_async(
-            session_id=self.session_id, new_message=input_text, user_id="user"
+            session_id=self.session_id, new_message=input_text, user_id=self.user_id, run_config=run_config
         )
-        self.events.append(response)
 
         async def _stream():
+            approval_info = None
+            requested_filename = None
             try:
                 async for event in response:
-                    approval_info = self._extract_confirmation(event)
-                    if approval_info:
-                        # Pause here until the human reply is found in the outgoing folder
-                        yield self._text_event("High-risk operation paused: waiting for approval reply in logs/teams/outgoing...")
-                        approved, decision = await self._wait_for_file_approval()
-                        if approved is None:
-                            yield self._text_event(f"Approval still pending ({decision}). Please add the reply file then ask to 'check again'.")
-                            break
-
-                        # Resume the same invocation with the human decision
-                        approval_response = self._create_approval_response(approval_info, approved)
-                        resumed = self.runner.run_async(
+                    requested_filename = self._confirmation_filename(event) or requested_filename
+                    # Partial (streamed) chunks carry text only; tool calls arrive complete.
+                    confirmation = None if getattr(event, "partial", False) else self._extract_confirmation(event)
+                    if confirmation:
+                        # The paused run still appends the tool response that requested the
+                        # confirmation; drain it so the session can be resumed later.
+                        approval_info = confirmation
+                        continue
+                    yield event
+
+                if approval_info:
+                    filename = (
+                        approval_info.get("filename")
+                        or requested_filename
+                        or await self._get_pending_approval_file()
+                    )
+                    # Make the paused state durable before waiting on the human reply
+                    await self._persist_session_state(flush=True)
+                    if approvals.mode == "suspend" and filename:
+                        # Record the paused invocation and end the turn; the resumer
+                        # continues it when the reply file appears, even after a restart.
+                        await self.resumer.suspend(
+                            user_id=self.user_id,
                             session_id=self.session_id,
-                            new_message=approval_response,
-                            user_id="user",
                             invocation_id=approval_info.get("invocation_id"),
+                            approval_id=approval_info.get("approval_id"),
+                            filename=filename,
                         )
-                        async for resumed_event in resumed:
-                            yield resumed_event
-                        break
+                        yield self._text_event(
+                            f"High-risk operation paused: reply in logs/teams/outgoing/{filename}; "
+                            "the request resumes automatically once the decision is written."
+                        )
+                        return
+                    # Pause here until the human reply is found in the outgoing folder
+                    yield self._text_event("High-risk operation paused: waiting for approval reply in logs/teams/outgoing...")
+                    approved, decision = await self._wait_for_file_approval(filename=filename)
+                    if approved is None:
+                        yield self._text_event(f"Approval still pending ({decision}). Please add the reply file then ask to 'check again'.")
+                        return
 
-                    yield event
+                    # Resume the same invocation with the human decision
+                    approval_response = self._create_approval_response(approval_info, approved)
+                    resumed = self.runner.run_async(
+                        session_id=self.session_id,
+                        new_message=approval_response,
+                        user_id=self.user_id,
+                        invocation_id=approval_info.get("invocation_id"),
+                        run_config=run_config,
+                    )
+                    async for resumed_event in resumed:
+                        yield resumed_event
             finally:
                 try:
-                    await self._persist_session_state()
+                    await self._persist_session_state(flush=True)
                 except Exception as exc:
                     print(f"[memory] failed to persist after run: {exc}")
 
-        return _stream()
+        async def _recorded():
+            # Keep summaries only: neither the generator nor its events outlive the turn.
+            stream = _stream()
+            try:
+                async for event in stream:
+                    if not getattr(event, "partial", False):
+                        self.history.record(event)
+                    yield event
+            finally:
+                await stream.aclose()
+
+        return _recorded()
 
 
@@ -0,0 +1,85 @@
+'''
+Session lifecycle management: idle TTLs for persisted state and durable sessions,
+expiry of cached in-memory sessions, and periodic compaction of the SQLite file.
+'''
+
+import asyncio
+from typing import Any, Dict, Optional
+
+from .config import persistence
+from .create_db import compact_memory_db, memory_stats, purge_expired_memory
+from .db_worker import run_db
+from .session_service import SqliteSessionService
+
+_maintenance_tasks: Dict[int, asyncio.Task] = {}
+
+
+def run_maintenance(
+    session_service: Optional[SqliteSessionService] = None,
+    ttl_seconds: Optional[float] = None,
+    vacuum: bool = True,
+) -> Dict[str, Any]:
+    """
+    Purges expired agent_memory rows and idle durable sessions, then compacts the DB.
+
+    Blocking (SQLite only); cached sessions of purged keys are returned under
+    "purged_keys" so the caller can drop them with session_service.forget() on the loop.
+    """
+    ttl = persistence.session_ttl if ttl_seconds is None else ttl_seconds
+    purged_keys = []
+    if isinstance(session_service, SqliteSessionService):
+        purged_keys = session_service.purge_idle_sessions(ttl)
+    purged_memory = purge_expired_memory(ttl)
+    compact_memory_db(vacuum=vacuum)
+    return {
+        "purged_sessions": len(purged_keys),
+        "purged_memory": purged_memory,
+        "purged_keys": purged_keys,
+    }
+
+
+def session_stats(session_service=None) -> Dict[str, Any]:
+    """
+    Returns live/evicted counts for cached sessions plus agent_memory storage stats.
+    """
+    stats: Dict[str, Any] = {"memory": memory_stats()}
+    if isinstance(session_service, SqliteSessionService):
+        stats["sessions"] = session_service.cache_stats()
+    return stats
+
+
+async def maintenance_loop(session_service=None, interval_seconds: Optional[float] = None) -> None:
+    """
+    Runs session expiry and DB maintenance forever, every interval_seconds.
+    """
+    interval = persistence.maintenance_interval if interval_seconds is None else interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if isinstance(session_service, SqliteSessionService):
+                session_service.expire_idle()
+            result = await run_db(run_maintenance, session_service)
+            if isinstance(session_service, SqliteSessionService):
+                session_service.forget(result["purged_keys"])
+            if result["purged_sessions"] or result["purged_memory"]:
+                print(
+                    f"[memory] maintenance purged {result['purged_sessions']} sessions "
+                    f"and {result['purged_memory']} memory rows"
+                )
+        except Exception as exc:
+            print(f"[memory] maintenance failed: {exc}")
+
+
+def start_maintenance(session_service=None) -> Optional[asyncio.Task]:
+    """
+    Starts one maintenance task per session service on the running loop (idempotent).
+    Returns None when maintenance is disabled (maintenance_interval <= 0).
+    """
+    if persistence.maintenance_interval <= 0:
+        return None
+    key = id(session_service)
+    task = _maintenance_tasks.get(key)
+    if task is None or task.done():
+        task = asyncio.get_running_loop().create_task(maintenance_loop(session_service))
+        _maintenance_tasks[key] = task
+    return task
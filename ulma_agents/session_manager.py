@@ -0,0 +1,201 @@
+'''
+Serves many sessions from one process over a single shared Runner.
+
+Turns of one session run strictly in order (per-session asyncio lock); at most
+`max_concurrent_turns` turns run at once across sessions, and when that cap is reached
+freed slots are handed out round-robin by session so a busy session cannot starve others.
+Approvals resumed in the background go through the same locks and cap.
+'''
+
+import asyncio
+import contextlib
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from .config import concurrency
+from .resumer import ApprovalResumer
+from .mcp_pool import mcp_pool_stats
+from .rate_limiter import get_scheduler
+from .runner import agent_sessions, build_runner, build_session_service
+from .session_lifecycle import session_stats
+
+
+class FairLimiter:
+    """
+    Concurrency cap whose waiters are granted slots round-robin across keys.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._queues: "OrderedDict[Any, Deque[asyncio.Future]]" = OrderedDict()
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, key: Any) -> None:
+        if self.active < self.limit and not self._queues:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled: hand it on.
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._grant()
+
+    def _grant(self) -> None:
+        while self.active < self.limit and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    def _discard(self, key: Any, future: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[key]
+
+
+class SessionManager:
+    """
+    Multiplexes sessions (user_id, session_id) over one Runner and session service.
+
+    Args:
+        agent: Root agent served by the shared Runner.
+        max_concurrent_turns: Cap on in-flight turns (defaults to config.concurrency).
+        on_resumed_event: Optional callback(record, event) for background-resumed approvals.
+        session_service: Optional session service (defaults to config.persistence).
+    """
+
+    def __init__(
+        self,
+        agent,
+        max_concurrent_turns: Optional[int] = None,
+        on_resumed_event: Optional[Callable[[Dict[str, Any], Any], None]] = None,
+        session_service=None,
+    ):
+        self.agent = agent
+        self.session_service = session_service or build_session_service()
+        self.runner = build_runner(agent, self.session_service)
+        self.resumer = ApprovalResumer(
+            self.runner,
+            on_event=on_resumed_event,
+            guard=lambda record: self.turn(record["session_id"], record["user_id"]),
+        )
+        self.limiter = FairLimiter(max_concurrent_turns or concurrency.max_concurrent_turns)
+        self.max_open_sessions = concurrency.max_open_sessions
+        self._sessions: "OrderedDict[Tuple[str, str], agent_sessions]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.stats_counters = {"turns": 0, "queued": 0}
+
+    def session(self, session_id: Optional[str] = None, user_id: str = "user") -> agent_sessions:
+        """
+        Returns the handle for a session on the shared Runner, creating it on first use.
+        """
+        session_id = session_id or f"ulma_{uuid.uuid4().hex[:8]}"
+        key = (user_id, session_id)
+        handle = self._sessions.get(key)
+        if handle is None:
+            handle = self._new_handle(session_id, user_id)
+            self._sessions[key] = handle
+            self._evict_idle(keep=key)
+        self._sessions.move_to_end(key)
+        return handle
+
+    @contextlib.asynccontextmanager
+    async def turn(self, session_id: str, user_id: str = "user"):
+        """
+        Holds the session's lock and one global turn slot for the duration of the block.
+        """
+        key = (user_id, session_id)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if self.limiter.active >= self.limiter.limit:
+                self.stats_counters["queued"] += 1
+            await self.limiter.acquire(key)
+            try:
+                self.stats_counters["turns"] += 1
+                yield
+            finally:
+                self.limiter.release()
+
+    async def execute(
+        self,
+        input_content,
+        session_id: Optional[str] = None,
+        user_id: str = "user",
+        stream: Optional[bool] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Runs one turn for a session and yields its events; turns of the same session are
+        queued behind each other, turns of other sessions run concurrently up to the cap.
+        """
+        handle = self.session(session_id, user_id)
+        async with self.turn(handle.session_id, user_id):
+            events = await handle.execute(input_content, stream=stream)
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                await events.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_sessions": len(self._sessions),
+            "active_turns": self.limiter.active,
+            "waiting_turns": self.limiter.waiting(),
+            "max_concurrent_turns": self.limiter.limit,
+            **self.stats_counters,
+            **session_stats(self.session_service),
+            "rate_limits": get_scheduler().stats(),
+            "mcp": mcp_pool_stats(),
+        }
+
+    def _new_handle(self, session_id: str, user_id: str) -> agent_sessions:
+        return agent_sessions(
+            self.agent,
+            runner=self.runner,
+            resumer=self.resumer,
+            session_id=session_id,
+            user_id=user_id,
+        )
+
+    def _evict_idle(self, keep: Tuple[str, str]) -> None:
+        """
+        Drops the least recently used handles beyond max_open_sessions unless a turn is
+        running or queued on them (their state lives in the session service). The handle
+        being opened (keep) is never dropped.
+        """
+        excess = len(self._sessions) - self.max_open_sessions
+        for key in list(self._sessions):
+            if excess <= 0:
+                break
+            lock = self._locks.get(key)
+            if key == keep or (lock is not None and lock.locked()):
+                continue
+            del self._sessions[key]
+            self._locks.pop(key, None)
+            excess -= 1
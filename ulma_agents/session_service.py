@@ -0,0 +1,476 @@
+'''
+Durable ADK session service backed by the local SQLite database.
+
+Sessions, their events and app/user/session scoped state are stored in the same DB as
+agent_memory, so history survives restarts and the runner does not have to keep every
+session in RAM. The full history is loaded by default (an optional recent-event window
+and explicit paging are available), and only a bounded LRU of recently used sessions is
+kept in memory; evicted sessions are reloaded from disk on their next turn. SQLite work
+runs on the shared worker thread so it never blocks the event loop.
+'''
+
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from .create_db import connect_db
+from .db_worker import run_db
+
+
+def ensure_session_tables(conn) -> None:
+    """
+    Ensures the adk_sessions, adk_events and adk_state tables (and their indexes) exist.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS adk_sessions (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            create_time REAL,
+            update_time REAL,
+            PRIMARY KEY (app_name, user_id, session_id)
+        )
+        '''
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_adk_sessions_update_time ON adk_sessions (update_time)")
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS adk_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            event_id TEXT,
+            invocation_id TEXT,
+            author TEXT,
+            timestamp REAL,
+            event_json TEXT NOT NULL
+        )
+        '''
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_adk_events_session ON adk_events (app_name, user_id, session_id, seq)"
+    )
+    cursor.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS adk_state (
+            scope TEXT NOT NULL,
+            scope_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value_json TEXT,
+            PRIMARY KEY (scope, scope_id, key)
+        )
+        '''
+    )
+    conn.commit()
+
+
+def _scope_ids(app_name: str, user_id: str, session_id: str) -> Dict[str, str]:
+    return {
+        "app": app_name,
+        "user": f"{app_name}/{user_id}",
+        "session": f"{app_name}/{user_id}/{session_id}",
+    }
+
+
+def _split_delta(delta: Dict[str, Any]) -> List[tuple]:
+    """
+    Splits a state dict into (scope, key, value) rows; temp: keys are never persisted.
+    """
+    rows = []
+    for key, value in (delta or {}).items():
+        if key.startswith(State.TEMP_PREFIX):
+            continue
+        if key.startswith(State.APP_PREFIX):
+            rows.append(("app", key[len(State.APP_PREFIX):], value))
+        elif key.startswith(State.USER_PREFIX):
+            rows.append(("user", key[len(State.USER_PREFIX):], value))
+        else:
+            rows.append(("session", key, value))
+    return rows
+
+
+def _copy_session(session: Session) -> Session:
+    """
+    Returns a copy whose state and event list can be mutated without touching the cache.
+    """
+    return Session(
+        id=session.id,
+        app_name=session.app_name,
+        user_id=session.user_id,
+        state=dict(session.state),
+        events=list(session.events),
+        last_update_time=session.last_update_time,
+    )
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    A SessionService that persists sessions, events and state to SQLite.
+
+    Args:
+        db_path: SQLite file to use (defaults to the ULMA database from get_db_path()).
+        event_window: How many recent events get_session loads when the caller does not
+            pass a GetSessionConfig. None loads the whole history.
+        max_cached_sessions: Upper bound on sessions kept in memory (least recently used
+            are evicted first).
+        idle_ttl: Seconds an unused session may stay cached before expire_idle() drops it.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        event_window: Optional[int] = None,
+        max_cached_sessions: int = 256,
+        idle_ttl: float = 900.0,
+    ):
+        super().__init__()
+        self.db_path = db_path
+        self.event_window = event_window
+        self.max_cached_sessions = max_cached_sessions
+        self.idle_ttl = idle_ttl
+        self._schema_ready = False
+        self._cache: "OrderedDict[Tuple[str, str, str], Tuple[Session, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "loads": 0, "evicted": 0, "expired": 0}
+
+    def _cache_put(self, session: Session) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        self._cache[key] = (session, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached_sessions:
+            self._cache.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def expire_idle(self) -> int:
+        """
+        Drops cached sessions unused for longer than idle_ttl; returns how many were dropped.
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = 0
+        # The cache is ordered by last access, so the idle ones are at the front.
+        while self._cache:
+            key, (_, last_used) = next(iter(self._cache.items()))
+            if last_used >= cutoff:
+                break
+            self._cache.pop(key)
+            expired += 1
+        self.stats["expired"] += expired
+        return expired
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"live": len(self._cache), **self.stats}
+
+    def forget(self, keys) -> None:
+        """
+        Drops the given (app_name, user_id, session_id) keys from the in-memory cache.
+        """
+        for key in keys:
+            self._cache.pop(tuple(key), None)
+
+    def _connect(self):
+        conn = connect_db(self.db_path)
+        if not self._schema_ready:
+            ensure_session_tables(conn)
+            self._schema_ready = True
+        return conn
+
+    def _write_state(self, cursor, scope_ids: Dict[str, str], delta: Dict[str, Any]) -> None:
+        rows = [
+            (scope, scope_ids[scope], key, json.dumps(value, default=str))
+            for scope, key, value in _split_delta(delta)
+        ]
+        if rows:
+            cursor.executemany(
+                """
+                INSERT INTO adk_state (scope, scope_id, key, value_json) VALUES (?, ?, ?, ?)
+                ON CONFLICT(scope, scope_id, key) DO UPDATE SET value_json=excluded.value_json
+                """,
+                rows,
+            )
+
+    def _read_state(self, cursor, scope_ids: Dict[str, str]) -> Dict[str, Any]:
+        cursor.execute(
+            """
+            SELECT scope, key, value_json FROM adk_state
+            WHERE (scope = 'app' AND scope_id = ?)
+               OR (scope = 'user' AND scope_id = ?)
+               OR (scope = 'session' AND scope_id = ?)
+            """,
+            (scope_ids["app"], scope_ids["user"], scope_ids["session"]),
+        )
+        prefixes = {"app": State.APP_PREFIX, "user": State.USER_PREFIX, "session": ""}
+        state = {}
+        for scope, key, value_json in cursor.fetchall():
+            try:
+                state[prefixes[scope] + key] = json.loads(value_json) if value_json is not None else None
+            except json.JSONDecodeError:
+                continue
+        return state
+
+    def _delete_rows(self, cursor, app_name: str, user_id: str, session_id: str) -> None:
+        cursor.execute(
+            "DELETE FROM adk_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        )
+        cursor.execute(
+            "DELETE FROM adk_state WHERE scope = 'session' AND scope_id = ?",
+            (_scope_ids(app_name, user_id, session_id)["session"],),
+        )
+        cursor.execute(
+            "DELETE FROM adk_sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        )
+
+    # Blocking SQLite bodies; the async API runs them on the shared worker thread.
+
+    def _create_sync(self, app_name, user_id, session_id, state, now) -> Dict[str, Any]:
+        scope_ids = _scope_ids(app_name, user_id, session_id)
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT 1 FROM adk_sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            )
+            if cursor.fetchone():
+                raise ValueError(f"Session {session_id} already exists.")
+            cursor.execute(
+                "INSERT INTO adk_sessions (app_name, user_id, session_id, create_time, update_time) VALUES (?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, now, now),
+            )
+            self._write_state(cursor, scope_ids, state or {})
+            conn.commit()
+            return self._read_state(cursor, scope_ids)
+        finally:
+            conn.close()
+
+    def _load_sync(self, app_name, user_id, session_id, num_recent, after):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT update_time FROM adk_sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            )
+            row = cursor.fetchone()
+            if not row:
+                return None
+            query = "SELECT event_json FROM adk_events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+            params: List[Any] = [app_name, user_id, session_id]
+            if after is not None:
+                query += " AND timestamp >= ?"
+                params.append(after)
+            query += " ORDER BY seq DESC"
+            if num_recent is not None:
+                query += " LIMIT ?"
+                params.append(num_recent)
+            cursor.execute(query, params)
+            events = [Event.model_validate_json(r[0]) for r in reversed(cursor.fetchall())]
+            state = self._read_state(cursor, _scope_ids(app_name, user_id, session_id))
+            return row[0] or 0.0, events, state
+        finally:
+            conn.close()
+
+    def _list_sync(self, app_name, user_id):
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if user_id is None:
+                cursor.execute(
+                    "SELECT user_id, session_id, update_time FROM adk_sessions WHERE app_name = ?",
+                    (app_name,),
+                )
+            else:
+                cursor.execute(
+                    "SELECT user_id, session_id, update_time FROM adk_sessions WHERE app_name = ? AND user_id = ?",
+                    (app_name, user_id),
+                )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def _delete_sync(self, app_name, user_id, session_id) -> None:
+        conn = self._connect()
+        try:
+            self._delete_rows(conn.cursor(), app_name, user_id, session_id)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _append_sync(self, app_name, user_id, session_id, event: Event) -> None:
+        delta = event.actions.state_delta if event.actions else None
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO adk_events (app_name, user_id, session_id, event_id, invocation_id, author, timestamp, event_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    app_name,
+                    user_id,
+                    session_id,
+                    event.id,
+                    event.invocation_id,
+                    event.author,
+                    event.timestamp,
+                    event.model_dump_json(exclude_none=True),
+                ),
+            )
+            if delta:
+                self._write_state(cursor, _scope_ids(app_name, user_id, session_id), delta)
+            cursor.execute(
+                "UPDATE adk_sessions SET update_time = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (event.timestamp, app_name, user_id, session_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _page_sync(self, app_name, user_id, session_id, offset, limit) -> List[Event]:
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT event_json FROM adk_events
+                WHERE app_name = ? AND user_id = ? AND session_id = ?
+                ORDER BY seq LIMIT ? OFFSET ?
+                """,
+                (app_name, user_id, session_id, limit, offset),
+            )
+            return [Event.model_validate_json(r[0]) for r in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        now = time.time()
+        merged = await run_db(self._create_sync, app_name, user_id, session_id, state, now)
+        session = Session(
+            id=session_id, app_name=app_name, user_id=user_id, state=merged, last_update_time=now
+        )
+        self._cache_put(session)
+        return _copy_session(session)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        num_recent = config.num_recent_events if config and config.num_recent_events is not None else self.event_window
+        after = config.after_timestamp if config else None
+        key = (app_name, user_id, session_id)
+        windowed = config is not None and (
+            config.num_recent_events is not None or config.after_timestamp is not None
+        )
+        if not windowed and key in self._cache:
+            self.stats["hits"] += 1
+            session = self._cache[key][0]
+            self._cache_put(session)
+            return _copy_session(session)
+        loaded = await run_db(self._load_sync, app_name, user_id, session_id, num_recent, after)
+        if loaded is None:
+            return None
+        update_time, events, state = loaded
+        self.stats["loads"] += 1
+        session = Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=state,
+            events=events,
+            last_update_time=update_time,
+        )
+        if windowed:
+            return session
+        self._cache_put(session)
+        return _copy_session(session)
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: Optional[str] = None
+    ) -> ListSessionsResponse:
+        rows = await run_db(self._list_sync, app_name, user_id)
+        sessions = [
+            Session(id=sid, app_name=app_name, user_id=uid, state={}, last_update_time=ts or 0.0)
+            for uid, sid, ts in rows
+        ]
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._cache.pop((app_name, user_id, session_id), None)
+        await run_db(self._delete_sync, app_name, user_id, session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session, event)
+        session.last_update_time = event.timestamp
+        await run_db(self._append_sync, session.app_name, session.user_id, session.id, event)
+        self._apply_to_cached(session, event)
+        return event
+
+    def _apply_to_cached(self, session: Session, event: Event) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        if key not in self._cache:
+            return
+        cached = self._cache[key][0]
+        cached.events.append(event)
+        if self.event_window is not None and len(cached.events) > self.event_window:
+            del cached.events[: len(cached.events) - self.event_window]
+        delta = event.actions.state_delta if event.actions else None
+        for name, value in (delta or {}).items():
+            if not name.startswith(State.TEMP_PREFIX):
+                cached.state[name] = value
+        cached.last_update_time = event.timestamp
+        self._cache_put(cached)
+
+    def purge_idle_sessions(self, max_idle_seconds: float) -> List[Tuple[str, str, str]]:
+        """
+        Deletes sessions (events and session-scoped state) not updated within
+        max_idle_seconds; returns their (app_name, user_id, session_id) keys.
+
+        Only touches SQLite, so it can run off the event loop; pass the result to forget().
+        """
+        cutoff = time.time() - max_idle_seconds
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            keys = cursor.execute(
+                "SELECT app_name, user_id, session_id FROM adk_sessions WHERE update_time < ?",
+                (cutoff,),
+            ).fetchall()
+            for app_name, user_id, session_id in keys:
+                self._delete_rows(cursor, app_name, user_id, session_id)
+            conn.commit()
+        finally:
+            conn.close()
+        return [tuple(k) for k in keys]
+
+    async def page_events(
+        self, *, app_name: str, user_id: str, session_id: str, offset: int = 0, limit: int = 50
+    ) -> List[Event]:
+        """
+        Returns one page of a session's events in chronological order.
+        """
+        return await run_db(self._page_sync, app_name, user_id, session_id, offset, limit)
@@ -0,0 +1,113 @@
+'''
+Startup profiling.
+
+Runs the startup phases in a fresh interpreter so nothing is already imported:
+- importing the package,
+- building the front agent (and with it the whole agent tree),
+- building the session service and runner.
+It reports wall time per phase and, from `python -X importtime`, the packages and modules
+with the largest import cost. Use it to check that a change does not pull a heavy SDK back
+onto the startup path.
+
+    python -m ulma_agents.startup_profile [--top 15] [--json]
+'''
+
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+_PHASES_SCRIPT = '''
+import json, time
+t0 = time.perf_counter()
+import ulma_agents
+t1 = time.perf_counter()
+agent = ulma_agents.front_agent
+t2 = time.perf_counter()
+from ulma_agents.runner import build_runner, build_session_service
+runner = build_runner(agent, build_session_service())
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_package": t1 - t0,
+    "build_agents": t2 - t1,
+    "build_runner": t3 - t2,
+}))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Parses `-X importtime` output into {module, self_us, cumulative_us} rows.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        rows.append({"module": parts[2].strip(), "self_us": self_us, "cumulative_us": cumulative_us})
+    return rows
+
+
+def by_package(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Self import time summed per top-level package, in microseconds.
+    """
+    totals: Dict[str, int] = {}
+    for row in rows:
+        package = row["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + row["self_us"]
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def profile_startup(top: int = 15) -> Dict[str, Any]:
+    """
+    Profiles startup in a subprocess and returns phase timings plus the top import costs.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PHASES_SCRIPT],
+        cwd=root, capture_output=True, text=True,
+    )
+    rows = parse_importtime(proc.stderr)
+    result: Dict[str, Any] = {"ok": proc.returncode == 0}
+    if proc.returncode == 0:
+        phases = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["phases_ms"] = {k: round(v * 1000, 1) for k, v in phases.items()}
+    else:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        result["error"] = "\n".join(errors[-5:])
+    result["packages_ms"] = {k: round(v / 1000, 1) for k, v in list(by_package(rows).items())[:top]}
+    slowest = sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+    result["modules_ms"] = {r["module"]: round(r["cumulative_us"] / 1000, 1) for r in slowest}
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ULMA startup profile")
+    parser.add_argument("--top", type=int, default=15, help="packages/modules to list")
+    parser.add_argument("--json", action="store_true", help="print the raw result")
+    args = parser.parse_args()
+    report = profile_startup(args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        if report["ok"]:
+            for phase, ms in report["phases_ms"].items():
+                print(f"[startup] {phase:<16} {ms:>9.1f} ms")
+        else:
+            print(f"[startup] startup failed:\n{report['error']}")
+        print("[startup] self import time by package:")
+        for package, ms in report["packages_ms"].items():
+            print(f"  {package:<40} {ms:>9.1f} ms")
+        print("[startup] slowest imports (cumulative):")
+        for module, ms in report["modules_ms"].items():
+            print(f"  {module:<40} {ms:>9.1f} ms")
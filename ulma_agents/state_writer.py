@@ -0,0 +1,158 @@
+'''
+Write-behind persistence for session state.
+
+Tools and the runner save the session state several times per request. In "batched" mode the
+saves are coalesced per session and written on a short timer, at the end of an invocation,
+before an approval pause, or at process exit. "immediate" mode keeps the old write-through
+behaviour. Timed and requested flushes run on the shared SQLite worker thread.
+'''
+
+import atexit
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from .config import persistence
+from .create_db import save_memory_state
+from .db_worker import get_db_worker
+
+
+def snapshot_state(state: Any) -> Dict[str, Any]:
+    """
+    Returns a deep, JSON-safe copy of a session state (plain dict or ADK State), so later
+    changes to the live state do not leak into a queued write. Unsupported values become
+    strings; {} if the state cannot be serialised at all.
+    """
+    if state is None:
+        return {}
+    if hasattr(state, "to_dict"):
+        state = state.to_dict()
+    try:
+        return json.loads(json.dumps(state, default=str))
+    except Exception:
+        return {}
+
+
+class StateWriter:
+    def __init__(self, mode: str = "batched", flush_interval: float = 0.5):
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # States popped by a flush but not yet committed; still visible to readers.
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.stats = {"submitted": 0, "coalesced": 0, "written": 0}
+
+    def submit(self, session_id: str, state: Any, flush: bool = False) -> None:
+        """
+        Queues the latest state for a session; older queued states for it are replaced.
+        With flush=True the session is written on the worker thread and the call returns
+        once it is on disk (async callers should use asubmit to keep the loop free).
+        """
+        snapshot = snapshot_state(state)
+        if self.mode == "immediate":
+            self.stats["submitted"] += 1
+            get_db_worker().submit(self._write, session_id, snapshot).result()
+            return
+        with self._lock:
+            self.stats["submitted"] += 1
+            if session_id in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[session_id] = snapshot
+            if not flush:
+                self._schedule_locked()
+        if flush:
+            get_db_worker().submit(self.flush, session_id).result()
+
+    async def asubmit(self, session_id: str, state: Any, flush: bool = False) -> None:
+        """
+        Async submit; immediate writes and requested flushes are awaited on the worker thread.
+        """
+        if self.mode == "immediate":
+            self.stats["submitted"] += 1
+            await get_db_worker().run(self._write, session_id, snapshot_state(state))
+            return
+        self.submit(session_id, state)
+        if flush:
+            await self.aflush(session_id)
+
+    def pending_state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the queued (not yet written) state for a session, if any.
+        """
+        with self._lock:
+            state = self._pending.get(session_id)
+            if state is None:
+                state = self._inflight.get(session_id)
+            return snapshot_state(state) if state is not None else None
+
+    def flush(self, session_id: Optional[str] = None) -> None:
+        """
+        Writes queued states to SQLite (a single session, or all sessions when omitted).
+        """
+        with self._flush_lock:
+            with self._lock:
+                if session_id is None:
+                    batch = self._pending
+                    self._pending = {}
+                else:
+                    state = self._pending.pop(session_id, None)
+                    batch = {session_id: state} if state is not None else {}
+                self._inflight.update(batch)
+            try:
+                for sid, state in batch.items():
+                    self._write(sid, state)
+            finally:
+                with self._lock:
+                    for sid in batch:
+                        self._inflight.pop(sid, None)
+
+    async def aflush(self, session_id: Optional[str] = None) -> None:
+        """
+        Awaitable flush that runs on the SQLite worker thread.
+        """
+        await get_db_worker().run(self.flush, session_id)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+
+    def _schedule_locked(self) -> None:
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_interval, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        get_db_worker().submit(self.flush)
+
+    def _write(self, session_id: str, state: Dict[str, Any]) -> None:
+        try:
+            save_memory_state(session_id, state)
+            self.stats["written"] += 1
+        except Exception as exc:
+            print(f"[memory] failed to persist session state for {session_id}: {exc}")
+
+
+_writer: Optional[StateWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_state_writer() -> StateWriter:
+    """
+    Returns the process-wide state writer, created from `config.persistence` on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = StateWriter(mode=persistence.mode, flush_interval=persistence.flush_interval)
+            atexit.register(_writer.close)
+        return _writer
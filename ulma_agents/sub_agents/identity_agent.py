@@ -3,21 +3,26 @@ from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
 from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
 from google.adk.tools.mcp_tool.mcp_session_manager import SseConnectionParams
-from ..config import config
+from ..config import config, mcp_pool, model_with_retry
+from ..mcp_pool import get_mcp_toolset
 from ..tools import save_step_status, queue_high_risk_approval, check_approval_status
 
 # Connect to the Azure MCP server (SSE transport). Override with AZURE_MCP_SSE_URL if needed.
 AZURE_MCP_SSE_URL = os.getenv("AZURE_MCP_SSE_URL", "http://localhost:8001/sse")
-azure_mcp_toolset = McpToolset(
-    connection_params=SseConnectionParams(
-        url=AZURE_MCP_SSE_URL,
-    ),
-    tool_name_prefix="azure",  # keep names obvious in traces
-)
+if mcp_pool.enabled:
+    # Shared by every session, the workflow and preflight (see mcp_pool).
+    azure_mcp_toolset = get_mcp_toolset(AZURE_MCP_SSE_URL, tool_name_prefix="azure")
+else:
+    azure_mcp_toolset = McpToolset(
+        connection_params=SseConnectionParams(
+            url=AZURE_MCP_SSE_URL,
+        ),
+        tool_name_prefix="azure",  # keep names obvious in traces
+    )
 
 identity_agent = Agent(
     name="identity_agent",
-    model=config.identity_agent,
+    model=model_with_retry(config.identity_agent),
     description="Identity agent for Entra ID operations via Azure MCP.",
     instruction="""
     You are the identity agent. Use the Azure MCP tools to read or change Entra ID.
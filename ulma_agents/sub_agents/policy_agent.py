@@ -5,14 +5,13 @@ This agent is the user-facing agent. Takes requests (e.g., email/ticket), parses
 import datetime
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from ..config import config
+from ..config import config, model_with_retry
 # from ..front import front_agent
 from ..tools import read_doc, save_step_status
-import vertexai
 
 policy_agent=Agent(
     name = 'policy_agent',
-    model=config.policy_agent,
+    model=model_with_retry(config.policy_agent),
     description='The policy agent. Takes the goal, poilcy document name, reads and outputs its content as constraints',
     instruction=f'''
     You read policy documents, understands its content in relation to the required goal and provides a set of policy constraints related to the goal.
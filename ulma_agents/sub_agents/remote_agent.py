@@ -1,11 +1,11 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from ..config import config
+from ..config import config, model_with_retry
 from ..tools import save_step_status
 
 remote_agent = Agent(
     name="remote_branch_agent",
-    model=config.remote_agent,
+    model=model_with_retry(config.remote_agent),
     description="Agent representing an external branch (Branch B). Handles delegated requests.",
     instruction="""
     You are the AI Agent for 'Branch B' (Remote Branch). 
@@ -1,6 +1,6 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from ..config import config
+from ..config import config, model_with_retry
 from ..tools import (
     save_step_status,
     send_manager_message,
@@ -10,7 +10,7 @@ from ..tools import (
 
 teams_agent = Agent(
     name="teams_agent",
-    model=config.teams_agent,
+    model=model_with_retry(config.teams_agent),
     description="Agent for all Microsoft Teams interactions: logs, approvals, and reports.",
     instruction="""
     You are the Teams Agent. You handle all communication via Microsoft Teams.
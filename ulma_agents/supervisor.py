@@ -5,7 +5,7 @@ This agent is the user-facing agent. Takes requests (e.g., email/ticket), parses
 import datetime
 from google.adk.agents import Agent, LoopAgent
 from google.adk.tools import FunctionTool
-from .config import config
+from .config import config, model_with_retry
 from .sub_agents.policy_agent import policy_agent
 from .sub_agents.identity_agent import identity_agent
 from .sub_agents.teams_agent import teams_agent
@@ -19,19 +19,25 @@ from .tools import (
     check_approval_status,
     lookup_user_location,
 )
+from .directory import search_directory
+from .preflight import preflight_check
 
 agent = Agent(
     name='supervisor_agent',
-    model=config.supervisor_agent,
+    model=model_with_retry(config.supervisor_agent),
     description='The supervisor agent. Takes the output from the front agent and utilize the other subagents and tools to fulfill the user request',
     instruction=f'''
     You are the supervisor/coordinator agent.
 
     **Core Workflow:**
     1. **Validate & Categorize:** Ensure input has 'goal' (Onboard/Offboard/Access/etc.), 'user_name', and 'policy_doc'. Check 'db_tool'.
+       - Call `preflight_check(user_name=<user_name>, goal=<goal>, policy_doc=<policy_doc>)` ONCE (add `upn=<upn>` if the request contains one). It returns `directory`, `location`, `policy`, `graph` and `approval` together; use these results instead of calling `search_directory`, `lookup_user_location` or `get_approval_status` separately.
+       - `directory`: use the exact match if there is one; if only partial matches come back, list them and ask which user is meant.
+       - `policy`: lines pre-selected by keyword. They are NOT a policy review: still call 'policy_agent' for the constraints (it can start from these lines).
+       - If any other check returned an `error`, fall back to its individual tool.
     
     2. **Check Scope (A2A Routing):**
-       - Call `lookup_user_location(user_name)` to check if the user belongs to a remote branch.
+       - Use `location` from the pre-flight result to check if the user belongs to a remote branch.
        - **If location == "Branch B"**:
          - **STOP local execution.**
          - Delegate the task immediately to `branch_b_agent`.
@@ -53,7 +59,7 @@ agent = Agent(
          3. If "rejected", file not found, or no decision: Stop and inform user the request was denied or is still pending.
 
     4. **Standard Execution (Onboard/Access):**
-       - 'policy_agent': Check constraints.
+       - Constraints: from 'policy_agent' (called in step 1).
        - 'identity_agent': Execute changes.
        - 'teams_agent' (Log Mode): Log technical details.
 
@@ -78,6 +84,8 @@ agent = Agent(
         FunctionTool(queue_high_risk_approval),
         FunctionTool(check_approval_status),
         FunctionTool(lookup_user_location),
+        FunctionTool(search_directory),
+        FunctionTool(preflight_check),
     ],
     output_key='supervisor_updates'
 )
@@ -5,11 +5,7 @@ import datetime
 import sqlite3
 import json
 from typing import List, Dict, Any, Optional
-from pypdf import PdfReader
-from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
 from google.adk.tools.tool_context import ToolContext
-from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
-from mcp import StdioServerParameters
 from dotenv import load_dotenv
 from .create_db import (
     get_db_path,
@@ -17,24 +13,18 @@ from .create_db import (
     load_memory_state,
     ensure_memory_table,
 )
+from .config import LOG_DIR
+from .state_writer import get_state_writer
+from .approval_queue import ensure_teams_dirs, ingest_reply, record_approval_request
+from .db_worker import run_db
 
 ### Paths/helpers for simulated Teams messaging ###
-def _ensure_teams_dirs() -> Dict[str, str]:
-    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-    base = os.path.join(root_dir, "logs", "teams")
-    incoming = os.path.join(base, "incoming")
-    outgoing = os.path.join(base, "outgoing")
-    incoming_approvals = os.path.join(incoming, "approvals")
-    incoming_summaries = os.path.join(incoming, "summaries")
-    for path in (base, incoming, outgoing, incoming_approvals, incoming_summaries):
-        os.makedirs(path, exist_ok=True)
-    return {
-        "base": base,
-        "incoming": incoming,
-        "incoming_approvals": incoming_approvals,
-        "incoming_summaries": incoming_summaries,
-        "outgoing": outgoing,
-    }
+def _session_id(tool_context) -> Optional[str]:
+    """Session id of a tool call (ADK exposes the session on the context, not its id)."""
+    session = getattr(tool_context, "session", None)
+    if session is None:
+        session = getattr(getattr(tool_context, "_invocation_context", None), "session", None)
+    return getattr(session, "id", None)
 
 
 def _slugify_name(name: str) -> str:
@@ -53,8 +43,7 @@ def save_flow_log(flow_updates:str,filename:str) -> Dict:
         flow_updates:each update in the flow.
         filename:the filename (with extension) to be written.
     '''
-    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-    path=os.path.join(root_dir,'logs')
+    path=LOG_DIR
     os.makedirs(path, exist_ok=True)
     full_path=os.path.join(path,filename)
     if not os.path.exists(full_path):
@@ -78,6 +67,8 @@ def read_doc(filename:str) -> Dict:
     pdf_path=os.path.join(policy_dir,base_name+'.pdf')
     if not os.path.exists(pdf_path):
         return {'text':''}
+    from pypdf import PdfReader
+
     reader = PdfReader(pdf_path)
     text_parts=[]
     for page in reader.pages:
@@ -86,39 +77,63 @@ def read_doc(filename:str) -> Dict:
     
 ###Session Context Tools###
 
-def _json_safe_state(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Converts state into a JSON-safe dict (fallback to str on unsupported types).
-    """
-    try:
-        return json.loads(json.dumps(state, default=str))
-    except Exception:
-        return {}
-
-
 def load_session_memory(session_id: str) -> Dict[str, Any]:
     """
-    Loads persisted session memory (if any).
+    Loads persisted session memory (if any), including saves not yet flushed.
     """
+    pending = get_state_writer().pending_state(session_id)
+    if pending is not None:
+        return pending
     ensure_memory_table()
     return load_memory_state(session_id)
 
 
-def save_session_memory(session_id: str, state: Dict[str, Any]) -> None:
+def save_session_memory(session_id: str, state: Dict[str, Any], flush: bool = False) -> None:
     """
     Persists the given session state to durable storage.
+
+    In batched mode the write is coalesced with other saves for the same session;
+    pass flush=True when the state must be on disk before returning.
     """
-    ensure_memory_table()
-    safe_state = _json_safe_state(state)
-    save_memory_state(session_id, safe_state)
+    get_state_writer().submit(session_id, state, flush=flush)
+
+
+def flush_session_memory(session_id: Optional[str] = None) -> None:
+    """
+    Forces queued session state saves to disk (one session, or all when omitted).
+    """
+    get_state_writer().flush(session_id)
+
+
+async def aload_session_memory(session_id: str) -> Dict[str, Any]:
+    """
+    Async load_session_memory; the SQLite read runs on the worker thread.
+    """
+    pending = get_state_writer().pending_state(session_id)
+    if pending is not None:
+        return pending
+    return await run_db(load_memory_state, session_id)
+
+
+async def asave_session_memory(session_id: str, state: Dict[str, Any], flush: bool = False) -> None:
+    """
+    Async save_session_memory; with flush=True it waits until the state is on disk.
+    """
+    await get_state_writer().asubmit(session_id, state, flush=flush)
+
+
+async def aflush_session_memory(session_id: Optional[str] = None) -> None:
+    """
+    Async flush_session_memory.
+    """
+    await get_state_writer().aflush(session_id)
 
 
 def _write_approval_log(session_id: str, approved: bool, plan_summary: str, note: str = "") -> str:
     """
     Writes an approval event to a log file.
     """
-    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-    out_dir = os.path.join(root_dir, "logs", "approvals")
+    out_dir = os.path.join(LOG_DIR, "approvals")
     os.makedirs(out_dir, exist_ok=True)
     stamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     filename = f"{session_id}_approvals.txt"
@@ -144,7 +159,7 @@ def set_approval_status(
     if note:
         state["APPROVAL_NOTE"] = note[:1000]
 
-    session_id = getattr(tool_context, "session_id", None)
+    session_id = _session_id(tool_context)
     logfile = None
     if session_id:
         try:
@@ -187,7 +202,7 @@ def send_teams_message(kind: str, message: str, filename: Optional[str] = None)
         message: Text to write.
         filename: Optional base filename (without path). Defaults to timestamped name.
     """
-    paths = _ensure_teams_dirs()
+    paths = ensure_teams_dirs()
     now = datetime.datetime.utcnow()
     stamp = now.strftime("%Y%m%d_%H%M%S")
     if filename:
@@ -219,7 +234,7 @@ def send_teams_message(kind: str, message: str, filename: Optional[str] = None)
     }
 
 
-def read_teams_reply(filename: str) -> Dict[str, Any]:
+async def read_teams_reply(filename: str) -> Dict[str, Any]:
     """
     Checks for a reply file in the outgoing folder and reports completion if it contains
     an approval decision plus the sentinel line 'over'.
@@ -227,47 +242,9 @@ def read_teams_reply(filename: str) -> Dict[str, Any]:
     Args:
         filename: The base filename to look for (e.g., from send_teams_message).
     """
-    paths = _ensure_teams_dirs()
-    base_name = os.path.splitext(filename)[0] + ".txt"
-    outgoing_path = os.path.join(paths["outgoing"], base_name)
-
-    if not os.path.exists(outgoing_path):
-        return {
-            "status": "pending",
-            "filename": base_name,
-            "outgoing_file": outgoing_path,
-            "message": "",
-            "done": False,
-            "reason": "no reply yet",
-        }
-
-    with open(outgoing_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    lines = [ln.strip() for ln in content.splitlines() if ln.strip()]
-    lowered = "\n".join(lines).lower()
-    has_over = any(ln.lower() == "over" for ln in lines)
-    has_not_approved = "not approved" in lowered or "rejected" in lowered
-    has_approved = "approved" in lowered and not has_not_approved
-
-    decision = "pending"
-    done = False
-    reason = ""
-    if has_over and (has_approved or has_not_approved):
-        done = True
-        decision = "approved" if has_approved else "rejected"
-    else:
-        reason = "no clear approval decision or missing 'over' marker"
-
-    return {
-        "status": decision,
-        "filename": base_name,
-        "outgoing_file": outgoing_path,
-        "message": content,
-        "done": done,
-        "decision": decision,
-        "reason": reason,
-    }
+    ensure_teams_dirs()
+    # Decided approvals are answered from the approvals table; a reply file is parsed once.
+    return await run_db(ingest_reply, filename)
 
 
 def save_step_status(
@@ -294,7 +271,7 @@ def save_step_status(
     elif step == "approval_request":
         state["WAITING_FOR_APPROVAL"] = True
     # Persist updated state for durability across sessions
-    session_id = getattr(tool_context, "session_id", None)
+    session_id = _session_id(tool_context)
     if session_id:
         try:
             save_session_memory(session_id, state)
@@ -323,29 +300,57 @@ def send_manager_message(message: str) -> Dict[str, Any]:
     }
 
 
-def queue_high_risk_approval(
-    tool_context: ToolContext, user_name: str, action: str = "deletion"
+async def write_approval_request(
+    user_name: str, action: str = "deletion", session_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
-    Creates an approval request file in the approvals folder and records the filename in session state.
-
-    Args:
-        user_name: Name of the user being acted on (used for filename clarity).
-        action: Description of the high-risk action (default: deletion).
+    Writes a high-risk approval request to the Teams approvals folder and queues it in the
+    approvals table on the SQLite worker thread (no session state).
     """
     stamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    slug = _slugify_name(user_name)
-    base_name = f"approvals_{slug}_{stamp}.txt"
+    base_name = f"approvals_{_slugify_name(user_name)}_{stamp}.txt"
     message = (
         f"High-risk {action} requested for '{user_name}'. "
         "Reply in the outgoing folder with 'Approved' or 'Not Approved' and add a line with 'over'."
     )
     result = send_teams_message(kind="approvals", message=message, filename=base_name)
+    try:
+        await run_db(record_approval_request, result["filename"], user_name, action, session_id)
+    except Exception as exc:
+        print(f"[approval] failed to queue approval {result['filename']}: {exc}")
+    return result
 
-    # Ask ADK to pause the run until the human decision arrives (emits adk_request_confirmation event)
+
+async def queue_high_risk_approval(
+    tool_context: ToolContext, user_name: str, action: str = "deletion"
+) -> Dict[str, Any]:
+    """
+    Creates an approval request file in the approvals folder and records the filename in session state.
+
+    Args:
+        user_name: Name of the user being acted on (used for filename clarity).
+        action: Description of the high-risk action (default: deletion).
+    """
+    confirmation = getattr(tool_context, "tool_confirmation", None)
+    if confirmation is not None:
+        # Resumed invocation: the human decision is already attached, don't ask again.
+        state = tool_context.state
+        state["WAITING_FOR_APPROVAL"] = False
+        state["APPROVAL_STATUS"] = "APPROVED" if confirmation.confirmed else "REJECTED"
+        return {
+            "status": "approved" if confirmation.confirmed else "rejected",
+            "filename": state.get("APPROVAL_FILENAME"),
+        }
+
+    result = await write_approval_request(user_name, action, _session_id(tool_context))
+    base_name = result["filename"]
+
+    # Ask ADK to pause the run until the human decision arrives (emits adk_request_confirmation event);
+    # the payload tells the runner which reply file to wait for.
     try:
         tool_context.request_confirmation(
-            f"Waiting for approval reply in logs/teams/outgoing/{base_name} for {action} of '{user_name}'."
+            hint=f"Waiting for approval reply in logs/teams/outgoing/{base_name} for {action} of '{user_name}'.",
+            payload={"filename": base_name, "user_name": user_name, "action": action},
         )
     except Exception as exc:
         # Best-effort: even if confirmation cannot be requested, keep the file-based flow.
@@ -355,10 +360,11 @@ def queue_high_risk_approval(
     state["WAITING_FOR_APPROVAL"] = True
     state["APPROVAL_FILENAME"] = result["filename"]
 
-    session_id = getattr(tool_context, "session_id", None)
+    session_id = _session_id(tool_context)
     if session_id:
         try:
-            save_session_memory(session_id, state)
+            # Queued only: the runner awaits a flush before the paused run waits on the reply.
+            await asave_session_memory(session_id, state)
         except Exception as exc:
             print(f"[memory] failed to persist approval filename: {exc}")
 
@@ -371,7 +377,7 @@ def queue_high_risk_approval(
     }
 
 
-def check_approval_status(
+async def check_approval_status(
     tool_context: ToolContext, filename: Optional[str] = None
 ) -> Dict[str, Any]:
     """
@@ -387,7 +393,7 @@ def check_approval_status(
             "reason": "no approval filename found in state",
         }
 
-    reply = read_teams_reply(target_file)
+    reply = await read_teams_reply(target_file)
     decision = reply.get("decision", "pending")
     done = reply.get("done", False)
     reason = reply.get("reason", "")
@@ -399,7 +405,7 @@ def check_approval_status(
     else:
         state["WAITING_FOR_APPROVAL"] = True
 
-    session_id = getattr(tool_context, "session_id", None)
+    session_id = _session_id(tool_context)
     if session_id:
         try:
             save_session_memory(session_id, state)
@@ -0,0 +1,459 @@
+'''
+Per-invocation tracing for the Runner.
+
+TracingPlugin records a span for every invocation, agent (so transfers show up as nested
+agent spans), model call (with token counts) and tool call (FunctionTool or MCP), and the
+DB worker adds a span for every SQLite call made on behalf of an invocation (the current
+span travels with contextvars). Each finished invocation is appended to a local file as
+one OTLP/JSON ExportTraceServiceRequest per line, which OpenTelemetry collectors and
+viewers can ingest.
+
+    python -m ulma_agents.tracing summary [--trace TRACE_ID | --invocation ID]
+
+prints where the time of an invocation went and its critical path.
+'''
+
+import atexit
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from .config import tracing
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("ulma_current_span", default=None)
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_otlp(self) -> Dict[str, Any]:
+        attributes = {"ulma.kind": self.kind, **self.attributes}
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in attributes.items() if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def trace_id_for(invocation_id: str) -> str:
+    """
+    Stable 128-bit trace id for an invocation, so a resumed invocation joins its trace.
+    """
+    return hashlib.blake2b(str(invocation_id).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Tracer:
+    """
+    Collects the spans of open invocations and appends finished ones to an OTLP/JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open: Dict[str, List[Span]] = {}
+        # Spans that end after their invocation was exported (e.g. the end-of-turn flush).
+        self._late: List[Span] = []
+
+    def start(
+        self, name: str, kind: str, trace_id: str, parent: Optional[Span] = None, **attributes: Any
+    ) -> Span:
+        span = Span(
+            trace_id=trace_id,
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            name=name,
+            kind=kind,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        with self._lock:
+            self._open.setdefault(trace_id, [])
+        return span
+
+    def end(self, span: Span, error: Optional[str] = None, **attributes: Any) -> None:
+        span.end_ns = time.time_ns()
+        span.attributes.update(attributes)
+        if error:
+            span.error = error
+        with self._lock:
+            spans = self._open.get(span.trace_id)
+            if spans is not None:
+                spans.append(span)
+            else:
+                self._late.append(span)
+
+    def finish(self, trace_id: str) -> None:
+        """
+        Exports the spans of a finished invocation (plus any late spans).
+        """
+        with self._lock:
+            spans = self._open.pop(trace_id, []) + self._late
+            self._late = []
+        self._export(spans)
+
+    def close(self) -> None:
+        with self._lock:
+            spans = [span for spans in self._open.values() for span in spans] + self._late
+            self._open = {}
+            self._late = []
+        self._export(spans)
+
+    def _export(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", "ulma-agents")]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "ulma_agents.tracing"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(request, default=str) + "\n")
+        except OSError as exc:
+            print(f"[tracing] failed to export spans: {exc}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the process-wide tracer writing to `config.tracing.path`.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(tracing.path)
+            atexit.register(_tracer.close)
+        return _tracer
+
+
+@contextlib.contextmanager
+def db_span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Records a "db" span under the current span; a no-op outside a traced invocation.
+    """
+    parent = _current.get()
+    if parent is None or _tracer is None:
+        yield None
+        return
+    span = _tracer.start(name, "db", parent.trace_id, parent, **attributes)
+    try:
+        yield span
+    except BaseException as exc:
+        _tracer.end(span, error=repr(exc))
+        raise
+    _tracer.end(span)
+
+
+class TracingPlugin(BasePlugin):
+    """
+    Runner plugin emitting invocation, agent, model and tool spans.
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None, name: str = "ulma_tracing"):
+        super().__init__(name=name)
+        self.tracer = tracer or get_tracer()
+        self._roots: Dict[str, Span] = {}
+        self._agents: Dict[Tuple[str, str], Tuple[Span, Optional[Span]]] = {}
+        self._models: Dict[Tuple[str, str], Span] = {}
+        self._tools: Dict[str, Tuple[Span, Optional[Span]]] = {}
+
+    def _agent_parent(self, invocation_id: str, agent_name: Optional[str]) -> Optional[Span]:
+        entry = self._agents.get((invocation_id, agent_name))
+        return entry[0] if entry else self._roots.get(invocation_id)
+
+    async def before_run_callback(self, *, invocation_context):
+        invocation_id = invocation_context.invocation_id
+        root = self.tracer.start(
+            "invocation",
+            "run",
+            trace_id_for(invocation_id),
+            **{
+                "ulma.invocation_id": invocation_id,
+                "ulma.session_id": invocation_context.session.id,
+                "ulma.user_id": invocation_context.user_id,
+                "ulma.app_name": invocation_context.app_name,
+            },
+        )
+        self._roots[invocation_id] = root
+        _current.set(root)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        invocation_id = invocation_context.invocation_id
+        root = self._roots.pop(invocation_id, None)
+        # Agents that handed over (transfer) get no after_agent callback; they end with the run.
+        for key in [k for k in self._agents if k[0] == invocation_id]:
+            self.tracer.end(self._agents.pop(key)[0])
+        if root is not None:
+            self.tracer.end(root)
+            self.tracer.finish(root.trace_id)
+        # Work after this point (e.g. the next turn's session lookup) is not this invocation's.
+        _current.set(None)
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        invocation_id = callback_context.invocation_id
+        # A transfer nests the target agent's span under its (still running) parent agent.
+        # ADK runs agent callbacks outside the caller's context, so look the span up by name.
+        parent_agent = getattr(agent, "parent_agent", None)
+        entry = self._agents.get((invocation_id, parent_agent.name)) if parent_agent is not None else None
+        parent = entry[0] if entry else (_current.get() or self._roots.get(invocation_id))
+        if parent is None:
+            return None
+        span = self.tracer.start(f"agent {agent.name}", "agent", parent.trace_id, parent, **{"ulma.agent": agent.name})
+        self._agents[(invocation_id, agent.name)] = (span, parent)
+        _current.set(span)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        entry = self._agents.pop((callback_context.invocation_id, agent.name), None)
+        if entry is not None:
+            span, previous = entry
+            self.tracer.end(span)
+            _current.set(previous)
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        parent = self._agent_parent(callback_context.invocation_id, callback_context.agent_name)
+        if parent is None:
+            return None
+        model = getattr(llm_request, "model", None)
+        span = self.tracer.start(
+            f"model {model}", "model", parent.trace_id, parent,
+            **{"gen_ai.request.model": model, "ulma.agent": callback_context.agent_name},
+        )
+        self._models[(callback_context.invocation_id, callback_context.agent_name)] = span
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        span = self._models.get(key)
+        if span is None:
+            return None
+        if getattr(llm_response, "partial", False):
+            # Streamed chunk: remember time to first token, close on the final response.
+            span.attributes.setdefault("gen_ai.first_token_ms", round((time.time_ns() - span.start_ns) / 1e6, 1))
+            return None
+        self._models.pop(key, None)
+        usage = getattr(llm_response, "usage_metadata", None)
+        self.tracer.end(
+            span,
+            error=getattr(llm_response, "error_message", None),
+            **{
+                "gen_ai.usage.input_tokens": getattr(usage, "prompt_token_count", None),
+                "gen_ai.usage.output_tokens": getattr(usage, "candidates_token_count", None),
+                "gen_ai.usage.total_tokens": getattr(usage, "total_token_count", None),
+            },
+        )
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        span = self._models.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if span is not None:
+            self.tracer.end(span, error=repr(error))
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        parent = self._agent_parent(tool_context.invocation_id, tool_context.agent_name)
+        if parent is None:
+            return None
+        tool_type = type(tool).__name__
+        span = self.tracer.start(
+            f"tool {tool.name}", "tool", parent.trace_id, parent,
+            **{"ulma.tool": tool.name, "ulma.tool_type": tool_type, "ulma.mcp": "Mcp" in tool_type},
+        )
+        self._tools[tool_context.function_call_id] = (span, _current.get())
+        _current.set(span)
+        return None
+
+    def _end_tool(self, tool_context, error: Optional[str] = None) -> None:
+        entry = self._tools.pop(tool_context.function_call_id, None)
+        if entry is None:
+            return
+        span, previous = entry
+        self.tracer.end(span, error=error)
+        _current.set(previous)
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        error = result.get("error") if isinstance(result, dict) else None
+        self._end_tool(tool_context, error=str(error) if error else None)
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self._end_tool(tool_context, error=repr(error))
+        return None
+
+
+def _read_spans(path: str) -> List[Dict[str, Any]]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for resource in request.get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for raw in scope.get("spans", []):
+                        attributes = {
+                            a["key"]: next(iter(a["value"].values())) for a in raw.get("attributes", [])
+                        }
+                        spans.append(
+                            {
+                                "trace_id": raw["traceId"],
+                                "span_id": raw["spanId"],
+                                "parent_id": raw.get("parentSpanId"),
+                                "name": raw["name"],
+                                "kind": attributes.get("ulma.kind", ""),
+                                "start": int(raw["startTimeUnixNano"]),
+                                "end": int(raw["endTimeUnixNano"]),
+                                "attributes": attributes,
+                                "error": raw.get("status", {}).get("message"),
+                            }
+                        )
+    return spans
+
+
+def _critical_path(span, children, depth: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Walks back from the span's end through the children that finished last before the
+    cursor: the chain of work that determined when the span completed.
+    """
+    path = [(depth, span)]
+    chain = []
+    cursor = span["end"]
+    remaining = sorted(children.get(span["span_id"], []), key=lambda s: s["end"])
+    while remaining:
+        candidates = [s for s in remaining if s["end"] <= cursor]
+        if not candidates:
+            break
+        last = candidates[-1]
+        chain.append(last)
+        cursor = last["start"]
+        remaining = [s for s in remaining if s["end"] <= cursor]
+    for child in reversed(chain):
+        path.extend(_critical_path(child, children, depth + 1))
+    return path
+
+
+def summarize_trace(path: str, trace_id: Optional[str] = None, invocation_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns time per span kind and the critical path of one trace (default: the latest).
+    """
+    spans = _read_spans(path)
+    if invocation_id:
+        trace_id = trace_id_for(invocation_id)
+    if trace_id is None and spans:
+        trace_id = max(spans, key=lambda s: s["end"])["trace_id"]
+    spans = [s for s in spans if s["trace_id"] == trace_id]
+    if not spans:
+        return {"trace_id": trace_id, "spans": 0}
+
+    by_id = {s["span_id"]: s for s in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span["parent_id"] in by_id:
+            children[span["parent_id"]].append(span)
+        else:
+            roots.append(span)
+
+    totals: Dict[str, float] = defaultdict(float)
+    tokens = defaultdict(int)
+    for span in spans:
+        kind = span["kind"]
+        if kind == "tool":
+            kind = "tool:mcp" if span["attributes"].get("ulma.mcp") in (True, "true") else "tool:function"
+        totals[kind] += (span["end"] - span["start"]) / 1e6
+        for key in ("gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens"):
+            if key in span["attributes"]:
+                tokens[key] += int(span["attributes"][key])
+
+    critical = []
+    for root in sorted(roots, key=lambda s: s["start"]):
+        critical.extend(_critical_path(root, children))
+    return {
+        "trace_id": trace_id,
+        "spans": len(spans),
+        "wall_ms": round((max(s["end"] for s in spans) - min(s["start"] for s in spans)) / 1e6, 1),
+        "time_by_kind_ms": {k: round(v, 1) for k, v in sorted(totals.items())},
+        "tokens": dict(tokens),
+        "errors": [s["name"] for s in spans if s["error"]],
+        "critical_path": [
+            {"depth": depth, "name": s["name"], "ms": round((s["end"] - s["start"]) / 1e6, 1)}
+            for depth, s in critical
+        ],
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ULMA trace tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary", help="time breakdown and critical path of an invocation")
+    summary.add_argument("--file", default=tracing.path)
+    summary.add_argument("--trace")
+    summary.add_argument("--invocation")
+    args = parser.parse_args()
+    result = summarize_trace(args.file, args.trace, args.invocation)
+    if not result["spans"]:
+        print(f"no spans found for trace {result['trace_id']}")
+    else:
+        print(f"trace {result['trace_id']}: {result['spans']} spans, {result['wall_ms']} ms wall")
+        for kind, ms in result["time_by_kind_ms"].items():
+            print(f"  {kind:<14} {ms:>10.1f} ms")
+        if result["tokens"]:
+            print(f"  tokens: {result['tokens']}")
+        if result["errors"]:
+            print(f"  errors: {', '.join(result['errors'])}")
+        print("critical path:")
+        for step in result["critical_path"]:
+            print(f"  {'  ' * step['depth']}{step['name']}  {step['ms']} ms")
@@ -0,0 +1,398 @@
+'''
+Deterministic lifecycle workflow.
+
+Standard requests (onboard, offboard or app-access grant for one user) do not need the
+supervisor to plan every step. The front agent parses the request and calls
+`start_workflow`, which hands it to LifecycleWorkflowAgent. That agent walks a fixed state
+machine in code:
+
+    onboard / access:  preflight -> identity -> teams_log -> summary
+    offboard:          preflight -> approval -> identity -> teams_log -> summary
+
+Progress is kept in session state (WORKFLOW_STEP plus the usual STATE_* flags). The
+approval step pauses the invocation with a confirmation request, like the supervisor's
+queue_high_risk_approval, so the runner records it in paused_invocations and it resumes at
+the approval step when the reply (or a bulk reply) arrives, or when the user says "check
+again". The only model call is the closing summary.
+
+Offboarding and access grants act only on an account Entra ID confirms: the UPN comes
+from the request or the directory record and must be returned by Graph, otherwise the
+request goes to the supervisor. A UPN is derived from the user name only for onboarding.
+Anything outside the standard paths is handed to the supervisor as well: remote-branch
+users, ambiguous directory matches, unknown goals and every revoke/remove request short of
+offboarding (app access, licenses, group memberships).
+'''
+
+import json
+import re
+import secrets
+import string
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from .config import config, model_with_retry, workflow
+from .preflight import graph_account, identity_mcp_tools, lookup_graph_user, preflight_check
+from .tools import (
+    _session_id, _slugify_name, read_teams_reply, save_flow_log, send_manager_message, write_approval_request,
+)
+
+WORKFLOW_AGENT_NAME = "lifecycle_workflow"
+FALLBACK_AGENT_NAME = "supervisor_agent"
+
+WORKFLOW_STEPS = {
+    "onboard": ("preflight", "identity", "teams_log", "summary"),
+    "access": ("preflight", "identity", "teams_log", "summary"),
+    "offboard": ("preflight", "approval", "identity", "teams_log", "summary"),
+}
+_STEP_FLAGS = ("STATE_POLICY_OK", "STATE_IDENTITY_OK", "STATE_TEAMS_OK", "STATE_REPORTING_OK")
+
+
+_LEAVER_GOAL = re.compile(r"\b(offboard\w*|leaver|leavers|terminat\w*|deprovision\w*)\b")
+_REMOVAL_GOAL = re.compile(
+    r"\b(revoke\w*|remov\w*|disabl\w*|withdraw\w*|delet\w*|deactivat\w*|suspend\w*|unassign\w*|offload\w*)\b"
+)
+_JOINER_GOAL = re.compile(
+    r"\b(onboard\w*|joiner|joiners|new (hire|starter|joiner|employee)s?|create (a |an |the )?(new )?(user|account))\b"
+)
+_GRANT_GOAL = re.compile(r"\b(grant\w*|give|add|provide|request)\b.*\baccess\b|\b(app|application)s? access\b")
+_OTHER_OBJECT = re.compile(r"\b(groups?|licen[cs]es?|roles?|password)\b")
+
+
+def normalize_goal(goal: Optional[str]) -> Optional[str]:
+    """
+    Maps a free-text goal to a workflow kind, or None when it is not a standard path.
+
+    Words are matched whole. Only leaver wording deletes an account; revoking or removing
+    access, licenses or group memberships, and anything about groups, roles or passwords,
+    goes to the supervisor. "access" means granting app access.
+    """
+    goal = " ".join((goal or "").lower().split())
+    if _LEAVER_GOAL.search(goal):
+        return "offboard"
+    if _REMOVAL_GOAL.search(goal):
+        return None
+    if _JOINER_GOAL.search(goal):
+        return "onboard"
+    if _GRANT_GOAL.search(goal) and not _OTHER_OBJECT.search(goal):
+        return "access"
+    return None
+
+
+def start_workflow(
+    tool_context: ToolContext,
+    goal: str,
+    user_name: str,
+    policy_doc: str,
+    role: Optional[str] = None,
+    apps: Optional[List[str]] = None,
+    upn: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Hands a parsed standard request (onboard/offboard/app access for ONE user) to the
+    deterministic lifecycle workflow.
+
+    Args:
+        goal: The purpose of the request, e.g. "onboarding".
+        user_name: The user the request is about.
+        policy_doc: The policy document name.
+        role: Intended role (optional).
+        apps: Applications the user should (or should no longer) access (optional).
+        upn: The user's principal name if given (optional).
+    """
+    kind = normalize_goal(goal)
+    missing = [name for name, value in (("user_name", user_name), ("policy_doc", policy_doc)) if not value]
+    if kind is None or missing:
+        reason = f"missing {', '.join(missing)}" if missing else f"goal '{goal}' is not a standard workflow"
+        return {"status": "not_standard", "reason": reason, "next": f"transfer to {FALLBACK_AGENT_NAME}"}
+
+    slug = _slugify_name(user_name).replace("_", ".")
+    state = tool_context.state
+    state["WORKFLOW_REQUEST"] = {
+        "kind": kind,
+        "goal": goal,
+        "user_name": user_name,
+        "policy_doc": policy_doc,
+        "role": role,
+        "apps": list(apps or []),
+        # Only a new account gets a derived UPN; existing ones are resolved in preflight.
+        "upn": upn or (f"{slug}@{workflow.upn_domain}" if kind == "onboard" else None),
+    }
+    state["WORKFLOW_STEP"] = WORKFLOW_STEPS[kind][0]
+    state["WORKFLOW_RESULT"] = {}
+    state["WORKFLOW_APPROVAL_FILE"] = None
+    for flag in _STEP_FLAGS:
+        state[flag] = False
+    tool_context.actions.transfer_to_agent = WORKFLOW_AGENT_NAME
+    return {"status": "started", "workflow": kind, "steps": list(WORKFLOW_STEPS[kind])}
+
+
+def _summary_instruction(context) -> str:
+    state = context.state
+    return f"""
+    You write the closing message of a user lifecycle workflow that has already run.
+    Do not call tools and do not ask follow-up questions.
+
+    Request: {json.dumps(state.get("WORKFLOW_REQUEST"), default=str)}
+    Step results: {json.dumps(state.get("WORKFLOW_RESULT"), default=str)}
+
+    Start with SUCCESS or FAILURE, then summarize in at most five sentences what was done
+    for the user, which policy constraints applied and anything that failed or needs a
+    human. Never include passwords.
+    """
+
+
+def _tool_failed(result: Any) -> bool:
+    if hasattr(result, "model_dump"):
+        result = result.model_dump()
+    if isinstance(result, dict):
+        return bool(result.get("isError") or result.get("is_error") or result.get("error"))
+    return False
+
+
+def _brief(value: Any, limit: int = 400) -> str:
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _temporary_password() -> str:
+    alphabet = string.ascii_letters + string.digits
+    return "Ulma-" + "".join(secrets.choice(alphabet) for _ in range(12)) + "!9"
+
+
+# Step outcome: (status, message, state delta). status is "done", "wait", "failed" or "handoff".
+StepOutcome = Tuple[str, str, Dict[str, Any]]
+
+
+class LifecycleWorkflowAgent(BaseAgent):
+    """
+    Code-defined executor for standard lifecycle requests; only the summary uses a model.
+    """
+
+    summary_agent: Agent
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def __init__(self, name: str = WORKFLOW_AGENT_NAME, summary_agent: Optional[Agent] = None):
+        summary_agent = summary_agent or Agent(
+            name="workflow_summary_agent",
+            model=model_with_retry(config.workflow_summary_agent),
+            description="Writes the closing summary of a deterministic lifecycle workflow.",
+            instruction=_summary_instruction,
+            include_contents="none",
+            output_key="workflow_summary",
+        )
+        super().__init__(
+            name=name,
+            description="Runs standard onboarding/offboarding/access requests as a fixed sequence of steps.",
+            summary_agent=summary_agent,
+            sub_agents=[summary_agent],
+        )
+
+    def _event(self, ctx: InvocationContext, text: Optional[str], delta: Dict[str, Any]) -> Event:
+        content = types.Content(role="model", parts=[types.Part(text=text)]) if text else None
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=content,
+            actions=EventActions(state_delta=delta),
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        request = state.get("WORKFLOW_REQUEST")
+        step = state.get("WORKFLOW_STEP")
+        if not request or step not in WORKFLOW_STEPS.get(request.get("kind"), ()):
+            async for event in self._handoff(ctx, "no standard workflow in progress"):
+                yield event
+            return
+
+        steps = WORKFLOW_STEPS[request["kind"]]
+        results = dict(state.get("WORKFLOW_RESULT") or {})
+        for name in steps[steps.index(step):]:
+            if name == "summary":
+                break
+            tool_context = ToolContext(ctx, function_call_id=f"adk-{uuid.uuid4()}")
+            status, message, delta = await getattr(self, f"_step_{name}")(request, state, tool_context)
+            results[name] = {"status": status, "detail": message}
+            # State written through the tool context (preflight, approvals) travels with the step event.
+            delta = {**tool_context.actions.state_delta, **delta, "WORKFLOW_RESULT": results}
+            request = delta.get("WORKFLOW_REQUEST", request)
+            if status == "handoff":
+                yield self._event(ctx, None, {**delta, "WORKFLOW_STEP": "handoff"})
+                async for event in self._handoff(ctx, message):
+                    yield event
+                return
+            if status == "wait":
+                yield self._event(ctx, message, {**delta, "WORKFLOW_STEP": name})
+                if tool_context.actions.requested_tool_confirmations:
+                    yield self._confirmation_event(ctx, tool_context)
+                return
+            if status == "failed":
+                yield self._event(ctx, f"[workflow] {name} failed: {message}", {**delta, "WORKFLOW_STEP": "summary"})
+                break
+            next_step = steps[steps.index(name) + 1]
+            yield self._event(ctx, f"[workflow] {name}: {message}", {**delta, "WORKFLOW_STEP": next_step})
+
+        async for event in self.summary_agent.run_async(ctx):
+            yield event
+        summary = ctx.session.state.get("workflow_summary") or json.dumps(results, default=str)
+        send_manager_message(f"{request['goal']} for {request['user_name']}:\n{summary}")
+        yield self._event(ctx, None, {"STATE_REPORTING_OK": True, "WORKFLOW_STEP": "done"})
+
+    def _confirmation_event(self, ctx: InvocationContext, tool_context: ToolContext) -> Event:
+        """
+        The adk_request_confirmation call for a step that asked for one. The runner pauses
+        the invocation on it and resumes it once the approval reply arrives.
+        """
+        call_id, confirmation = next(iter(tool_context.actions.requested_tool_confirmations.items()))
+        request_id = f"adk-{uuid.uuid4()}"
+        call = types.FunctionCall(
+            name="adk_request_confirmation",
+            id=request_id,
+            args={
+                "originalFunctionCall": {"id": call_id, "name": "workflow_approval", "args": confirmation.payload},
+                "toolConfirmation": confirmation.model_dump(by_alias=True, exclude_none=True),
+            },
+        )
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(function_call=call)]),
+            long_running_tool_ids={request_id},
+        )
+
+    async def _handoff(self, ctx: InvocationContext, reason: str) -> AsyncGenerator[Event, None]:
+        fallback = self.root_agent.find_agent(FALLBACK_AGENT_NAME)
+        if fallback is None:
+            yield self._event(ctx, f"[workflow] cannot continue: {reason}", {})
+            return
+        print(f"[workflow] handing over to {FALLBACK_AGENT_NAME}: {reason}")
+        async for event in fallback.run_async(ctx):
+            yield event
+
+    async def _step_preflight(self, request, state, tool_context) -> StepOutcome:
+        existing = request["kind"] != "onboard"
+        checks = await preflight_check(
+            request["user_name"],
+            request["goal"],
+            request["policy_doc"],
+            tool_context,
+            upn=request["upn"] if existing else None,
+        )
+        location = checks["location"].get("location")
+        if location and location != "HQ":
+            return "handoff", f"user belongs to {location}", {}
+        directory = checks["directory"]
+        if existing and not directory.get("exact"):
+            names = [m.get("user_name") for m in directory.get("matches") or []]
+            return "handoff", f"no exact directory match (candidates: {names})", {}
+        delta = {}
+        if existing:
+            upn = request["upn"]
+            graph = checks["graph"]
+            if not upn:
+                upn = directory["matches"][0].get("upn")
+                if not upn:
+                    return "handoff", f"no UPN on record for {request['user_name']}", {}
+                try:
+                    graph = await lookup_graph_user(upn, tool_context)
+                except Exception as exc:
+                    graph = {"error": str(exc)}
+            account = graph_account(graph)
+            if account is None or account["userPrincipalName"].lower() != upn.lower():
+                reason = graph.get("error") or graph.get("reason") or "no matching user returned"
+                return "handoff", f"Entra ID did not confirm {upn} ({reason})", {}
+            delta["WORKFLOW_REQUEST"] = {**request, "upn": account["userPrincipalName"]}
+        constraints = checks["policy"].get("constraints") or []
+        detail = f"{len(constraints)} policy constraints, location {location}, checks in {checks['elapsed_ms']} ms"
+        return "done", detail, delta
+
+    async def _step_approval(self, request, state, tool_context) -> StepOutcome:
+        filename = state.get("WORKFLOW_APPROVAL_FILE")
+        if not filename:
+            result = await write_approval_request(request["user_name"], "deletion", _session_id(tool_context))
+            delta = {
+                "WORKFLOW_APPROVAL_FILE": result["filename"],
+                "APPROVAL_FILENAME": result["filename"],
+                "WAITING_FOR_APPROVAL": True,
+            }
+            message = (
+                "HIGH RISK OPERATION: Approval request sent to logs/teams/incoming/approvals. Please create a "
+                f"reply file logs/teams/outgoing/{result['filename']} with 'Approved' or 'Not Approved' and "
+                "'over'; the offboarding continues once the decision is written."
+            )
+            # Same pause as queue_high_risk_approval: the runner records the paused
+            # invocation and the resumer continues it when the (bulk) reply arrives.
+            tool_context.request_confirmation(
+                hint=f"Waiting for approval reply in logs/teams/outgoing/{result['filename']} for deletion of '{request['user_name']}'.",
+                payload={"filename": result["filename"], "user_name": request["user_name"], "action": "deletion"},
+            )
+            return "wait", message, delta
+        reply = await read_teams_reply(filename)
+        if not reply.get("done"):
+            return "wait", f"Approval still pending: no decision in logs/teams/outgoing/{filename} yet.", {}
+        approved = reply.get("decision") == "approved"
+        delta = {"WAITING_FOR_APPROVAL": False, "APPROVAL_STATUS": "APPROVED" if approved else "REJECTED"}
+        if not approved:
+            return "failed", "approval was rejected", delta
+        return "done", "approved", delta
+
+    async def _step_identity(self, request, state, tool_context) -> StepOutcome:
+        upn = request["upn"]
+        if not upn:
+            return "failed", "no confirmed UPN for the user", {"STATE_IDENTITY_OK": False}
+        password = None
+        if request["kind"] == "onboard":
+            password = _temporary_password()
+            calls = [("create_user", {"upn": upn, "display_name": request["user_name"], "password": password})]
+        elif request["kind"] == "offboard":
+            calls = [("delete_user", {"upn_or_id": upn})]
+        else:
+            calls = []
+        if request["kind"] != "offboard":
+            calls += [("grant_app_access_by_name", {"user_upn": upn, "app_name": app}) for app in request["apps"]]
+        if not calls:
+            return "failed", "no applications given for the access change", {"STATE_IDENTITY_OK": False}
+
+        tools = {t.name: t for t in await identity_mcp_tools()}
+        results = []
+        for suffix, args in calls:
+            tool = next((t for n, t in tools.items() if n.endswith(suffix)), None)
+            if tool is None:
+                results.append(f"{suffix}: not available")
+                continue
+            result = await tool.run_async(args=args, tool_context=tool_context)
+            failed = _tool_failed(result)
+            results.append(f"{suffix}: {'failed ' if failed else ''}{_brief(result, 200)}")
+            if suffix == "create_user" and not failed:
+                # The password stays out of the step results, state and flow log; the
+                # manager hands it over (it must be changed at first sign-in).
+                send_manager_message(
+                    f"New account {upn} for {request['user_name']}: temporary password {password} "
+                    "(must be changed at first sign-in)."
+                )
+                results.append("temporary password sent to the manager")
+        ok = not any(": failed" in r or ": not available" in r for r in results)
+        return ("done" if ok else "failed"), "; ".join(results), {"STATE_IDENTITY_OK": ok}
+
+    async def _step_teams_log(self, request, state, tool_context) -> StepOutcome:
+        results = state.get("WORKFLOW_RESULT") or {}
+        lines = [f"{step}: {r.get('status')} - {r.get('detail')}" for step, r in results.items()]
+        log = save_flow_log(
+            f"[workflow] {request['goal']} {request['user_name']} ({request['upn']})\n" + "\n".join(lines) + "\n",
+            f"workflow_{_slugify_name(request['user_name'])}.log",
+        )
+        return "done", f"logged to {log['file']}", {"STATE_TEAMS_OK": True}
+
+
+lifecycle_workflow = LifecycleWorkflowAgent()